@@ -1,7 +1,7 @@
 # This file will focus on Moke and use this to scan and calculate the harmonics 
-from sr830_VISADriver import SR830
-from shrc203_VISADriver import SHRC203
-from keithley2100_VISADriver import Keithley2100
+from sr830_VISADriver import SR830VISADriver as SR830
+from shrc203_VISADriver import SHRC203VISADriver as SHRC203
+from keithley2100_VISADriver import Keithley2100VISADriver as Keithley2100
 from multizaber import ZaberMultiple
 from ccsxxx import CCSXXX
 
@@ -18,6 +18,7 @@ class Moke:
         self.zaber.connect(com_zaber)
 
         self.sr830 = SR830(com_sr830)
+        self.sr830.init_hardware()
         self.ccssx = CCSXXX(com_ccsx)
         self.ccssx.connect()
     
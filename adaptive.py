@@ -0,0 +1,109 @@
+import numpy as np
+
+
+def coarse_nodes(n, stride):
+    """Indices of every `stride`-th node of an axis of n nodes, always including the last one."""
+    nodes = list(range(0, n, max(1, stride)))
+    if nodes[-1] != n - 1:
+        nodes.append(n - 1)
+    return nodes
+
+
+def initial_cells(ny, nx, stride_y, stride_x):
+    """Cells of the coarse grid as (j0, j1, i0, i1) index ranges of the fine grid.
+
+    Args:
+        ny, nx (int): Size of the fine grid
+        stride_y, stride_x (int): Fine grid steps between coarse nodes
+    Returns:
+        list of tuple: The cells, whose corners together cover every coarse node
+    """
+    rows, columns = coarse_nodes(ny, stride_y), coarse_nodes(nx, stride_x)
+    row_pairs = list(zip(rows[:-1], rows[1:])) or [(rows[0], rows[0])]
+    column_pairs = list(zip(columns[:-1], columns[1:])) or [(columns[0], columns[0])]
+    return [(j0, j1, i0, i1) for j0, j1 in row_pairs for i0, i1 in column_pairs]
+
+
+def cell_corners(cell):
+    j0, j1, i0, i1 = cell
+    return sorted({(j0, i0), (j0, i1), (j1, i0), (j1, i1)})
+
+
+def split_cell(cell):
+    """Split a cell in two along every axis spanning more than one fine step."""
+    j0, j1, i0, i1 = cell
+    rows = [(j0, (j0 + j1) // 2), ((j0 + j1) // 2, j1)] if j1 - j0 > 1 else [(j0, j1)]
+    columns = [(i0, (i0 + i1) // 2), ((i0 + i1) // 2, i1)] if i1 - i0 > 1 else [(i0, i1)]
+    return [(a, b, c, d) for a, b in rows for c, d in columns]
+
+
+def cell_contrast(cell, signals, scales):
+    """Largest spread of a signal over the corners of a cell, relative to the signal's scale.
+
+    Args:
+        cell (tuple): (j0, j1, i0, i1)
+        signals (list of np.ndarray): Maps on the fine grid, e.g. reflection and Kerr signal
+        scales (list of float): Spread of each signal over the whole scan
+    """
+    corners = tuple(np.array(cell_corners(cell)).T)
+    contrast = 0.
+    for signal, scale in zip(signals, scales):
+        values = signal[corners]
+        if scale > 0 and np.all(np.isfinite(values)):
+            contrast = max(contrast, (values.max() - values.min()) / scale)
+    return contrast
+
+
+def refine_cells(cells, signals, scales, threshold):
+    """Children of the cells that have a contrast above `threshold` and can still be split.
+
+    Returns:
+        list of tuple: The cells to measure at the next level
+    """
+    refined = []
+    for cell in cells:
+        j0, j1, i0, i1 = cell
+        if (j1 - j0 > 1 or i1 - i0 > 1) and cell_contrast(cell, signals, scales) > threshold:
+            refined.extend(split_cell(cell))
+    return refined
+
+
+def serpentine_order(nodes):
+    """Sort grid indices (j, i) by row, alternating the direction along x to keep the moves short."""
+    rows = {}
+    for j, i in nodes:
+        rows.setdefault(j, set()).add(i)
+    ordered = []
+    for n, j in enumerate(sorted(rows)):
+        ordered.extend((j, i) for i in sorted(rows[j], reverse=n % 2 == 1))
+    return ordered
+
+
+def resample_grid(x, y, values, x_scan, y_scan):
+    """Interpolate scattered samples linearly onto a regular grid.
+
+    The samples are triangulated with matplotlib.tri; nodes outside their
+    convex hull are NaN.
+
+    Args:
+        x, y (np.ndarray): Sample positions
+        values (np.ndarray): Samples, shape (n_samples,) or (n_samples, n_channels)
+        x_scan, y_scan (np.ndarray): Axes of the grid
+    Returns:
+        np.ndarray: Values of shape (len(y_scan), len(x_scan)) or (len(y_scan), len(x_scan), n_channels)
+    """
+    from matplotlib.tri import Triangulation, LinearTriInterpolator
+    values = np.asarray(values, dtype=float)
+    columns = values.reshape(len(values), -1)
+    grid_x, grid_y = np.meshgrid(x_scan, y_scan)
+    triangulation = Triangulation(x, y)
+    resampled = np.empty(grid_x.shape + (columns.shape[1],))
+    for k, column in enumerate(columns.T):
+        finite = np.isfinite(column)
+        if not finite.all():
+            # Triangulate the finite samples only, e.g. where a division by the voltage failed
+            interpolator = LinearTriInterpolator(Triangulation(x[finite], y[finite]), column[finite])
+        else:
+            interpolator = LinearTriInterpolator(triangulation, column)
+        resampled[..., k] = np.ma.filled(interpolator(grid_x, grid_y), np.nan)
+    return resampled.reshape(grid_x.shape + values.shape[1:])
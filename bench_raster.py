@@ -0,0 +1,48 @@
+"""Commanded travel and wall time of the 2D raster orders on a simulated SHRC203.
+
+Run with `python bench_raster.py`. Only stage motion is timed (no detector
+reads), with the same moves as NanoScanner.goto_xy: one move_axes command
+per point, naming only the axes that change.
+"""
+import argparse
+import time
+import numpy as np
+from raster import RASTER_ORDERS, raster_lines, commanded_travel
+from simulation import SimulatedSHRC203
+
+
+def run_raster(stage, x_scan, y_scan, order):
+    previous = (None, None)
+    time0 = time.perf_counter()
+    for line in raster_lines(len(y_scan), len(x_scan), order):
+        for j, i in line:
+            positions = {}
+            if x_scan[i] != previous[0]:
+                positions[1] = x_scan[i]
+            if y_scan[j] != previous[1]:
+                positions[2] = y_scan[j]
+            if positions:
+                stage.move_axes(positions)
+            previous = (x_scan[i], y_scan[j])
+    return time.perf_counter() - time0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare raster orders on a simulated stage")
+    parser.add_argument("--nx", type=int, default=20, help="Number of x positions")
+    parser.add_argument("--ny", type=int, default=10, help="Number of y positions")
+    parser.add_argument("--step", type=float, default=5., help="Step size (um)")
+    parser.add_argument("--speed", type=float, default=2000., help="Stage speed (um/s)")
+    parser.add_argument("--latency", type=float, default=0.005, help="Command latency (s)")
+    args = parser.parse_args()
+
+    x_scan = np.arange(args.nx) * args.step
+    y_scan = np.arange(args.ny) * args.step
+    print(f"{args.ny}x{args.nx} grid, step {args.step} um, speed {args.speed} um/s, latency {args.latency * 1e3:.1f} ms")
+    print(f"{'order':>18} {'x travel':>10} {'y travel':>10} {'wall time':>10}")
+    for order in RASTER_ORDERS:
+        x_travel, y_travel = commanded_travel(x_scan, y_scan, order)
+        stage = SimulatedSHRC203(latency=args.latency, speed=args.speed)
+        stage.move_axes({1: x_scan[0], 2: y_scan[0]})
+        wall_time = run_raster(stage, x_scan, y_scan, order)
+        print(f"{order:>18} {x_travel:8.0f}um {y_travel:8.0f}um {wall_time:9.2f}s")
@@ -0,0 +1,60 @@
+"""Per-point storage overhead of the scan loops: np.append vs ScanBuffer.
+
+Run with `python bench_scan_buffer.py`. For each square map size the script
+times how long storing one pixel (seven values, as in scan2d_moke) takes on
+average. With np.append the cost grows with the number of points already
+acquired; with ScanBuffer it stays flat.
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd  # noqa: F401  imported up front so to_dataframe() timings exclude the import
+from scan_buffer import ScanBuffer, GrowableScanBuffer
+
+COLUMNS = ["x (um)", "y (um)", "v (V)", "x1 (V)", "theta1 (deg)", "x2 (V)", "theta2 (deg)"]
+
+
+def store_with_append(n):
+    columns = [np.array([]) for _ in COLUMNS]
+    sample = np.random.rand(len(COLUMNS))
+    time0 = time.perf_counter()
+    for j in range(n):
+        for i in range(n):
+            for k in range(len(columns)):
+                columns[k] = np.append(columns[k], sample[k])
+    return (time.perf_counter() - time0) / (n * n)
+
+
+def store_with_buffer(n):
+    data = ScanBuffer(COLUMNS, (n, n))
+    sample = np.random.rand(len(COLUMNS))
+    time0 = time.perf_counter()
+    for j in range(n):
+        for i in range(n):
+            data.write((j, i), sample)
+    data.to_dataframe()
+    return (time.perf_counter() - time0) / (n * n)
+
+
+def store_with_growable_buffer(n):
+    data = GrowableScanBuffer(COLUMNS)
+    sample = np.random.rand(len(COLUMNS))
+    time0 = time.perf_counter()
+    for _ in range(n * n):
+        data.append(sample)
+    data.to_dataframe()
+    return (time.perf_counter() - time0) / (n * n)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-point storage cost of 2D scans")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[25, 50, 100, 200, 500], help="Map side lengths")
+    parser.add_argument("--max-append", type=int, default=200, help="Largest side length timed with np.append")
+    args = parser.parse_args()
+
+    print(f"{'map':>9} {'np.append':>12} {'ScanBuffer':>12} {'Growable':>12}   (us/point)")
+    for n in args.sizes:
+        append_us = f"{store_with_append(n) * 1e6:12.2f}" if n <= args.max_append else f"{'skipped':>12}"
+        buffer_us = store_with_buffer(n) * 1e6
+        growable_us = store_with_growable_buffer(n) * 1e6
+        print(f"{n:>4}x{n:<4} {append_us} {buffer_us:12.2f} {growable_us:12.2f}")
@@ -0,0 +1,154 @@
+"""End-to-end throughput benchmark of the NanoScanner scans on simulated instruments.
+
+Runs scan2d_moke, scan2d_moke_fly, scan2d_moke_adaptive, scan1d, auto_focus and
+moke_spectroscopy against a latency-modelled SimulatedSetup for a range of
+sizes and reports points per second, time per phase (move, wait_for_ready,
+lockin_settle, read, plot, save, ...) and peak Python memory. Results are written as JSON so runs on
+different commits can be compared:
+
+    python benchmark_scans.py --sizes 5 10 --output before.json
+    python benchmark_scans.py --sizes 5 10 --output after.json --compare before.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+import matplotlib
+matplotlib.use("Agg")
+from scan_script_amelie import NanoScanner  # noqa: E402
+from simulation import SimulatedSetup  # noqa: E402
+from live_view import LiveView, moke_map_view, line_view, spectrum_view  # noqa: E402
+
+ENTRY_POINTS = ["scan2d_moke", "scan2d_moke_fly", "scan2d_moke_adaptive", "scan1d", "auto_focus", "moke_spectroscopy"]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def make_live_view(entry_point, plot):
+    if not plot:
+        return LiveView()
+    if entry_point.startswith("scan2d_moke"):
+        return moke_map_view()
+    if entry_point == "moke_spectroscopy":
+        return spectrum_view()
+    if entry_point == "auto_focus":
+        return line_view(x="z (um)", xlabel="Focus (um)")
+    return line_view()
+
+
+def run_entry_point(entry_point, size, settings, plot=True, concurrent=True):
+    """Run one scan of the given size on a fresh simulated setup.
+
+    Returns:
+        dict: Points, wall time, points/s, phases and peak memory
+    """
+    setup = SimulatedSetup(**settings)
+    scanner = NanoScanner("SIM", "SIM", "SIM", com_zaber="SIM", com_ccsx="SIM", com_pem="SIM", simulation=setup,
+                          concurrent=concurrent)
+    scanner.shrc.move(setup.sample.z_focus, 3)
+    live_view = make_live_view(entry_point, plot)
+    timer = scanner.instrument(live_view=live_view)
+    for instrument in setup.instruments:
+        instrument.n_commands = 0
+
+    tracemalloc.start()
+    time0 = time.perf_counter()
+    if entry_point.startswith("scan2d_moke"):
+        center = setup.sample.center
+        df = getattr(scanner, entry_point)(center[0] - 30, center[0] + 30, 60 / size, center[1] - 30, center[1] + 30, 60 / size,
+                                 live_view=live_view)
+        with timer.phase("save"), tempfile.TemporaryDirectory() as directory:
+            df.to_csv(Path(directory) / "scan.csv", index=False)
+        points = df.attrs.get("measured", len(df))
+    elif entry_point == "scan1d":
+        x, v = scanner.scan1d(0, 60, 60 / size, live_view=live_view)
+        points = len(x)
+    elif entry_point == "auto_focus":
+        scanner.auto_focus(setup.sample.z_focus + 5, live_view=live_view)
+        points = live_view.data.count
+    elif entry_point == "moke_spectroscopy":
+        df = scanner.moke_spectroscopy(step=270 / size, live_view=live_view)
+        with timer.phase("save"), tempfile.TemporaryDirectory() as directory:
+            df.to_csv(Path(directory) / "spectrum.csv", index=False)
+        points = len(df)
+    else:
+        raise ValueError(f"Unknown entry point {entry_point}")
+    wall_time = time.perf_counter() - time0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    phases = timer.summary()
+    phases["other"] = {"time": max(0., wall_time - sum(phase["time"] for phase in phases.values())), "calls": 0}
+    return {
+        "entry_point": entry_point,
+        "size": size,
+        "points": points,
+        "wall_time": wall_time,
+        "points_per_s": points / wall_time,
+        "phases": phases,
+        "commands": sum(instrument.n_commands for instrument in setup.instruments),
+        "stage_commands": setup.shrc.n_commands,
+        "settle": {name: sum(values) / len(values) for name, values in timer.samples.items() if values},
+        "peak_memory_mb": peak / 2 ** 20,
+    }
+
+
+def print_result(result, previous=None):
+    line = (f"{result['entry_point']:>18} {result['size']:>5} {result['points']:>7} {result['wall_time']:9.2f}s "
+            f"{result['points_per_s']:9.2f}/s {result['peak_memory_mb']:8.2f}MB")
+    if previous is not None:
+        line += f"  ({result['points_per_s'] / previous['points_per_s']:5.2f}x vs baseline)"
+    print(line)
+    wall_time = result["wall_time"]
+    if result.get("settle"):
+        print(f"    stage commands {result['stage_commands']}, mean settle "
+              f"{result['settle']['settle_actual'] * 1e3:.1f} ms (predicted {result['settle']['settle_expected'] * 1e3:.1f} ms)")
+    print("    " + ", ".join(f"{name} {phase['time'] / wall_time * 100:.0f}%" for name, phase in result["phases"].items()
+                             if phase["time"] / wall_time >= 0.005))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark NanoScanner scans on simulated instruments")
+    parser.add_argument("--entry-points", nargs="+", default=ENTRY_POINTS, choices=ENTRY_POINTS)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 10], help="Points per axis (per scan for 1D)")
+    parser.add_argument("--latency", type=float, default=0.005, help="Command latency (s)")
+    parser.add_argument("--read-time", type=float, default=0.02, help="Keithley integration time (s)")
+    parser.add_argument("--speed", type=float, default=2000., help="SHRC203 speed (um/s)")
+    parser.add_argument("--no-plot", action="store_true", help="Run without live plotting")
+    parser.add_argument("--sequential", action="store_true", help="Read the instruments one after the other")
+    parser.add_argument("--output", type=Path, default=None, help="JSON file for the results")
+    parser.add_argument("--compare", type=Path, default=None, help="JSON results of a previous run to compare with")
+    args = parser.parse_args()
+
+    settings = {"latency": args.latency, "read_time": args.read_time, "speed": args.speed, "seed": 0}
+    baseline = {}
+    if args.compare is not None:
+        for result in json.loads(args.compare.read_text())["results"]:
+            baseline[(result["entry_point"], result["size"])] = result
+
+    results = []
+    print(f"{'entry point':>18} {'size':>5} {'points':>7} {'wall':>10} {'rate':>11} {'memory':>10}")
+    for entry_point in args.entry_points:
+        sizes = [args.sizes[0]] if entry_point == "auto_focus" else args.sizes
+        for size in sizes:
+            result = run_entry_point(entry_point, size, settings, plot=not args.no_plot, concurrent=not args.sequential)
+            results.append(result)
+            print_result(result, baseline.get((entry_point, size)))
+
+    if args.output is not None:
+        report = {"commit": git_commit(), "timestamp": datetime.now().isoformat(), "python": platform.python_version(),
+                  "settings": settings, "plot": not args.no_plot,
+                  "concurrent": not args.sequential, "results": results}
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
@@ -4,20 +4,50 @@ import numpy as np
 from pathlib import Path
 
 dll_path = Path(r"C:\Program Files\IVI Foundation\VISA\Win64\Bin")
-os.add_dll_directory(dll_path)
-# os.chdir(dll_path)
-lib = ctypes.cdll.LoadLibrary("TLCCS_64.dll")
+lib = None
+
+
+def load_library():
+    """Load TLCCS_64.dll on first use, so that importing this module never touches the dll."""
+    global lib
+    if lib is None:
+        os.add_dll_directory(dll_path)
+        # os.chdir(dll_path)
+        lib = ctypes.cdll.LoadLibrary("TLCCS_64.dll")
+    return lib
+
 
 class CCSXXX:
-    def __init__(self, rsrc_name):
+    """Thorlabs CCS spectrometer through the TLCCS DLL.
+
+    The DLL writes straight into preallocated NumPy arrays, so no ctypes
+    array is created or converted per call. The wavelength axis is a fixed
+    calibration: it is read once in connect() and then returned from the
+    cache. Spectra are written into a ring of `ring_size` buffers; the array
+    returned by get_scan_data() is overwritten `ring_size` acquisitions
+    later, so copy it to keep it longer.
+    """
+    n_pixels = 3648
+
+    def __init__(self, rsrc_name, ring_size=4):
+        load_library()
         self.rsrc_name = rsrc_name.encode('utf-8')
         self.ccs_handle = ctypes.c_int(0)
+        self._wavelengths = np.empty(self.n_pixels)
+        self._wavelengths_read = False
+        self._ring = np.empty((ring_size, self.n_pixels))
+        self._next = 0
+
+    @staticmethod
+    def _pointer(array):
+        return array.ctypes.data_as(ctypes.POINTER(ctypes.c_double))
 
     def connect(self):
         # connect to the device using DLL's init function'
         self._device = lib.tlccs_init(self.rsrc_name, 1, 1, ctypes.byref(self.ccs_handle))
         if self._device != 0:
             raise Exception("Failed to initialize the device")
+        self.read_wavelength_data()
 
     def set_integration_time(self, integration_time):
         """
@@ -38,21 +68,37 @@ class CCSXXX:
         if status != 0:
             raise Exception(f"Error starting scan: {status}")
 
-    def get_wavelength_data(self):
-        wavelengths = (ctypes.c_double * 3648)()
-        status = lib.tlccs_getWavelengthData(self.ccs_handle, 0, ctypes.byref(wavelengths), ctypes.c_void_p(None), ctypes.c_void_p(None))
+    def read_wavelength_data(self):
+        """Read the wavelength calibration from the device into the cache."""
+        self._wavelengths.flags.writeable = True
+        status = lib.tlccs_getWavelengthData(self.ccs_handle, 0, self._pointer(self._wavelengths), ctypes.c_void_p(None),
+                                             ctypes.c_void_p(None))
         if status != 0:
             raise Exception(f"Error getting wavelength data: {status}")
-        wavelengths = np.array(list(wavelengths))
-        return wavelengths
+        self._wavelengths.flags.writeable = False
+        self._wavelengths_read = True
 
-    def get_scan_data(self):
-        data_array = (ctypes.c_double * 3648)()
-        status = lib.tlccs_getScanData(self.ccs_handle, ctypes.byref(data_array))
+    def get_wavelength_data(self):
+        """Wavelength of every pixel in nm, a read-only view of the cached calibration."""
+        if not self._wavelengths_read:
+            self.read_wavelength_data()
+        return self._wavelengths
+
+    def get_scan_data(self, out=None):
+        """Read the last spectrum.
+
+        Args:
+            out (np.ndarray): Contiguous float64 array of n_pixels to write into, the next ring buffer by default
+        Returns:
+            np.ndarray: The spectrum, `out` or a ring buffer that is reused after ring_size calls
+        """
+        if out is None:
+            out = self._ring[self._next]
+            self._next = (self._next + 1) % len(self._ring)
+        status = lib.tlccs_getScanData(self.ccs_handle, self._pointer(out))
         if status != 0:
             raise Exception(f"Error getting scan data: {status}")
-        data_array = np.array(list(data_array))
-        return data_array
+        return out
 
     def close(self):
         lib.tlccs_close(self.ccs_handle)
@@ -0,0 +1,104 @@
+import importlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Driver of every instrument as "module:class", imported on first use
+DRIVERS = {
+    "shrc203": "shrc203_VISADriver:SHRC203VISADriver",
+    "keithley2100": "keithley2100_VISADriver:Keithley2100VISADriver",
+    "sr830": "sr830_VISADriver:SR830VISADriver",
+    "tlpm": "powermeter:CustomTLPM",
+    "zaber": "multizaber:ZaberMultiple",
+    "pem200": "pem200_driver:PEM200Driver",
+    "ccs": "ccsxxx:CCSXXX",
+}
+
+
+class DriverUnavailable(ImportError):
+    """The driver of an instrument could not be imported, e.g. its vendor library is missing."""
+
+    def __init__(self, name, error):
+        super().__init__(f"Driver {name} unavailable: {error}")
+        self.name = name
+        self.error = error
+
+
+class DriverRegistry:
+    """Imports the instrument drivers one at a time, when an instrument is first needed.
+
+    A session that only moves the stage never imports the spectrometer or
+    power meter stacks, and a missing vendor library only disables the
+    instrument that needs it. Import failures are kept per driver in
+    `errors` and raised as DriverUnavailable every time the driver is asked
+    for.
+    """
+
+    def __init__(self, drivers=None):
+        """
+        Args:
+            drivers (dict): Driver name to "module:class" or to a constructor, DRIVERS by default
+        """
+        self.drivers = dict(DRIVERS if drivers is None else drivers)
+        self.errors = {}
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """Constructor of the driver `name`, imported on the first call.
+
+        Raises:
+            DriverUnavailable: If the driver module or its dependencies cannot be imported
+        """
+        with self._lock:
+            if name in self._loaded:
+                return self._loaded[name]
+            if name in self.errors:
+                raise DriverUnavailable(name, self.errors[name])
+            driver = self.drivers[name]
+            if isinstance(driver, str):
+                module, attribute = driver.split(":")
+                try:
+                    driver = getattr(importlib.import_module(module), attribute)
+                except Exception as e:
+                    # Vendor wrappers fail with OSError, KeyError, ... when their library is not installed
+                    self.errors[name] = e
+                    logger.error(f"Driver {name} unavailable: {e}")
+                    raise DriverUnavailable(name, e) from e
+            self._loaded[name] = driver
+            return driver
+
+    def available(self, name):
+        """Import the driver `name` if needed and tell whether it succeeded."""
+        try:
+            self.get(name)
+        except DriverUnavailable:
+            return False
+        return True
+
+    def status(self):
+        """State of every driver: "loaded", "not loaded" or the import error.
+
+        Returns:
+            dict: Driver name to state
+        """
+        return {name: "loaded" if name in self._loaded else str(self.errors[name]) if name in self.errors else "not loaded"
+                for name in self.drivers}
+
+
+class LazyInstrument:
+    """Scanner attribute connecting its instrument on first access.
+
+    The owner implements connect(name), which opens the instrument and
+    stores it in the instance dictionary under the same name, so later
+    accesses are plain attribute lookups that never reach this descriptor.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, scanner, owner=None):
+        if scanner is None:
+            return self
+        return scanner.connect(self.name)
@@ -0,0 +1,61 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentExecutors:
+    """One single-threaded executor per instrument.
+
+    Calls submitted for the same instrument run one at a time in submission
+    order, so a driver session is never used from two threads at once, while
+    calls to different instruments (on different buses) run concurrently.
+    A pixel's independent reads are issued with gather() and cost the time of
+    the slowest instrument instead of the sum.
+    """
+
+    def __init__(self, enabled=True):
+        """
+        Args:
+            enabled (bool): Run the calls concurrently. When False every call runs in the calling thread, in order
+        """
+        self.enabled = enabled
+        self._executors = {}
+
+    def executor(self, device):
+        """Executor of `device`, created on first use."""
+        if device not in self._executors:
+            self._executors[device] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"io-{device}")
+        return self._executors[device]
+
+    def submit(self, device, function, *args, **kwargs):
+        """Queue function(*args, **kwargs) on the executor of `device`.
+
+        Returns:
+            concurrent.futures.Future: Result of the call
+        """
+        return self.executor(device).submit(function, *args, **kwargs)
+
+    def gather(self, *calls):
+        """Run calls on their instruments concurrently and wait for all of them.
+
+        Args:
+            calls: (device, function, *args) tuples. Calls naming the same device run in the given order
+        Returns:
+            list: The results in the order of `calls`. The first exception raised by a call is re-raised
+                once every call has finished
+        """
+        if not self.enabled:
+            return [function(*args) for device, function, *args in calls]
+        futures = [self.submit(device, function, *args) for device, function, *args in calls]
+        # Wait for every call before raising so no instrument is still busy when the caller continues
+        errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        for executor in self._executors.values():
+            executor.shutdown(wait=True)
+        self._executors.clear()
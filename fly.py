@@ -0,0 +1,98 @@
+import numpy as np
+
+
+def profile_position(t, start, target, speed, accel_time):
+    """Position of a trapezoidal move at times `t` after it started.
+
+    The stage accelerates for accel_time to `speed`, cruises and decelerates
+    symmetrically; moves too short to reach `speed` follow a triangular profile.
+
+    Args:
+        t (float or np.ndarray): Times since the start of the move (s)
+        start (float): Start position
+        target (float): Target position
+        speed (float): Cruise speed (position units per s)
+        accel_time (float): Time to reach the cruise speed (s)
+    Returns:
+        np.ndarray: Positions at `t`
+    """
+    t = np.asarray(t, dtype=float)
+    distance = abs(target - start)
+    if distance == 0:
+        return np.full(t.shape, float(start))
+    if accel_time <= 0:
+        s = np.clip(t * speed, 0, distance)
+        return start + np.sign(target - start) * s
+    if distance >= speed * accel_time:
+        ramp, cruise = accel_time, speed
+    else:
+        ramp = np.sqrt(distance * accel_time / speed)
+        cruise = speed * ramp / accel_time
+    accel = cruise / ramp
+    duration = distance / cruise + ramp
+    t = np.clip(t, 0, duration)
+    s = np.where(t < ramp, 0.5 * accel * t ** 2,
+                 np.where(t < duration - ramp, 0.5 * accel * ramp ** 2 + cruise * (t - ramp),
+                          distance - 0.5 * accel * (duration - t) ** 2))
+    return start + np.sign(target - start) * s
+
+
+def interpolate_positions(times, t0, start, target, speed, accel_time, readback_times=(), readbacks=()):
+    """Stage positions at the sample times of a fly line.
+
+    The commanded profile gives the shape of the motion; the difference
+    between the position readbacks and the profile at the readback times is
+    interpolated in time and added, which corrects for latency and for
+    a controller whose profile differs from the model.
+
+    Args:
+        times (np.ndarray): Monotonic sample times (s)
+        t0 (float): Monotonic time at which the move was started
+        start, target, speed, accel_time: Commanded move, see profile_position
+        readback_times (sequence): Monotonic times of the position readbacks
+        readbacks (sequence): Positions read back at readback_times
+    Returns:
+        np.ndarray: Positions at `times`
+    """
+    times = np.asarray(times, dtype=float)
+    positions = profile_position(times - t0, start, target, speed, accel_time)
+    if len(readbacks):
+        readback_times = np.asarray(readback_times, dtype=float)
+        error = np.asarray(readbacks, dtype=float) - profile_position(readback_times - t0, start, target, speed,
+                                                                       accel_time)
+        positions += np.interp(times, readback_times, error)
+    return positions
+
+
+def bin_samples(positions, values, centers, step=None):
+    """Average samples into the pixels of a uniform grid.
+
+    A sample goes to the pixel whose center is within half a pixel of it;
+    samples outside the grid, e.g. taken during the run-up, are left out.
+
+    Args:
+        positions (np.ndarray): Position of every sample
+        values (np.ndarray): Samples, shape (n_samples,) or (n_samples, n_channels)
+        centers (np.ndarray): Uniformly spaced pixel centers
+        step (float): Pixel width, the spacing of the centers by default. Required for a single pixel
+    Returns:
+        tuple: (means, counts); means has one row per pixel and is NaN for pixels without samples, all of them
+            when there is no sample at all
+    """
+    positions = np.asarray(positions, dtype=float)
+    values = np.asarray(values, dtype=float)
+    n = len(centers)
+    if step is None:
+        if n < 2:
+            raise ValueError("The pixel width of a single pixel grid must be given")
+        step = centers[1] - centers[0]
+    if len(values) == 0:
+        return np.full((n,) + values.shape[1:], np.nan), np.zeros(n, int)
+    index = np.floor((positions - centers[0]) / step + 0.5).astype(int)
+    valid = (index >= 0) & (index < n)
+    counts = np.bincount(index[valid], minlength=n)
+    columns = values.reshape(len(values), -1)[valid]
+    sums = np.stack([np.bincount(index[valid], weights=column, minlength=n) for column in columns.T], axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts[:, None]
+    return means.reshape((n,) + values.shape[1:]), counts
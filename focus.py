@@ -0,0 +1,228 @@
+import json
+import logging
+from pathlib import Path
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+GOLDEN = (np.sqrt(5) - 1) / 2
+FOCUS_MODELS = ("parabola", "gaussian")
+
+
+def fit_peak(z, values, model="parabola"):
+    """Position of the maximum of a parabola or Gaussian fitted to samples around a peak.
+
+    The Gaussian is fitted as a parabola to the logarithm of the values, which
+    must then be positive.
+
+    Args:
+        z (np.ndarray): Sample positions, at least 3 distinct ones
+        values (np.ndarray): Samples
+        model (str): One of FOCUS_MODELS
+    Returns:
+        float: Vertex of the fit, None if the fit has no maximum
+    """
+    if model not in FOCUS_MODELS:
+        raise ValueError(f"Unknown focus model {model}, expected one of {FOCUS_MODELS}")
+    z = np.asarray(z, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if model == "gaussian":
+        if np.any(values <= 0):
+            return None
+        values = np.log(values)
+    if len(np.unique(z)) < 3:
+        return None
+    center = z.mean()  # fit around the mean to keep the normal equations well conditioned
+    a, b, _ = np.polyfit(z - center, values, 2)
+    if a >= 0:
+        return None
+    return center - b / (2 * a)
+
+
+def coarse_points_for(low, high, depth_of_focus):
+    """Samples of a coarse pass over [low, high] spaced by at most the depth of focus.
+
+    With that spacing one sample always lies within half a depth of focus
+    of the peak, so a narrow peak cannot fall between the samples.
+    """
+    if depth_of_focus <= 0:
+        raise ValueError(f"The depth of focus must be positive, got {depth_of_focus}")
+    return int(np.ceil((high - low) / depth_of_focus)) + 1
+
+
+def is_flat(values, min_contrast):
+    """True if the samples show no clear maximum: (max - min) / max below min_contrast."""
+    values = np.asarray(values, dtype=float)
+    top = np.max(np.abs(values))
+    return top == 0 or (values.max() - values.min()) / top < min_contrast
+
+
+def find_peak(measure, low, high, tolerance=1., max_evaluations=16, coarse_points=7, model="parabola",
+              depth_of_focus=None, min_contrast=0.05):
+    """Locate the maximum of measure(z) in [low, high] in a few evaluations.
+
+    A coarse pass of evenly spaced samples brackets the peak between the
+    neighbours of the best one. Given the expected depth of focus, the
+    coarse spacing is derived from it (see coarse_points_for) instead of
+    `coarse_points`. If the coarse pass is flat, i.e. the peak fell between
+    the samples, a fine sweep samples the midpoints between the samples
+    until a maximum shows up or the evaluations run out; with no maximum at
+    all the middle of the range is returned rather than an arbitrary edge.
+    A golden-section search then narrows the bracket to `tolerance`, and a
+    parabola or Gaussian fitted to the samples inside the final bracket (and
+    its two outer neighbours) places the peak between the samples. Whatever
+    happens, measure is called at most `max_evaluations` times.
+
+    Args:
+        measure (callable): measure(z) returning the focus signal, e.g. the reflected intensity
+        low, high (float): Search range
+        tolerance (float): Width of the bracket at which the search stops
+        max_evaluations (int): Hard cap on the calls to measure
+        coarse_points (int): Samples of the coarse pass, at least 3, ignored if depth_of_focus is given
+        model (str): Peak model of the final fit, one of FOCUS_MODELS
+        depth_of_focus (float): Expected width of the peak, sets the coarse spacing
+        min_contrast (float): Relative spread (max - min) / max below which the samples count as flat
+    Returns:
+        tuple: (peak position, positions evaluated, values), the arrays in evaluation order
+    """
+    if depth_of_focus is not None:
+        coarse_points = coarse_points_for(low, high, depth_of_focus)
+        if coarse_points > max_evaluations:
+            logger.warning(f"{coarse_points} coarse samples needed to resolve a depth of focus of {depth_of_focus} "
+                           f"over [{low}, {high}], only {max_evaluations} evaluations allowed")
+    coarse_points = max(3, min(coarse_points, max_evaluations))
+    evaluated = {}
+
+    def evaluate(z):
+        if z not in evaluated:
+            evaluated[z] = measure(z)
+        return evaluated[z]
+
+    for z in np.linspace(low, high, coarse_points):
+        evaluate(float(z))
+    while is_flat(list(evaluated.values()), min_contrast) and len(evaluated) < max_evaluations:
+        grid = np.sort(list(evaluated))
+        logger.info(f"No clear maximum in {len(grid)} samples, sweeping at a spacing of {(grid[1] - grid[0]) / 2:.3f}")
+        for z in (grid[:-1] + grid[1:]) / 2:
+            if len(evaluated) >= max_evaluations:
+                break
+            evaluate(float(z))
+    if is_flat(list(evaluated.values()), min_contrast):
+        peak = (low + high) / 2
+        logger.warning(f"No maximum found in [{low}, {high}] after {len(evaluated)} evaluations, returning {peak:.3f}")
+        return float(peak), np.array(list(evaluated)), np.array(list(evaluated.values()))
+
+    grid = np.sort(list(evaluated))
+    best = int(np.argmax([evaluated[z] for z in grid]))
+    a, b = grid[max(best - 1, 0)], grid[min(best + 1, len(grid) - 1)]
+
+    c, d = b - GOLDEN * (b - a), a + GOLDEN * (b - a)
+    while b - a > tolerance and len(evaluated) + 1 < max_evaluations:
+        if evaluate(c) >= evaluate(d):
+            b, d = d, c
+            c = b - GOLDEN * (b - a)
+        else:
+            a, c = c, d
+            d = a + GOLDEN * (b - a)
+
+    z = np.array(list(evaluated))
+    values = np.array(list(evaluated.values()))
+    peak = z[np.argmax(values)]
+    order = np.argsort(z)
+    inside = np.flatnonzero((z[order] >= a) & (z[order] <= b))
+    if len(inside):
+        # Include one sample on each side of the bracket so that the fit sees the curvature
+        window = order[max(inside[0] - 1, 0):inside[-1] + 2]
+        fitted = fit_peak(z[window], values[window], model)
+        if fitted is not None and z[window].min() <= fitted <= z[window].max():
+            peak = fitted
+    logger.info(f"Peak at {peak:.3f} after {len(evaluated)} evaluations")
+    return float(peak), z, values
+
+
+class FocusMap:
+    """Focus height over the sample as a low-order polynomial surface z(x, y).
+
+    Fitted by least squares to the focus found at a few sites, so that a
+    scan can move z along with x and y and keep a tilted or slightly curved
+    sample in focus. order 1 is a plane (3 sites or more), order 2 a
+    quadratic surface (6 sites or more).
+    """
+
+    def __init__(self, coefficients, center=(0., 0.), order=1, sites=None):
+        """
+        Args:
+            coefficients (sequence): Polynomial coefficients in the order of FocusMap.terms
+            center (tuple): (x, y) subtracted from the positions before evaluating the polynomial
+            order (int): 1 or 2
+            sites (np.ndarray): (x, y, z) of the focus measurements the map was fitted to
+        """
+        self.coefficients = np.asarray(coefficients, dtype=float)
+        self.center = tuple(float(c) for c in center)
+        self.order = order
+        self.sites = None if sites is None else np.asarray(sites, dtype=float)
+
+    @staticmethod
+    def terms(x, y, order=1):
+        """Design matrix of the surface: 1, x, y (order 1) and x^2, xy, y^2 (order 2)."""
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        terms = [np.ones_like(x), x, y]
+        if order >= 2:
+            terms += [x ** 2, x * y, y ** 2]
+        return np.stack(terms, axis=-1)
+
+    @classmethod
+    def fit(cls, x, y, z, order=1):
+        """Fit a surface to focus heights z measured at (x, y).
+
+        Returns:
+            FocusMap: The fitted map
+        """
+        if order not in (1, 2):
+            raise ValueError("The focus map order must be 1 (plane) or 2 (quadratic surface)")
+        x, y, z = (np.asarray(values, dtype=float) for values in (x, y, z))
+        center = (x.mean(), y.mean())
+        terms = cls.terms(x - center[0], y - center[1], order)
+        if len(z) < terms.shape[1]:
+            raise ValueError(f"A focus map of order {order} needs at least {terms.shape[1]} sites, got {len(z)}")
+        coefficients, *_ = np.linalg.lstsq(terms, z, rcond=None)
+        focus_map = cls(coefficients, center, order, np.column_stack([x, y, z]))
+        logger.info(f"Focus map of order {order} fitted to {len(z)} sites, rms residual {focus_map.residual():.3f} um")
+        return focus_map
+
+    def z(self, x, y):
+        """Focus height at (x, y), a float for scalar positions."""
+        z = self.terms(np.asarray(x) - self.center[0], np.asarray(y) - self.center[1], self.order) @ self.coefficients
+        return float(z) if np.ndim(z) == 0 else z
+
+    def residual(self):
+        """Root mean square distance of the fitted sites from the surface."""
+        if self.sites is None:
+            return float("nan")
+        return float(np.sqrt(np.mean((self.z(self.sites[:, 0], self.sites[:, 1]) - self.sites[:, 2]) ** 2)))
+
+    def to_json(self):
+        return json.dumps({"coefficients": self.coefficients.tolist(), "center": self.center, "order": self.order,
+                           "sites": None if self.sites is None else self.sites.tolist()})
+
+    @classmethod
+    def from_json(cls, text):
+        values = json.loads(text)
+        return cls(values["coefficients"], values["center"], values["order"], values["sites"])
+
+    def save(self, path):
+        Path(path).write_text(self.to_json())
+
+    @classmethod
+    def load(cls, path):
+        return cls.from_json(Path(path).read_text())
+
+
+def focus_sites(x_start, x_stop, y_start, y_stop, n=3):
+    """n x n focus sites spread evenly over a scan area, corners included, in serpentine order.
+
+    Returns:
+        list of tuple: (x, y) of every site
+    """
+    xs, ys = np.linspace(x_start, x_stop, n), np.linspace(y_start, y_stop, n)
+    return [(float(x), float(y)) for j, y in enumerate(ys) for x in (xs[::-1] if j % 2 else xs)]
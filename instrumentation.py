@@ -0,0 +1,74 @@
+import time
+import functools
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class PhaseTimer:
+    """Accumulates wall time per named phase of a scan.
+
+    Phases may nest; each phase is charged its exclusive time, so a "move"
+    that contains a "wait_for_ready" only counts the time outside the wait
+    and the totals add up to the instrumented wall time. Phases timed in
+    other threads (concurrent instrument reads) are added up as well, so
+    then the totals can exceed the wall time.
+    """
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.samples = defaultdict(list)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def reset(self):
+        self.totals.clear()
+        self.counts.clear()
+        self.samples.clear()
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as phase `name`."""
+        stack = self._stack()
+        stack.append(0.)
+        time0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - time0
+            children = stack.pop()
+            with self._lock:
+                self.totals[name] += elapsed - children
+                self.counts[name] += 1
+            if stack:
+                stack[-1] += elapsed
+
+    def add(self, name, seconds):
+        """Charge `seconds` measured elsewhere to phase `name`."""
+        self.totals[name] += seconds
+        self.counts[name] += 1
+
+    def observe(self, name, value):
+        """Record a sample (e.g. a settle time) that is not charged to any phase."""
+        self.samples[name].append(value)
+
+    def wrap(self, obj, method_name, name=None):
+        """Time every call of `obj.method_name` as a phase, by patching the instance attribute."""
+        method = getattr(obj, method_name)
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            with self.phase(name or method_name):
+                return method(*args, **kwargs)
+        setattr(obj, method_name, timed)
+
+    def summary(self):
+        """Return {phase: {"time": seconds, "calls": n}} sorted by decreasing time."""
+        return {name: {"time": self.totals[name], "calls": self.counts[name]}
+                for name in sorted(self.totals, key=self.totals.get, reverse=True)}
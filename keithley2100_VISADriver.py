@@ -1,5 +1,7 @@
-import pyvisa as visa
+import numpy as np
 import logging
+from pyvisa.errors import VisaIOError
+from visa_sessions import sessions
 logger = logging.getLogger(__name__)
 
 class Keithley2100VISADriver:
@@ -17,7 +19,9 @@ class Keithley2100VISADriver:
         """
         self._instr = None
         self.rsrc_name = rsrc_name
-        self.rm = None
+        self.sample_count = 1
+        self.trigger_count = 1
+        self.trigger_source = None
 
     def init_hardware(self):
         """Initialize the selected VISA resource
@@ -25,12 +29,21 @@ class Keithley2100VISADriver:
         :param pyvisa_backend: Expects a pyvisa backend identifier or a path to the visa backend dll (ref. to pyvisa)
         :type pyvisa_backend: string
         """
-        self.rm = visa.highlevel.ResourceManager()
-        self._instr = self.rm.open_resource(self.rsrc_name,
-                                           write_termination="\n",
-                                           )    
+        self._instr = sessions.open(self.rsrc_name,
+                                    write_termination="\n",
+                                    )    
        
 
+    def reconnect(self):
+        """Reopen the VISA session with the settings of init_hardware, without enumerating the bus again
+
+        The cached counts and trigger source are forgotten, so the next measurement sends them again.
+        """
+        self._instr = sessions.reconnect(self.rsrc_name)
+        self.sample_count = None
+        self.trigger_count = None
+        self.trigger_source = None
+
     def clear_buffer(self):
         self._instr.write("TRAC:CLE")
 
@@ -42,7 +55,7 @@ class Keithley2100VISADriver:
 
     def close(self):
         # self._instr.write("ROUT:OPEN:ALL")
-        self.rm.close()
+        sessions.release(self.rsrc_name)
 
     def get_card(self):
         return self._instr.query("*OPT?")
@@ -75,9 +88,79 @@ class Keithley2100VISADriver:
     def reset(self):
         self._instr.write("*CLS")
         self._instr.write("*RST")
+        self.sample_count = 1
+        self.trigger_count = 1
+        self.trigger_source = None
 
     def read(self):
-        return float(self._instr.query("READ?"))
+        return float(self._measure(1)[0])
+
+    def set_sample_count(self, sample_count, trigger_count=1):
+        """Set the number of readings taken per trigger and the number of triggers per measurement
+
+        Commands are only sent when the values differ from the current configuration.
+
+        :param sample_count: Readings per trigger (SAMP:COUN)
+        :type sample_count: int
+        :param trigger_count: Triggers accepted before returning to idle (TRIG:COUN)
+        :type trigger_count: int
+        """
+        if sample_count != self.sample_count:
+            self._instr.write(f"SAMP:COUN {sample_count}")
+            self.sample_count = sample_count
+        if trigger_count != self.trigger_count:
+            self._instr.write(f"TRIG:COUN {trigger_count}")
+            self.trigger_count = trigger_count
+
+    def configure_buffered(self, sample_count, trigger_count=1, source="IMM"):
+        """Configure a buffered measurement whose readings are stored in the instrument memory
+
+        :param sample_count: Readings per trigger
+        :type sample_count: int
+        :param trigger_count: Number of triggers
+        :type trigger_count: int
+        :param source: Trigger source ('IMM', 'BUS' or 'EXT')
+        :type source: string
+
+        Like the counts, the trigger source is only sent when it differs from the current configuration.
+        """
+        if source != self.trigger_source:
+            self._instr.write(f"TRIG:SOUR {source}")
+            self.trigger_source = source
+        self.set_sample_count(sample_count, trigger_count)
+
+    def read_average(self, n_samples):
+        """Average n_samples readings taken in one buffered measurement
+
+        The trigger source is set to immediate, so the result does not depend
+        on the state the instrument was left in, and the readings are taken
+        and transferred with a single READ? query.
+
+        :param n_samples: Number of readings to average
+        :type n_samples: int
+        :return: Mean and standard deviation of the readings (0 for a single reading)
+        :rtype: tuple
+        """
+        if n_samples <= 1:
+            return self.read(), 0.
+        readings = self._measure(n_samples)
+        return float(readings.mean()), float(readings.std(ddof=1))
+
+    def _measure(self, n_samples):
+        """Readings of one buffered measurement, reopening the session once if the VISA transfer fails
+
+        :param n_samples: Number of readings
+        :type n_samples: int
+        :rtype: numpy.ndarray
+        """
+        try:
+            self.configure_buffered(n_samples)
+            return self._instr.query_ascii_values("READ?", container=np.array)
+        except VisaIOError as e:
+            logger.warning(f"Keithley read failed ({e}), reopening {self.rsrc_name}")
+            self.reconnect()
+            self.configure_buffered(n_samples)
+            return self._instr.query_ascii_values("READ?", container=np.array)
 
     def set_mode(self, mode, **kwargs):
         """
@@ -117,6 +200,9 @@ class Keithley2100VISADriver:
             cmd += ' DEF,' + str(kwargs['resolution'])
 
         self._instr.write(cmd)
+        # CONF resets the sample and trigger counts to 1
+        self.sample_count = 1
+        self.trigger_count = 1
 
     def user_command(self):
         command = input('Enter here a command you want to send directly to the Keithley [if None, press enter]: ')
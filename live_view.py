@@ -0,0 +1,273 @@
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class LiveImage:
+    """Image panel that shows a 2D quantity of a scan buffer on a persistent AxesImage."""
+
+    def __init__(self, ax, source, title="", colorbar=True, cmap="viridis"):
+        """
+        Args:
+            ax (matplotlib.axes.Axes): Axes to draw in
+            source (str or callable): Column name, or function of the buffer returning the array to show
+            title (str): Axes title
+            colorbar (bool): Add a colorbar next to the axes
+            cmap (str): Colormap name
+        """
+        self.ax = ax
+        self.source = source
+        self.image = ax.imshow(np.full((1, 1), np.nan), origin="lower", aspect="auto", cmap=cmap,
+                               interpolation="nearest")
+        self.colorbar = ax.figure.colorbar(self.image, ax=ax) if colorbar else None
+        ax.set_title(title)
+        ax.set_xlabel("Position X (um)")
+        ax.set_ylabel("Position Y (um)")
+
+    def bind(self, data, extent=None):
+        if extent is not None:
+            self.image.set_extent(extent)
+            self.ax.set_xlim(extent[0], extent[1])
+            self.ax.set_ylim(extent[2], extent[3])
+        self.image.set_data(np.full(data.shape, np.nan))
+
+    def update(self, data):
+        values = self.source(data) if callable(self.source) else data[self.source]
+        self.image.set_data(values)
+        finite = values[np.isfinite(values)]
+        if finite.size:
+            vmin, vmax = finite.min(), finite.max()
+            if vmin == vmax:
+                vmax = vmin + 1e-12
+            self.image.set_clim(vmin, vmax)
+
+
+class LiveLine:
+    """Line panel that shows y versus x of a scan buffer on a persistent Line2D."""
+
+    def __init__(self, ax, x, y, fmt="o", title="", xlabel="", ylabel=""):
+        """
+        Args:
+            ax (matplotlib.axes.Axes): Axes to draw in
+            x (str or callable): Column name, or function of the buffer, for the abscissa
+            y (str or callable): Column name, or function of the buffer, for the ordinate
+            fmt (str): Matplotlib format string
+            title, xlabel, ylabel (str): Axes labels
+        """
+        self.ax = ax
+        self.x = x
+        self.y = y
+        self.line, = ax.plot([], [], fmt)
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+
+    def bind(self, data, extent=None):
+        self.line.set_data([], [])
+
+    def update(self, data):
+        x = self.x(data) if callable(self.x) else data.flat(self.x)
+        y = self.y(data) if callable(self.y) else data.flat(self.y)
+        self.line.set_data(x, y)
+        self.ax.relim()
+        self.ax.autoscale_view()
+
+
+class LiveView:
+    """Throttled live display of a scan in progress.
+
+    Scan loops write samples into a ScanBuffer and call push(), which only marks
+    the view dirty. Redraws happen at most `max_fps` times per second by
+    updating persistent artists in place:
+
+    - with start(), a canvas timer (a QTimer under Qt) redraws from the GUI
+      event loop, so push() never draws and acquisition running in another
+      thread is never blocked by plotting;
+    - without a timer (plain pyplot scripts), push() redraws and flushes GUI
+      events itself whenever the frame interval has elapsed. The interval is
+      stretched so that drawing takes at most `max_duty` of the wall time,
+      however slow the backend is.
+    """
+
+    def __init__(self, max_fps=5, max_duty=0.1):
+        self.max_fps = max_fps
+        self.max_duty = max_duty
+        self.panels = []
+        self.data = None
+        self._dirty = False
+        self._last_draw = 0.
+        self._draw_duration = 0.
+        self._timer = None
+        self._pending = None
+
+    @property
+    def figures(self):
+        figures = []
+        for panel in self.panels:
+            if panel.ax.figure not in figures:
+                figures.append(panel.ax.figure)
+        return figures
+
+    def add_image(self, ax, source, **kwargs):
+        panel = LiveImage(ax, source, **kwargs)
+        self.panels.append(panel)
+        return panel
+
+    def add_line(self, ax, x, y, **kwargs):
+        panel = LiveLine(ax, x, y, **kwargs)
+        self.panels.append(panel)
+        return panel
+
+    def bind(self, data, extent=None):
+        """Attach the buffer of a new scan.
+
+        Safe to call from the acquisition thread: with a timer running the
+        artists are only touched by the next timer tick.
+
+        Args:
+            data (ScanBuffer): Buffer the scan writes into
+            extent (tuple): (x_min, x_max, y_min, y_max) of the map, for image panels
+        """
+        self._pending = (data, extent)
+        self._dirty = True
+        if self._timer is None:
+            self.refresh(force=True)
+
+    def push(self):
+        """Signal that new samples were written into the bound buffer."""
+        self._dirty = True
+        if self._timer is None:
+            time0 = time.monotonic()
+            if self.refresh():
+                for figure in self.figures:
+                    figure.canvas.flush_events()
+                self._draw_duration = time.monotonic() - time0
+                self._last_draw = time.monotonic()
+
+    def refresh(self, force=False):
+        """Redraw if there is new data and the frame interval has elapsed.
+
+        Returns:
+            bool: True if a redraw was requested
+        """
+        now = time.monotonic()
+        if self._pending is not None:
+            self.data, extent = self._pending
+            self._pending = None
+            for panel in self.panels:
+                panel.bind(self.data, extent)
+        if self.data is None or not self._dirty:
+            return False
+        interval = max(1. / self.max_fps, self._draw_duration / self.max_duty)
+        if not force and now - self._last_draw < interval:
+            return False
+        self._dirty = False
+        self._last_draw = now
+        for panel in self.panels:
+            panel.update(self.data)
+        for figure in self.figures:
+            figure.canvas.draw_idle()
+        return True
+
+    def flush(self):
+        """Signal the end of a scan so that the final state gets drawn."""
+        self._dirty = True
+        if self._timer is None:
+            self.refresh(force=True)
+
+    def start(self):
+        """Redraw from a canvas timer on the GUI event loop."""
+        if self._timer is None and self.panels:
+            self._timer = self.panels[0].ax.figure.canvas.new_timer(interval=int(1000 / self.max_fps))
+            self._timer.add_callback(self.refresh)
+            self._timer.start()
+
+    def stop(self):
+        """Stop the timer and draw the final state."""
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+        self.refresh(force=True)
+
+
+def grid_extent(x_scan, y_scan):
+    """Image extent with pixel edges centered on the scan grid points."""
+    dx = x_scan[1] - x_scan[0] if len(x_scan) > 1 else 1.
+    dy = y_scan[1] - y_scan[0] if len(y_scan) > 1 else 1.
+    return (x_scan[0] - dx / 2, x_scan[-1] + dx / 2, y_scan[0] - dy / 2, y_scan[-1] + dy / 2)
+
+
+def grid_values(x, y, *columns):
+    """Arrange scan rows on the grid of their positions, for pcolormesh.
+
+    Rows without a finite position, e.g. the unfilled rows of an aborted
+    scan, are dropped, and grid cells without a row are NaN. The rows may
+    come in any order (serpentine, adaptive).
+
+    Args:
+        x, y (np.ndarray): Positions of the rows
+        columns (np.ndarray): Values of the rows
+    Returns:
+        tuple: (unique x, unique y, one (len(y), len(x)) array per column)
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    finite = np.isfinite(x) & np.isfinite(y)
+    x_grid, y_grid = np.unique(x[finite]), np.unique(y[finite])
+    i, j = np.searchsorted(x_grid, x[finite]), np.searchsorted(y_grid, y[finite])
+    grids = []
+    for values in columns:
+        grid = np.full((len(y_grid), len(x_grid)), np.nan)
+        grid[j, i] = np.asarray(values, dtype=float)[finite]
+        grids.append(grid)
+    return x_grid, y_grid, grids
+
+
+def moke_map_view(max_fps=5):
+    """Pyplot live view of a MOKE map: reflection, x2/v and x1/v."""
+    import matplotlib.pyplot as plt
+    plt.ion()
+    fig, axes = plt.subplots(1, 3, figsize=(15, 4))
+    view = LiveView(max_fps)
+    view.add_image(axes[0], "v (V)", title="Reflection")
+    view.add_image(axes[1], lambda data: data["x2 (V)"] / data["v (V)"], title="x2/v")
+    view.add_image(axes[2], lambda data: data["x1 (V)"] / data["v (V)"], title="x1/v")
+    plt.show(block=False)
+    return view
+
+
+def map_view(column="v (V)", max_fps=5):
+    """Pyplot live view of a single quantity of a 2D scan."""
+    import matplotlib.pyplot as plt
+    plt.ion()
+    fig, ax = plt.subplots()
+    view = LiveView(max_fps)
+    view.add_image(ax, column, title=column)
+    plt.show(block=False)
+    return view
+
+
+def line_view(x="x (um)", y="v (V)", xlabel="Position (um)", ylabel="Voltage (V)", max_fps=5):
+    """Pyplot live view of a 1D scan."""
+    import matplotlib.pyplot as plt
+    plt.ion()
+    fig, ax = plt.subplots()
+    view = LiveView(max_fps)
+    view.add_line(ax, x, y, fmt="o-", xlabel=xlabel, ylabel=ylabel)
+    plt.show(block=False)
+    return view
+
+
+def spectrum_view(reflection="reflection (a.u,)", kerr="kerr", ellip="ellip", max_fps=5):
+    """Pyplot live view of a MOKE spectrum: reflection, Kerr and ellipticity versus wavelength."""
+    import matplotlib.pyplot as plt
+    plt.ion()
+    fig, axes = plt.subplots(1, 3, figsize=(15, 4))
+    view = LiveView(max_fps)
+    view.add_line(axes[0], "wavelength (nm)", reflection, title="Reflection", xlabel="Wavelength (nm)", ylabel="Reflection (a.u.)")
+    view.add_line(axes[1], "wavelength (nm)", kerr, title="Kerr", xlabel="Wavelength (nm)", ylabel="Kerr (a.u.)")
+    if ellip is not None:
+        view.add_line(axes[2], "wavelength (nm)", ellip, title="Ellipticity", xlabel="Wavelength (nm)", ylabel="Ellipticity (a.u.)")
+    plt.show(block=False)
+    return view
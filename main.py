@@ -1,15 +1,19 @@
 from pathlib import Path
-from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QVBoxLayout, QHBoxLayout, QWidget, QMessageBox, QLineEdit, QGridLayout, QLabel, QFileDialog, QComboBox, QTabWidget, QGroupBox, QTextEdit, QSizePolicy
+from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QVBoxLayout, QHBoxLayout, QWidget, QMessageBox, QLineEdit, QGridLayout, QLabel, QFileDialog, QComboBox, QTabWidget, QGroupBox, QTextEdit, QSizePolicy, QProgressBar, QCheckBox
 from PyQt5.QtGui import QIcon
 from PyQt5 import QtGui, QtCore
 import sys
 import os
 import numpy as np
-from PyQt5.QtCore import pyqtSlot, Qt, QTimer, QSize
+from PyQt5.QtCore import pyqtSlot, pyqtSignal, Qt, QTimer, QSize
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas 
-import pandas as pd
-from scan_script_amelie import NanoScanner
+from scan_script_amelie import NanoScanner, HARMONIC_MODES, INSTRUMENTS
+from live_view import LiveView, grid_values
+from scan_worker import ScanWorker
+from scan_writer import ScanWriter, mark_status
+from raster import RASTER_ORDERS
+from visa_sessions import sessions
 import logging
 
 class QTextEditLogger(logging.Handler):
@@ -32,9 +36,136 @@ class MplCanvas(FigureCanvas):
         super().__init__(fig)
         self.colorbar = None  
 
-class MainWindow(QMainWindow):
-    def __init__(self):
+class ScanRunnerMixin:
+    """Runs scans in a ScanWorker and shows progress, ETA, pause and abort controls.
+
+    Subclasses call init_scan_controls() from initUI() and implement
+    scan_finished(df, status), which is called on the GUI thread once the scan
+    returns, with status "complete" or "aborted". Other long tasks, e.g. the
+    focus map, run the same way with their own finished handler.
+    """
+
+    def init_scan_controls(self, layout):
+        self.worker = None
+        self.live_view = None
+        self.writer = None
+
+        scan_control_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setFixedWidth(300)
+        scan_control_layout.addWidget(self.progress_bar)
+
+        self.eta_label = QLabel("ETA: -")
+        scan_control_layout.addWidget(self.eta_label)
+
+        self.pause_scan_button = QPushButton("Pause")
+        self.pause_scan_button.clicked.connect(self.pause_scan)
+        self.pause_scan_button.setFixedWidth(100)
+        self.pause_scan_button.setEnabled(False)
+        scan_control_layout.addWidget(self.pause_scan_button)
+
+        self.abort_scan_button = QPushButton("Abort")
+        self.abort_scan_button.clicked.connect(self.abort_scan)
+        self.abort_scan_button.setFixedWidth(100)
+        self.abort_scan_button.setEnabled(False)
+        scan_control_layout.addWidget(self.abort_scan_button)
+
+        scan_control_layout.setAlignment(Qt.AlignLeft)
+        layout.addLayout(scan_control_layout)
+
+    def run_scan(self, scan, *args, live_view=None, on_finished=None, **kwargs):
+        """Run `scan(*args, live_view=..., control=..., **kwargs)` in a background thread.
+
+        Args:
+            live_view (LiveView): View of the task, create_live_view() by default
+            on_finished (callable): Called as on_finished(result, status) instead of scan_finished
+        """
+        if self.worker is not None and self.worker.is_running:
+            QMessageBox.warning(self, "Scan running", "A scan is already running.")
+            return
+        self.finished_handler = on_finished or self.scan_finished
+        self.live_view = live_view or self.create_live_view()
+        self.live_view.start()
+        self.worker = ScanWorker(scan, *args, live_view=self.live_view, **kwargs)
+        self.worker.progress.connect(self.update_progress)
+        self.worker.line_finished.connect(self.update_line)
+        self.worker.finished.connect(self.on_scan_finished)
+        self.worker.failed.connect(self.on_scan_failed)
+        self.progress_bar.setValue(0)
+        self.eta_label.setText("ETA: -")
+        self.start_scan_button.setEnabled(False)
+        self.pause_scan_button.setEnabled(True)
+        self.pause_scan_button.setText("Pause")
+        self.abort_scan_button.setEnabled(True)
+        self.worker.start()
+
+    def open_writer(self, directory, name, file_format):
+        """Writer streaming the next scan to an HDF5 file, or None when the data is saved as CSV at the end."""
+        self.writer = None
+        if file_format == "HDF5" and directory:
+            self.writer = ScanWriter(self.scanner.generate_filename(Path(directory), name, extension="h5"))
+        return self.writer
+
+    def scan_stopped(self):
+        if self.live_view is not None:
+            self.live_view.stop()
+        self.start_scan_button.setEnabled(True)
+        self.pause_scan_button.setEnabled(False)
+        self.abort_scan_button.setEnabled(False)
+
+    @pyqtSlot(int, int, float)
+    def update_progress(self, done, total, eta):
+        self.progress_bar.setMaximum(total)
+        self.progress_bar.setValue(min(done, total))
+        if eta == eta:
+            minutes, seconds = divmod(int(eta), 60)
+            self.eta_label.setText(f"ETA: {minutes // 60:d}:{minutes % 60:02d}:{seconds:02d}")
+
+    @pyqtSlot(int, int)
+    def update_line(self, line, n_lines):
+        logger.debug(f"Finished line {line + 1} of {n_lines}")
+
+    @pyqtSlot()
+    def pause_scan(self):
+        if self.worker is None:
+            return
+        if self.worker.control.is_paused:
+            self.worker.resume()
+            self.pause_scan_button.setText("Pause")
+        else:
+            self.worker.pause()
+            self.pause_scan_button.setText("Resume")
+
+    @pyqtSlot()
+    def abort_scan(self):
+        if self.worker is not None:
+            logger.info("Aborting scan")
+            self.worker.cancel()
+
+    @pyqtSlot(object, str)
+    def on_scan_finished(self, df, status):
+        self.scan_stopped()
+        try:
+            self.finished_handler(df, status)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"An error occurred: {str(e)}")
+
+    @pyqtSlot(str)
+    def on_scan_failed(self, message):
+        self.scan_stopped()
+        QMessageBox.critical(self, "Error", f"An error occurred: {message}")
+
+
+STATUS_COLORS = {"ready": "green", "connecting": "orange", "not connected": "lightgray"}
+
+
+class MainWindow(ScanRunnerMixin, QMainWindow):
+    # Instrument name and status, emitted from the threads opening the instruments
+    instrument_status_changed = pyqtSignal(str, str)
+
+    def __init__(self, simulation=False):
         super().__init__()
+        self.simulation = simulation
         self.setWindowTitle("PyQt5 Scan Application")
         self.setGeometry(100, 100, 800, 600)
         self.setGeometry(100, 100, 400, 300)
@@ -173,6 +304,11 @@ class MainWindow(QMainWindow):
         self.focus_stage_button.setFixedWidth(200)
         layout.addWidget(self.focus_stage_button)
 
+        self.map_focus_button = QPushButton("Map Focus")
+        self.map_focus_button.clicked.connect(self.map_focus)
+        self.map_focus_button.setFixedWidth(200)
+        layout.addWidget(self.map_focus_button)
+
         initialize_container = QVBoxLayout()
 
         initalize_layout = QHBoxLayout()
@@ -190,12 +326,48 @@ class MainWindow(QMainWindow):
         initalize_layout.setAlignment(Qt.AlignLeft)
 
         initialize_container.addLayout( initalize_layout)
+
+        instrument_status_layout = QHBoxLayout()
+        self.instrument_status_labels = {}
+        for name in INSTRUMENTS:
+            label = QLabel(name)
+            label.setStyleSheet(f"background-color: {STATUS_COLORS['not connected']}; padding: 2px;")
+            instrument_status_layout.addWidget(label)
+            self.instrument_status_labels[name] = label
+        instrument_status_layout.setAlignment(Qt.AlignLeft)
+        initialize_container.addLayout(instrument_status_layout)
+        self.instrument_status_changed.connect(self.show_instrument_status)
         layout.addLayout(initialize_container)
 
+        layout.addWidget(QLabel("Select Raster Order"))
+        self.raster_order_combo = QComboBox(self)
+        self.raster_order_combo.addItems(RASTER_ORDERS)
+        self.raster_order_combo.setCurrentText("serpentine")
+        self.raster_order_combo.setFixedWidth(200)
+        layout.addWidget(self.raster_order_combo)
+
+        layout.addWidget(QLabel("Switch Harmonics per"))
+        self.harmonics_mode_combo = QComboBox(self)
+        self.harmonics_mode_combo.addItems(HARMONIC_MODES)
+        self.harmonics_mode_combo.setFixedWidth(200)
+        layout.addWidget(self.harmonics_mode_combo)
+
+        self.fly_scan_checkbox = QCheckBox("Fly scan (continuous motion along x)", self)
+        layout.addWidget(self.fly_scan_checkbox)
+
+        self.adaptive_scan_checkbox = QCheckBox("Adaptive refinement (dense only where the sample changes)", self)
+        layout.addWidget(self.adaptive_scan_checkbox)
+
         self.start_scan_button = QPushButton("Start Scan")
         self.start_scan_button.clicked.connect(self.start_scan)
         self.start_scan_button.setFixedWidth(200)
         layout.addWidget(self.start_scan_button)
+
+        self.resume_scan_button = QPushButton("Resume Scan")
+        self.resume_scan_button.clicked.connect(self.resume_scan)
+        self.resume_scan_button.setFixedWidth(200)
+        layout.addWidget(self.resume_scan_button)
+        self.init_scan_controls(layout)
         
         container = QWidget()
         container.setLayout(layout)
@@ -244,17 +416,38 @@ class MainWindow(QMainWindow):
     def __del__(self): 
         if self.scanner is not None:
             self.scanner.close_connection()
+        sessions.close_all()
           
     @pyqtSlot()
     def initalize(self):
+        """Open the instruments in the background, or close them if some are open or opening.
+
+        The window stays responsive while the instruments open and scans can
+        start at once; they wait only for the instruments they use.
+        """
         if self.scanner is None:
-            self.scanner = NanoScanner("COM3", "USB0::0x05E6::0x2100::1149087::INSTR", "GPIB0::1::INSTR", com_zaber="COM5", com_ccsx='USB0::0x1313::0x8087::M00934802::RAW', com_pem="ASRL6::INSTR")
+            self.scanner = NanoScanner("COM3", "USB0::0x05E6::0x2100::1149087::INSTR", "GPIB0::1::INSTR", com_zaber="COM5", com_ccsx='USB0::0x1313::0x8087::M00934802::RAW', com_pem="ASRL6::INSTR", simulation=self.simulation)
+            self.scanner.on_status = self.instrument_status_changed.emit
+        if any(status in ("ready", "connecting", "timed out") for status in self.scanner.status.values()):
+            # No wait for the instruments still opening, their threads close them once they are open
+            self.scanner.close_connection(timeout=0)
+            logger.info("Closed NanoScanner connection")
+        else:
+            self.scanner.open_instruments()
+            logger.info("Opening the instruments")
+
+    @pyqtSlot(str, str)
+    def show_instrument_status(self, name, status):
+        color = STATUS_COLORS.get(status, "red")
+        self.instrument_status_labels[name].setStyleSheet(f"background-color: {color}; padding: 2px;")
+        self.instrument_status_labels[name].setToolTip(status)
+        statuses = self.scanner.status.values()
+        if all(status == "ready" for status in statuses):
             self.green_laser_button.setStyleSheet("background-color: green; border-radius: 10px;")
-            logger.info("Initialized NanoScanner")
-        else: 
-            self.scanner.close_connection()
+        elif any(status == "connecting" for status in statuses):
+            self.green_laser_button.setStyleSheet("background-color: orange; border-radius: 10px;")
+        else:
             self.green_laser_button.setStyleSheet("background-color: red; border-radius: 10px;")
-            logger.info("Closed NanoScanner connection")
     
 
     # def query_axis_position(self):
@@ -324,10 +517,44 @@ class MainWindow(QMainWindow):
         try: 
             logger.info("Starting auto focus")
             rough_focus = float(self.focus_position_input.text())
-            self.scanner.auto_focus(rough_focus)
-            logger.debug(f"Focused stage at position {rough_focus}")
+            self.run_scan(self.scanner.auto_focus, rough_focus, live_view=self.focus_live_view(),
+                          on_finished=self.focus_finished)
         except Exception as e:
             logger.error(f"An error occurred: {str(e)}")
+
+    def focus_finished(self, z_focus, status):
+        if z_focus is None:
+            QMessageBox.warning(self, "Auto Focus", "Auto focus aborted.")
+            return
+        logger.debug(f"Focused stage at position {z_focus}")
+        self.focus_position_input.setText(f"{z_focus:.1f}")
+
+    def focus_live_view(self):
+        """Live view of the focus curves in the reflection tab."""
+        self.canvas.axes.clear()
+        live_view = LiveView(max_fps=5)
+        live_view.add_line(self.canvas.axes, "z (um)", "v (V)", fmt="o-", xlabel="Focus (um)", ylabel="Voltage (V)")
+        return live_view
+
+    @pyqtSlot()
+    def map_focus(self):
+        """Fit a focus map over the scan area so that the next scans keep the sample in focus."""
+        try:
+            rough_focus = float(self.focus_position_input.text())
+            x_start, x_stop = float(self.x_start_input.text()), float(self.x_stop_input.text())
+            y_start, y_stop = float(self.y_start_input.text()), float(self.y_stop_input.text())
+            logger.info(f"Mapping the focus over ({x_start}, {y_start}) to ({x_stop}, {y_stop})")
+            self.run_scan(self.scanner.map_focus, x_start, x_stop, y_start, y_stop, rough_focus,
+                          live_view=self.focus_live_view(), on_finished=self.focus_map_finished)
+        except Exception as e:
+            logger.error(f"An error occurred: {str(e)}")
+
+    def focus_map_finished(self, focus_map, status):
+        if focus_map is None:
+            QMessageBox.warning(self, "Focus Map", "Focus map aborted, the previous map is kept.")
+            return
+        QMessageBox.information(self, "Focus Map", f"Focus map fitted, rms residual {focus_map.residual():.2f} um")
+
     @pyqtSlot()
     def start_scan(self):
         try:
@@ -340,25 +567,62 @@ class MainWindow(QMainWindow):
             logger.info(f"Starting 2D scan from ({x_start}, {y_start}) to ({x_stop}, {y_stop}) with step size {x_step} x {y_step}")
 
             self.scan_data = []
-            df = self.scanner.scan2d_moke(x_start, x_stop, x_step, y_start, y_stop, y_step)
+            raster = self.raster_order_combo.currentText()
+            harmonics = self.harmonics_mode_combo.currentText()
+            writer = self.open_writer(self.file_path_input.text(), self.file_name_input.text(),
+                                      self.file_format_combo.currentText())
+            if self.fly_scan_checkbox.isChecked():
+                self.run_scan(self.scanner.scan2d_moke_fly, x_start, x_stop, x_step, y_start, y_stop, y_step, writer=writer)
+            elif self.adaptive_scan_checkbox.isChecked():
+                self.run_scan(self.scanner.scan2d_moke_adaptive, x_start, x_stop, x_step, y_start, y_stop, y_step,
+                              writer=writer)
+            else:
+                self.run_scan(self.scanner.scan2d_moke, x_start, x_stop, x_step, y_start, y_stop, y_step, raster=raster,
+                              harmonics=harmonics, writer=writer)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"An error occurred: {str(e)}")
 
+    @pyqtSlot()
+    def resume_scan(self):
+        """Continue an interrupted 2D scan from the HDF5 file it was streamed to."""
+        try:
+            path, _ = QFileDialog.getOpenFileName(self, "Resume Scan", self.file_path_input.text(), "HDF5 files (*.h5)")
+            if path:
+                logger.info(f"Resuming 2D scan from {path}")
+                self.writer = ScanWriter(path)
+                self.run_scan(self.scanner.resume_scan2d_moke, path, writer=self.writer)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"An error occurred: {str(e)}")
+
+    def scan_finished(self, df, status="complete"):
+        try:
             directory_path = self.file_path_input.text()
             directory_path = Path(directory_path)
             file_name = self.file_name_input.text()
+            if status != "complete":
+                file_name = f"{file_name}_{status}"  # the CSV has no attributes, the name tells it is partial
             logging.debug(f"file_name after create file-name {file_name}")
             if directory_path:
                 file_format = self.file_format_combo.currentText()
-                if file_format == "HDF5":
+                if file_format == "HDF5" and self.writer is not None:
+                    file_name = self.writer.path
+                    self.writer.write_result(df)
+                    logger.info(f"Scan data streamed to {file_name}")
+                elif file_format == "HDF5":
                     file_name = self.scanner.generate_filename(directory_path, file_name, extension="h5")
                     logger.info(f"Saving scan data to {file_name}")
                     df.to_hdf(file_name, key='df', mode='w')
+                    mark_status(file_name, status)
                 elif file_format == "CSV":
                     logging.debug("This is file_format == 'CSV'")
                     file_name = self.scanner.generate_filename(directory_path, file_name, extension="csv")
                     logger.info(f"Saving scan data to {file_name}")
                     df.to_csv(file_name, index=False)
                     logging.debug(f"file_name after to_csv {file_name}")
-                QMessageBox.information(self, "Scan Complete", "Scan completed successfully!")
+                if status == "complete":
+                    QMessageBox.information(self, "Scan Complete", "Scan completed successfully!")
+                else:
+                    QMessageBox.warning(self, "Scan Aborted", f"Scan aborted, the partial data was saved to {file_name}")
                 # file_nameImage = f"{self.file_format_combo.currentText()}_image"
                 # file_nameImage = self.scanner.generate_filename(directory_path, file_nameImage, extension="png")
                 # self.canvas.figure.savefig(file_nameImage)
@@ -372,6 +636,20 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"An error occurred: {str(e)}")
     
+    def create_live_view(self):
+        """Live view of a 2D scan drawing into the three canvas tabs."""
+        live_view = LiveView(max_fps=5)
+        for canvas, source, title in [(self.canvas, "v (V)", "Reflection"),
+                                      (self.harmonics1_canvas, lambda data: data["x1 (V)"] / data["v (V)"], "x1/v"),
+                                      (self.harmonics2_canvas, lambda data: data["x2 (V)"] / data["v (V)"], "x2/v")]:
+            canvas.axes.clear()
+            panel = live_view.add_image(canvas.axes, source, title=title, colorbar=canvas.colorbar is None)
+            if canvas.colorbar is None:
+                canvas.colorbar = panel.colorbar
+            else:
+                canvas.colorbar.update_normal(panel.image)
+        return live_view
+
     @pyqtSlot()
     def show_results(self):
         QMessageBox.information(self, "Results", "Displaying scan results...")
@@ -388,11 +666,7 @@ class MainWindow(QMainWindow):
         x1 = df["x1 (V)"].values
         x2 = df["x2 (V)"].values
 
-        x_min = np.unique(x)
-        y_min = np.unique(y)
-        v_reshaped = v.reshape(len(y_min), len(x_min))
-        x1_v = (x1 / v).reshape(len(y_min), len(x_min))
-        x2_v = (x2 / v).reshape(len(y_min), len(x_min))
+        x_min, y_min, (v_reshaped, x1_v, x2_v) = grid_values(x, y, v, x1 / v, x2 / v)
 
         img = self.canvas.axes.pcolormesh(x_min, y_min ,v_reshaped, shading="auto", cmap="viridis")
         if self.canvas.colorbar is None: 
@@ -432,7 +706,7 @@ class MainWindow(QMainWindow):
 
         logger.info("Plotted scan results")
 
-class WavelengthWindow(QMainWindow): 
+class WavelengthWindow(ScanRunnerMixin, QMainWindow): 
     def __init__(self, scanner=None, file_path_input=None, file_format_combo=None, logger=None):
         super().__init__()
         self.setWindowTitle("Second Experiment of Wavelength")
@@ -464,6 +738,15 @@ class WavelengthWindow(QMainWindow):
         self.set_step_input.setPlaceholderText("Enter wavelength step (nm)")
         layout.addWidget(self.set_step_input)
 
+        self.wavelength_list_input = QLineEdit(self)
+        self.wavelength_list_input.setPlaceholderText("Or wavelengths (nm): 720, 750, 800 or start:stop:step (needs a calibration)")
+        layout.addWidget(self.wavelength_list_input)
+
+        self.calibrate_button = QPushButton("Calibrate Wavelength")
+        self.calibrate_button.clicked.connect(self.calibrate_wavelength)
+        self.calibrate_button.setFixedWidth(200)
+        layout.addWidget(self.calibrate_button)
+
         self.add_zaber_index = QComboBox(self)
         self.add_zaber_index.addItems(["Linear", "Rotary"])
         layout.addWidget(self.add_zaber_index)
@@ -472,6 +755,7 @@ class WavelengthWindow(QMainWindow):
         self.start_scan_button.clicked.connect(self.start_scan)
         self.start_scan_button.setFixedWidth(200)
         layout.addWidget(self.start_scan_button)
+        self.init_scan_controls(layout)
 
         container = QWidget()
         container.setLayout(layout)
@@ -513,18 +797,65 @@ class WavelengthWindow(QMainWindow):
                 zaber_index = 1 
             else: 
                 zaber_index = 2
-            df = self.scanner.moke_spectroscopy(step)
+            wavelengths = self.requested_wavelengths()
+            if wavelengths is not None and self.scanner.wavelength_calibration is None:
+                self.scanner.load_wavelength_calibration(self.calibration_path())
+            writer = self.open_writer(self.file_path_input, self.file_name_input.text(), self.file_format_combo)
+            self.run_scan(self.scanner.moke_spectroscopy, step, writer=writer, wavelengths=wavelengths)
+        except Exception as e:
+            self.logger.error(f"An error occurred: {str(e)}")
+
+    def requested_wavelengths(self):
+        """Wavelengths typed as a comma separated list or as start:stop:step, None if the field is empty."""
+        text = self.wavelength_list_input.text().strip()
+        if not text:
+            return None
+        if ":" in text:
+            start, stop, step = (float(value) for value in text.split(":"))
+            return list(np.arange(start, stop + step / 2, step))
+        return [float(value) for value in text.split(",")]
 
+    def calibration_path(self):
+        return Path(self.file_path_input) / "wavelength_calibration.json"
+
+    @pyqtSlot()
+    def calibrate_wavelength(self):
+        try:
+            self.wavelength1_canvas.axes.clear()
+            live_view = LiveView(max_fps=5)
+            live_view.add_line(self.wavelength1_canvas.axes, "position (mm)", "wavelength (nm)", fmt="o-",
+                               xlabel="Zaber position (mm)", ylabel="Wavelength (nm)")
+            self.run_scan(self.scanner.calibrate_wavelength, path=self.calibration_path(), live_view=live_view,
+                          on_finished=self.calibration_finished)
+        except Exception as e:
+            self.logger.error(f"An error occurred: {str(e)}")
+
+    def calibration_finished(self, calibration, status):
+        if calibration is None:
+            QMessageBox.warning(self, "Calibration", "Calibration aborted, the previous calibration is kept.")
+            return
+        low, high = calibration.wavelength_range
+        QMessageBox.information(self, "Calibration", f"Wavelength calibrated from {low:.1f} to {high:.1f} nm")
+
+    def scan_finished(self, df, status="complete"):
+        try:
             directory_path = self.file_path_input
             directory_path = Path(directory_path)
             file_name = self.file_name_input.text()
+            if file_name and status != "complete":
+                file_name = f"{file_name}_{status}"  # the CSV has no attributes, the name tells it is partial
             self.logger.debug(f"file_name after create file-name {file_name}")
             if directory_path and file_name:
                 file_format = self.file_format_combo
-                if file_format == "HDF5":
+                if file_format == "HDF5" and self.writer is not None:
+                    file_name = self.writer.path
+                    self.writer.write_result(df)
+                    self.logger.info(f"Scan data streamed to {file_name}")
+                elif file_format == "HDF5":
                     file_name = self.scanner.generate_filename(directory_path, file_name, extension="h5")
                     self.logger.info(f"Saving scan data to {file_name}")
                     df.to_hdf(file_name, key='df', mode='w')
+                    mark_status(file_name, status)
                 elif file_format == "CSV":
                     self.logger.debug("This is file_format == 'CSV'")
                     file_name = self.scanner.generate_filename(directory_path, file_name, extension="csv")
@@ -532,7 +863,10 @@ class WavelengthWindow(QMainWindow):
                     df.to_csv(file_name, index=False)
 
                     self.logger.debug(f"file_name after to_csv {file_name}")
-                QMessageBox.information(self, "Scan Complete", "Scan completed successfully!")
+                if status == "complete":
+                    QMessageBox.information(self, "Scan Complete", "Scan completed successfully!")
+                else:
+                    QMessageBox.warning(self, "Scan Aborted", f"Scan aborted, the partial data was saved to {file_name}")
             else: 
                 QMessageBox.critical(self, "Error", "Please select a directory to save the scan results.")
 
@@ -540,6 +874,16 @@ class WavelengthWindow(QMainWindow):
         except Exception as e:
             self.logger.error(f"An error occurred: {str(e)}")
     
+    def create_live_view(self):
+        """Live view of a spectrum drawing into the three canvas tabs."""
+        live_view = LiveView(max_fps=5)
+        for canvas, column, label in [(self.wavelength1_canvas, "reflection (a.u,)", "Reflection"),
+                                      (self.wavelength2_canvas, "kerr", "Kerr"),
+                                      (self.wavelength3_canvas, "ellip", "Elliptec")]:
+            canvas.axes.clear()
+            live_view.add_line(canvas.axes, "wavelength (nm)", column, xlabel="Wavelength (nm)", ylabel=label)
+        return live_view
+
     def plot_scan_results(self, df): 
         self.wavelength1_canvas.axes.clear()
         self.wavelength2_canvas.axes.clear()
@@ -575,7 +919,7 @@ if __name__ == "__main__":
     # app_icon.addFile('logo.png', QSize(256,256))
     # app.setWindowIcon(app_icon)
     
-    window = MainWindow()
+    window = MainWindow(simulation="--simulate" in sys.argv)
     window.show()
     sys.exit(app.exec_())
     
@@ -2,7 +2,6 @@ import matplotlib.pyplot as plt
 import time
 from pathlib import Path
 from datetime import datetime
-import pandas as pd
 import logging
 import numpy as np
 from shrc203_VISADriver import SHRC203VISADriver as SHRC203
@@ -11,6 +10,9 @@ from sr830_VISADriver import SR830VISADriver as SR830
 from powermeter import CustomTLPM
 from multizaber import ZaberMultiple
 from ccsxxx import CCSXXX
+from scan_buffer import ScanBuffer, GrowableScanBuffer
+from focus import find_peak
+from spectrum import find_line
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -28,6 +30,7 @@ class MokeSpectro:
         self.keithley.init_hardware()
 
         self.sr830 = SR830(com_sr830)
+        self.sr830.init_hardware()
         self.zaber = ZaberMultiple()
         self.zaber.connect(com_zaber)
         self.index_zaber = index_zaber
@@ -62,8 +65,9 @@ class MokeSpectro:
         axis_name = ["x", "y", "z"]
         x_scan = np.arange(x_start, x_stop, x_step)
 
-        x = np.array([])
-        v = np.array([])
+        data = ScanBuffer([f"{axis_name[axis-1]} (um)", "v (V)"], len(x_scan))
+        x = data[f"{axis_name[axis-1]} (um)"]
+        v = data["v (V)"]
 
         self.shrc.move(x_scan[0], axis)
         time.sleep(5)
@@ -73,32 +77,38 @@ class MokeSpectro:
         for i in range(len(x_scan)):
             self.shrc.move(x_scan[i], axis)
             time.sleep(wait_time)
-            x = np.append(x, x_scan[i])
 
             voltage = np.abs(self.keithley.read())
-            v = np.append(v, voltage)
+            data.write(i, (x_scan[i], voltage))
 
             plt.clf()
-            plt.plot(x, v, "o")
+            plt.plot(x[:i + 1], v[:i + 1], "o")
             plt.pause(0.05)
 
-        df = pd.DataFrame({f"{axis_name[axis-1]} (um)": x, "v (V)": v})
+        df = data.to_dataframe()
         df.to_csv(self.generate_filename(myname, "csv"))
         plt.savefig(self.generate_filename(myname, "png"))
         return x, v
 
-    def auto_focus(self, x, y, z):
+    def auto_focus(self, x, y, z, span=20, tolerance=0.5, max_evaluations=16, wait_time=0.2):
         logger.info(f"Moving to ({x},{y})")
-        self.shrc.move(x, 1)
-        time.sleep(2)
-        self.shrc.move(y, 2)
-        time.sleep(2)
-        z_array, v_array = self.scan1d(z-20, z+20, 0.5, axis=3, myname="scan1d_focus", wait_time=0.2)
-        z_max = z_array[np.argmax(v_array)]
+        self.shrc.move_axes({1: x, 2: y})
+
+        data = GrowableScanBuffer(["z (um)", "v (V)"], chunk_size=max_evaluations)
+
+        def measure(z_position):
+            self.shrc.move(z_position, 3)
+            time.sleep(wait_time)
+            voltage = np.abs(self.keithley.read())
+            data.append((z_position, voltage))
+            return voltage
+
+        z_max, _, _ = find_peak(measure, z - span, z + span, tolerance=tolerance, max_evaluations=max_evaluations)
+        data.to_dataframe().to_csv(self.generate_filename("scan1d_focus", "csv"))
 
         logger.info(f"Moving to z={z_max}")
         self.shrc.move(z_max, 3)
-        time.sleep(1)
+        return z_max
 
     def generate_filename(self, myname, extension="csv"):
         now = datetime.now()
@@ -124,7 +134,8 @@ class MokeSpectro:
     def read_wavelength(self):
         ccs_wavelength = self.ccs.get_wavelength_data()
         ccs_intensity = self.ccs.get_scan_data()
-        return ccs_wavelength[ccs_intensity.argmax()]
+        center, _, _ = find_line(ccs_wavelength, ccs_intensity)
+        return center
 
     def set_wavelength(self, wavelength):
         position = self.wavelength2position(wavelength)
@@ -132,14 +143,8 @@ class MokeSpectro:
 
     def moke_spectrum(self, step=5, myname="moke_spe", wait_time=1):
         x, y, z = self.get_position_xyz()
-        w = np.array([])
-        p = np.array([])
-        v = np.array([])
-        x1 = np.array([])
-        theta1 = np.array([])
-        x2 = np.array([])
-        theta2 = np.array([])
-        moke = np.array([])
+        data = GrowableScanBuffer(["x (um)", "y (um)", "z (um)", "wavelength (nm)", "ref power (W)", "v (V)",
+                                   "reflection (a.u,)", "x1 (V)", "theta1 (deg)", "x2 (V)", "theta2 (deg)", "x2/v/p"])
 
         plt.ion()
 
@@ -155,18 +160,15 @@ class MokeSpectro:
             power = self.read_power(wavelength_current)
 
             voltage = np.abs(self.keithley.read())
-            v = np.append(v, voltage) # -> tab2
-            w = np.append(w, wavelength_current)
 
             x1_value, theta1_value, x2_value, theta2_value = self.read_moke(wait_time)
-            x1 = np.append(x1, x1_value)
-            theta1 = np.append(theta1, theta1_value)
-            x2 = np.append(x2, x2_value)
-            theta2 = np.append(theta2, theta2_value)
-            moke = np.append(moke, x2_value / voltage / power) # -> tab3
+            data.append({"x (um)": x, "y (um)": y, "z (um)": z, "wavelength (nm)": wavelength_current,
+                         "ref power (W)": power, "v (V)": voltage, "reflection (a.u,)": voltage / power, # -> tab2
+                         "x1 (V)": x1_value, "theta1 (deg)": theta1_value, "x2 (V)": x2_value, "theta2 (deg)": theta2_value,
+                         "x2/v/p": x2_value / voltage / power}) # -> tab3
             # similarly moke1 = ... x1_value / voltage / power # -> tab4
-
-            p = np.append(p, power)
+            w = data["wavelength (nm)"]
+            moke = data["x2/v/p"]
 
             res = {"wavelength (nm)": wavelength_current, "ref power (W)": power, "v (V)": voltage, "moke": moke}
             logger.info(res)
@@ -175,7 +177,7 @@ class MokeSpectro:
 
             plt.clf()
             plt.subplot(131) # tab2
-            plt.plot(w, v / p, "o")
+            plt.plot(w, data["reflection (a.u,)"], "o")
             plt.xlabel("Wavelength (nm)")
             plt.ylabel("Reflection (a.u.)")
             plt.title('Reflection')
@@ -194,12 +196,7 @@ class MokeSpectro:
 
         plt.savefig(self.generate_filename(myname, "png"))
 
-        data = {
-            "x (um)": x, "y (um)": y, "z (um)": z, "wavelength (nm)": w, "ref power (W)": p, "v (V)": v,
-            "reflection (a.u,)": v / p, "x1 (V)": x1, "theta1 (deg)": theta1, "x2 (V)": x2, "theta2 (deg)": theta2,
-            "x2/v/p": moke
-        }
-        df = pd.DataFrame(data)
+        df = data.to_dataframe()
         df.to_csv(self.generate_filename(myname, "csv"))
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MotionTimeoutError(Exception):
+    """Raised when a stage does not report ready within the allowed time."""
+
+    def __init__(self, channels, elapsed):
+        self.channels = list(channels)
+        self.elapsed = elapsed
+
+    def __str__(self):
+        return f"Channel(s) {self.channels} still busy after {self.elapsed:.1f} s"
+
+
+class SettleWaiter:
+    """Waits for stage channels to become ready without spinning on the link.
+
+    The caller gives the expected duration of the move (from distance and
+    speed). The waiter sleeps for `lead` times that duration, scaled by a
+    per-channel correction learned from previous moves, then polls the state
+    with an interval growing from `min_poll` to `max_poll`. Every completed
+    wait is reported to `on_settle(channels, expected, actual)` if set.
+    """
+
+    def __init__(self, read_state, min_poll=0.002, max_poll=0.05, backoff=1.5, lead=0.8, timeout=20.):
+        """
+        Args:
+            read_state (callable): read_state(channel) returning "B" while busy
+            min_poll (float): First polling interval after the sleep (s)
+            max_poll (float): Largest polling interval (s)
+            backoff (float): Growth factor of the polling interval
+            lead (float): Fraction of the predicted duration slept before polling
+            timeout (float): Time allowed beyond twice the predicted duration (s)
+        """
+        self.read_state = read_state
+        self.min_poll = min_poll
+        self.max_poll = max_poll
+        self.backoff = backoff
+        self.lead = lead
+        self.timeout = timeout
+        self.ratio = {}
+        self.on_settle = None
+
+    def predict(self, channels, expected):
+        """Expected duration corrected by what previous moves of these channels took."""
+        ratio = max((self.ratio.get(channel, 1.) for channel in channels), default=1.)
+        return expected * ratio
+
+    def wait(self, channels, expected=0., timeout=None):
+        """Block until all `channels` are ready.
+
+        Args:
+            channels (list): Channels that were started
+            expected (float): Predicted duration of the move (s), 0 if unknown
+            timeout (float): Overrides the default timeout for this wait
+        Returns:
+            float: Time taken for the channels to settle (s)
+        """
+        time0 = time.monotonic()
+        predicted = self.predict(channels, expected)
+        limit = 2 * predicted + (self.timeout if timeout is None else timeout)
+        if predicted > 0:
+            time.sleep(self.lead * predicted)
+        poll = self.min_poll
+        busy = list(channels)
+        while True:
+            busy = [channel for channel in busy if self.read_state(channel) == "B"]
+            elapsed = time.monotonic() - time0
+            if not busy:
+                break
+            if elapsed >= limit:
+                raise MotionTimeoutError(busy, elapsed)
+            time.sleep(poll)
+            poll = min(poll * self.backoff, self.max_poll)
+        if expected > 0:
+            # Track actual/expected per channel; a slow average keeps one odd move from
+            # skewing the next prediction.
+            for channel in channels:
+                ratio = self.ratio.get(channel, 1.)
+                self.ratio[channel] = min(max(0.7 * ratio + 0.3 * elapsed / expected, 0.1), 10.)
+        if self.on_settle is not None:
+            self.on_settle(list(channels), predicted, elapsed)
+        return elapsed
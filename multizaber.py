@@ -15,6 +15,7 @@ class ZaberMultiple:
         self.unit = []
         self.unit_object = None
         self.stage_type = []
+        self.connection = None
 
     def get_axis(self, axis):  # The same names of axis (= self.axis_value) and self.axis may be confusing. I would like to rename the attribute or the object name.
         """Return Zaber Actuator Axis"""
@@ -26,7 +27,8 @@ class ZaberMultiple:
 
     def connect(self, port):
         """Connect to the Zaber controller"""
-        device_list = Connection.open_serial_port(port).detect_devices()
+        self.connection = Connection.open_serial_port(port)
+        device_list = self.connection.detect_devices()
         if len(device_list) == 0:
             logger.error("No devices found")
 
@@ -44,6 +46,12 @@ class ZaberMultiple:
                 self.units_update('degree', i)
 
 
+    def close(self):
+        """Close the serial port opened by connect"""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
     def move_abs(self, position, axis):
 
         if (axis > 0):
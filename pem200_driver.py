@@ -1,9 +1,8 @@
-import pyvisa
+from visa_sessions import sessions
 
 class PEM200Driver:
     def __init__(self, resource_name):
         """Initialize the PEM200 driver"""
-        self.rm = None
         self.instrument = None
         self.resource_name = resource_name
         self.retardation = 0.5
@@ -11,8 +10,7 @@ class PEM200Driver:
 
     def connect(self):
         """Connect to the PEM200 device"""
-        self.rm = pyvisa.ResourceManager()
-        self.instrument = self.rm.open_resource(self.resource_name)
+        self.instrument = sessions.open(self.resource_name)
         self.instrument.timeout = 5000  # Set timeout to 5 seconds
         self.instrument.read_termination = '\n'  # Set read termination to newline
         self.instrument.write_termination = '\n'
@@ -94,9 +92,8 @@ class PEM200Driver:
 
     def close(self):
         if self.instrument:
-            self.instrument.close()
-        if self.rm:
-            self.rm.close()
+            sessions.release(self.resource_name)
+            self.instrument = None
 
 # Example usage:
 if __name__ == "__main__":
@@ -0,0 +1,121 @@
+import time
+import threading
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class PowerMonitor:
+    """Samples the laser power in a background thread into a ring buffer of (time, power).
+
+    The times are Unix times (time.time()) at the middle of each reading, so
+    a scan that stamps its points with time.time() can interpolate the power
+    at every point afterwards with power_at(), without reading the power
+    meter during the acquisition. With `capacity` samples every `interval`
+    seconds the buffer covers capacity * interval seconds; older samples are
+    overwritten. Failed readings are not stored: CustomTLPM.get_power
+    returns 0. on errors, and a zero would blow up the power normalization.
+    """
+
+    def __init__(self, read, interval=0.1, capacity=100000):
+        """
+        Args:
+            read (callable): Returns the power in W, e.g. CustomTLPM.get_power. It must be safe to call from another thread
+            interval (float): Time between samples (s)
+            capacity (int): Samples kept
+        """
+        self.read = read
+        self.interval = interval
+        self._times = np.full(capacity, np.nan)
+        self._powers = np.full(capacity, np.nan)
+        self._count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start sampling.
+
+        Returns:
+            bool: False if the monitor was already running
+        """
+        if self.running:
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="power-monitor", daemon=True)
+        self._thread.start()
+        logger.info(f"Power monitor sampling every {self.interval} s")
+        return True
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            time0 = time.time()
+            try:
+                power = self.read()
+            except Exception as e:
+                logger.warning(f"Power monitor reading failed: {e}")
+            else:
+                self.record((time0 + time.time()) / 2, power)
+            self._stop.wait(max(0., self.interval - (time.time() - time0)))
+
+    def record(self, timestamp, power):
+        """Add one sample, e.g. a reading the scan made itself. Readings that are not positive and finite are dropped.
+
+        Returns:
+            bool: Whether the sample was stored
+        """
+        if not (np.isfinite(power) and power > 0):
+            logger.debug(f"Power reading {power} dropped")
+            return False
+        with self._lock:
+            index = self._count % len(self._times)
+            self._times[index] = timestamp
+            self._powers[index] = power
+            self._count += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._times[:] = np.nan
+            self._powers[:] = np.nan
+            self._count = 0
+
+    def snapshot(self):
+        """Copy of the samples in time order.
+
+        Returns:
+            tuple: (times, powers) arrays
+        """
+        with self._lock:
+            capacity = len(self._times)
+            if self._count <= capacity:
+                return self._times[:self._count].copy(), self._powers[:self._count].copy()
+            start = self._count % capacity
+            return np.roll(self._times, -start), np.roll(self._powers, -start)
+
+    def power_at(self, times):
+        """Power interpolated linearly at `times` (Unix times), NaN where there is no sample or time.
+
+        Times up to one interval outside the recorded span get the first or
+        last sample; times further out are NaN, e.g. the start of a scan
+        longer than the buffer.
+        """
+        sample_times, powers = self.snapshot()
+        times = np.asarray(times, dtype=float)
+        if len(sample_times) == 0:
+            return np.full(times.shape, np.nan)
+        power = np.interp(times, sample_times, powers)
+        outside = (times < sample_times[0] - self.interval) | (times > sample_times[-1] + self.interval)
+        return np.where(outside, np.nan, power)
@@ -44,28 +44,40 @@ import logging
 # logger = set_logger(get_module_name(__file__))
 logger = logging.getLogger(__name__)
 
-# if utils.is_64bits():
-path_dll = str(Path(os.environ['VXIPNPPATH64']).joinpath('Win64', 'Bin'))
-# else:
-#     path_dll = str(Path(os.environ['VXIPNPPATH']).joinpath('WinNT', 'Bin'))
-os.add_dll_directory(path_dll)
+TLPM = None
 
 
 def tlpm_path(tlpm: Path):
     return Path(os.environ['VXIPNPPATH']).joinpath('WinNT', 'TLPM', tlpm, 'Python')
 
 
-module_error = True
-for example_str in ['Example', 'Examples']:
-    try:
-        path_python_wrapper = tlpm_path(example_str)
-        sys.path.insert(0, str(path_python_wrapper))
-        import TLPM
-        module_error = False
-        break
-    except ModuleNotFoundError as e:
-        pass
-if module_error:
+def load_tlpm():
+    """Import the TLPM.py wrapper of the Thorlabs dll on first use.
+
+    Loading the dll is slow and only works where the Thorlabs software is
+    installed, so it is deferred until a power meter is opened and importing
+    this module never fails.
+    """
+    global TLPM
+    if TLPM is not None:
+        return TLPM
+    if 'VXIPNPPATH64' not in os.environ:
+        raise ModuleNotFoundError("The VXIPNPPATH64 environment variable is not set, install the Thorlabs Optical Power "
+                                  "Monitor software")
+    # if utils.is_64bits():
+    path_dll = str(Path(os.environ['VXIPNPPATH64']).joinpath('Win64', 'Bin'))
+    # else:
+    #     path_dll = str(Path(os.environ['VXIPNPPATH']).joinpath('WinNT', 'Bin'))
+    os.add_dll_directory(path_dll)
+
+    for example_str in ['Example', 'Examples']:
+        try:
+            path_python_wrapper = tlpm_path(example_str)
+            sys.path.insert(0, str(path_python_wrapper))
+            TLPM = importlib.import_module('TLPM')
+            return TLPM
+        except ModuleNotFoundError:
+            pass
     error = f"The *TLPM.py* python wrapper of thorlabs TLPM dll could not be located on your system. Check if present"\
             f" in one of these path:\n"\
             f"{tlpm_path('Example')}\n"\
@@ -102,7 +114,7 @@ class DeviceInfo:
 class GetInfos:
     def __init__(self, tlpm=None):
         if tlpm is None:
-            tlpm = TLPM.TLPM()
+            tlpm = load_tlpm().TLPM()
         self._tlpm = tlpm
         self._Ndevices = 0
 
@@ -136,16 +148,11 @@ class GetInfos:
                           manufacturer.value.decode(), bool(is_available.value))
 
 
-infos = GetInfos()
-Ndevices = infos.get_connected_ressources_number()
-DEVICE_NAMES = infos.get_devices_name()
-
-
 class CustomTLPM:
     def __init__(self, index=None):
         super().__init__()
         self._index = index
-        self._tlpm = TLPM.TLPM()
+        self._tlpm = load_tlpm().TLPM()
         self.infos = GetInfos(self._tlpm)
 
     def __enter__(self):
@@ -213,8 +220,9 @@ class CustomTLPM:
 
 if __name__ == '__main__':
     from time import sleep
-    print(Ndevices)
-    print(DEVICE_NAMES)
+    infos = GetInfos()
+    print(infos.get_connected_ressources_number())
+    print(infos.get_devices_name())
 
     with CustomTLPM(0) as tlpm:
         print(tlpm.wavelength)
@@ -0,0 +1,43 @@
+import numpy as np
+
+RASTER_ORDERS = ("unidirectional", "serpentine", "column", "column_serpentine")
+
+
+def raster_lines(ny, nx, order="unidirectional"):
+    """Grid indices of a 2D scan grouped into lines, in acquisition order.
+
+    - "unidirectional": rows along x, every row starts at x_scan[0] (flyback)
+    - "serpentine": rows along x, odd rows run backwards (boustrophedon)
+    - "column": columns along y, every column starts at y_scan[0]
+    - "column_serpentine": columns along y, odd columns run backwards
+
+    Args:
+        ny (int): Number of y positions
+        nx (int): Number of x positions
+        order (str): One of RASTER_ORDERS
+    Returns:
+        list of list of (j, i): Indices into (y_scan, x_scan) for every line
+    """
+    if order not in RASTER_ORDERS:
+        raise ValueError(f"Unknown raster order {order}, expected one of {RASTER_ORDERS}")
+    column = order.startswith("column")
+    n_lines, n_points = (nx, ny) if column else (ny, nx)
+    lines = []
+    for line in range(n_lines):
+        points = range(n_points)
+        if order.endswith("serpentine") and line % 2:
+            points = reversed(points)
+        lines.append([(k, line) if column else (line, k) for k in points])
+    return lines
+
+
+def commanded_travel(x_scan, y_scan, order="unidirectional"):
+    """Total distance commanded on each axis to visit the grid in the given order.
+
+    Returns:
+        tuple: (x travel, y travel) in the units of x_scan and y_scan
+    """
+    indices = np.array([index for line in raster_lines(len(y_scan), len(x_scan), order) for index in line])
+    x = np.asarray(x_scan)[indices[:, 1]]
+    y = np.asarray(y_scan)[indices[:, 0]]
+    return float(np.abs(np.diff(x)).sum()), float(np.abs(np.diff(y)).sum())
@@ -0,0 +1,147 @@
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ScanBuffer:
+    """Preallocated columnar storage for a scan on a known grid.
+
+    All columns live in one contiguous block of shape (n_columns, *shape) so a
+    sample is written in place and the finished data can be handed to pandas
+    without copying. Unwritten points are NaN.
+    """
+
+    def __init__(self, columns, shape, dtype=np.float64):
+        """
+        Args:
+            columns (list of str): Column names, in output order
+            shape (int or tuple): Grid shape, e.g. (len(y_scan), len(x_scan))
+            dtype: NumPy dtype of the stored values
+        """
+        if isinstance(shape, int):
+            shape = (shape,)
+        self.columns = list(columns)
+        self.shape = tuple(shape)
+        self._index = {name: k for k, name in enumerate(self.columns)}
+        self._data = np.full((len(self.columns),) + self.shape, np.nan, dtype=dtype)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, name):
+        """Return the column `name` as a view with the grid shape."""
+        return self._data[self._index[name]]
+
+    @property
+    def size(self):
+        """Number of points on the grid."""
+        return int(np.prod(self.shape))
+
+    def flat(self, name):
+        """Return the column `name` as a flat view in row-major grid order."""
+        return self._data[self._index[name]].reshape(-1)
+
+    def write(self, index, values):
+        """Write one sample in place.
+
+        Args:
+            index (int or tuple): Grid index of the sample, e.g. (j, i)
+            values (dict or sequence): Values keyed by column name, or a sequence in column order
+        """
+        self.update(index, values)
+        self.count += 1
+
+    def row(self, index):
+        """Return the values of one sample in column order (a view)."""
+        if not isinstance(index, tuple):
+            index = (index,)
+        return self._data[(slice(None),) + index]
+
+    def update(self, index, values):
+        """Overwrite (some of) the values of an already written sample.
+
+        Args:
+            index (int or tuple): Grid index of the sample
+            values (dict or sequence): Values keyed by column name, or a sequence in column order
+        """
+        if not isinstance(index, tuple):
+            index = (index,)
+        if isinstance(values, dict):
+            for name, value in values.items():
+                self._data[(self._index[name],) + index] = value
+        else:
+            self._data[(slice(None),) + index] = values
+
+    def to_array(self):
+        """Return the data as a (n_points, n_columns) view."""
+        return self._data.reshape(len(self.columns), -1).T
+
+    def to_dataframe(self):
+        """Return the data as a DataFrame backed by the buffer memory."""
+        import pandas as pd
+        return pd.DataFrame(self.to_array(), columns=self.columns, copy=False)
+
+
+class GrowableScanBuffer(ScanBuffer):
+    """Columnar storage for scans whose length is not known in advance.
+
+    Capacity grows in whole chunks (doubling once it exceeds one chunk), so
+    appending is amortized O(1) and the filled part is always a contiguous view.
+    """
+
+    def __init__(self, columns, chunk_size=256, dtype=np.float64):
+        """
+        Args:
+            columns (list of str): Column names, in output order
+            chunk_size (int): Initial capacity and growth granularity
+            dtype: NumPy dtype of the stored values
+        """
+        super().__init__(columns, (chunk_size,), dtype=dtype)
+        self.chunk_size = chunk_size
+
+    def __getitem__(self, name):
+        return self._data[self._index[name], :self.count]
+
+    @property
+    def capacity(self):
+        return self._data.shape[1]
+
+    @property
+    def size(self):
+        return self.count
+
+    def flat(self, name):
+        return self[name]
+
+    def _grow(self):
+        chunks = max(1, self.capacity // self.chunk_size)
+        new_capacity = self.capacity + chunks * self.chunk_size
+        data = np.full((len(self.columns), new_capacity), np.nan, dtype=self._data.dtype)
+        data[:, :self.count] = self._data[:, :self.count]
+        self._data = data
+        logger.debug(f"Scan buffer grown to {new_capacity} points")
+
+    def append(self, values):
+        """Append one sample.
+
+        Args:
+            values (dict or sequence): Values keyed by column name, or a sequence in column order
+        """
+        if self.count == self.capacity:
+            self._grow()
+        if isinstance(values, dict):
+            for name, value in values.items():
+                self._data[self._index[name], self.count] = value
+        else:
+            self._data[:, self.count] = values
+        self.count += 1
+
+    def update(self, index, values):
+        if index >= self.count:
+            raise IndexError(f"Index {index} is beyond the {self.count} appended samples")
+        super().update(index, values)
+
+    def to_array(self):
+        return self._data[:, :self.count].T
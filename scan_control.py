@@ -0,0 +1,98 @@
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ScanAborted(Exception):
+    """Raised inside a scan loop when the scan was cancelled."""
+
+    def __str__(self):
+        return "Scan aborted by the user"
+
+
+class ScanControl:
+    """Progress reporting, pause and cancel for a running scan.
+
+    A scan loop calls start() with the number of points, then point_done()
+    after every sample and line_done() after every line. Those calls report
+    progress to the callbacks, block while the scan is paused and raise
+    ScanAborted once cancel() has been called from another thread.
+    """
+
+    def __init__(self, on_point=None, on_line=None):
+        """
+        Args:
+            on_point (callable): Called as on_point(index, done, total, eta) after every sample
+            on_line (callable): Called as on_line(line, n_lines) after every line
+        """
+        self.on_point = on_point
+        self.on_line = on_line
+        self.total = 0
+        self.done = 0
+        self._time0 = None
+        self._paused_time = 0.
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def is_paused(self):
+        return not self._running.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._running.set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def start(self, total):
+        """Reset progress for a scan of `total` points."""
+        self.total = total
+        self.done = 0
+        self._time0 = time.monotonic()
+        self._paused_time = 0.
+        self.check()
+
+    def elapsed(self):
+        """Scan time in seconds, not counting pauses."""
+        if self._time0 is None:
+            return 0.
+        return time.monotonic() - self._time0 - self._paused_time
+
+    def eta(self):
+        """Estimated remaining time in seconds from the average time per point so far."""
+        if self.done == 0:
+            return float("nan")
+        return self.elapsed() / self.done * (self.total - self.done)
+
+    def check(self):
+        """Block while paused and raise ScanAborted if the scan was cancelled."""
+        if not self._running.is_set():
+            logger.info("Scan paused")
+            time0 = time.monotonic()
+            self._running.wait()
+            self._paused_time += time.monotonic() - time0
+            logger.info("Scan resumed")
+        if self._cancelled.is_set():
+            raise ScanAborted()
+
+    def point_done(self, index=None):
+        self.done += 1
+        if self.on_point is not None:
+            self.on_point(index, self.done, self.total, self.eta())
+        self.check()
+
+    def line_done(self, line, n_lines):
+        if self.on_line is not None:
+            self.on_line(line, n_lines)
+        self.check()
@@ -1,19 +1,25 @@
-import matplotlib.pyplot as plt
 import time
 import os
+import threading
 from pathlib import Path
 from datetime import datetime
-import pandas as pd
 import logging
 import argparse
 import numpy as np
-from powermeter import CustomTLPM
-from multizaber import ZaberMultiple
-from shrc203_VISADriver import SHRC203VISADriver as SHRC203
-from keithley2100_VISADriver import Keithley2100VISADriver as Keithley
-from pymeasure.instruments.srs.sr830 import SR830
-from ccsxxx import CCSXXX
-from pem200_driver import PEM200Driver
+from scan_buffer import ScanBuffer, GrowableScanBuffer
+from scan_control import ScanControl, ScanAborted
+from raster import raster_lines
+from fly import interpolate_positions, bin_samples
+from simulation import SimulatedSetup
+from instrumentation import PhaseTimer
+from scan_writer import ScanWriter
+from executors import InstrumentExecutors
+from drivers import DriverRegistry, LazyInstrument
+from power_monitor import PowerMonitor
+from spectrum import find_line, WavelengthCalibration
+from focus import find_peak, FocusMap, focus_sites
+from adaptive import initial_cells, cell_corners, refine_cells, serpentine_order, resample_grid
+from live_view import grid_extent, line_view, map_view, moke_map_view, spectrum_view
 
 logname = 'scan_logger.log' 
 logging.basicConfig(filename=logname,
@@ -25,41 +31,222 @@ logging.basicConfig(filename=logname,
 logger = logging.getLogger('scanTest')
 logger.addHandler(logging.StreamHandler())
 
+MOKE_COLUMNS = ["x (um)", "y (um)", "v (V)", "v std (V)", "x1 (V)", "kerr", "ellip", "theta1 (deg)", "x2 (V)", "theta2 (deg)",
+                "time (s)"]
+SPECTRO_COLUMNS = ["x (um)", "y (um)", "z (um)", "wavelength (nm)", "ref power (W)", "v (V)", "reflection (a.u,)",
+                   "x1 (V)", "theta1 (deg)", "x2 (V)", "theta2 (deg)", "kerr", "ellip"]
+SCAN_COLUMNS = ["x (um)", "y (um)", "v (V)", "v std (V)"]
+HARMONIC_COLUMNS = {1: ("x1 (V)", "theta1 (deg)"), 2: ("x2 (V)", "theta2 (deg)")}
+HARMONIC_MODES = ("pixel", "line")
+# NanoScanner attribute of every instrument and the name of its driver in the DriverRegistry
+INSTRUMENTS = {"shrc": "shrc203", "keithley": "keithley2100", "sr830": "sr830", "pwmeter": "tlpm", "zaber": "zaber",
+               "pem": "pem200", "wavelength": "ccs"}
+
 
 class NanoScanner: 
-    def __init__(self, com_shrc, com_keithley, com_sr830, com_zaber, com_ccsx, com_pem, index_powermeter=0, index_zaber=1):
-        self.shrc = SHRC203(com_shrc)
-        self.shrc.open_connection()
-        logger.info(f"SHRC203 initialized with COM port: {com_shrc}")
+    """Scans of the MOKE setup.
+
+    The instruments are opened when first used rather than at construction:
+    each one is a LazyInstrument attribute, and the drivers are imported
+    through a DriverRegistry, so a session that only moves the stage never
+    loads the spectrometer or power meter libraries, and a missing driver
+    only fails the scans that need it.
+    """
+    shrc = LazyInstrument()
+    keithley = LazyInstrument()
+    sr830 = LazyInstrument()
+    pwmeter = LazyInstrument()
+    zaber = LazyInstrument()
+    pem = LazyInstrument()
+    wavelength = LazyInstrument()
+
+    def __init__(self, com_shrc, com_keithley, com_sr830, com_zaber, com_ccsx, com_pem, index_powermeter=0, index_zaber=1,
+                 simulation=None, averages=1, concurrent=True, connect_timeout=30.):
+        """
+        Args:
+            com_shrc, com_keithley, com_sr830, com_zaber, com_ccsx, com_pem (str): Instrument addresses
+            index_powermeter (int): Index of the TLPM power meter
+            index_zaber (int): Axis of the Zaber stage tuning the wavelength
+            simulation (SimulatedSetup or bool): Use simulated instruments instead of hardware. True uses default settings
+            averages (int): Keithley readings averaged per pixel, fetched in one buffered transfer
+            concurrent (bool): Query instruments on different buses at the same time (see InstrumentExecutors)
+            connect_timeout (float): Longest wait for an instrument to open (s)
+        """
+        self.averages = averages
+        self.connect_timeout = connect_timeout
+        self.io = InstrumentExecutors(concurrent)
+        if simulation is True:
+            simulation = SimulatedSetup()
+        self.simulation = simulation or None
+        if self.simulation is None:
+            self.drivers = DriverRegistry()
+        else:
+            self.drivers = DriverRegistry(self.simulation.drivers())
+            self.simulation.index_zaber = index_zaber
+            logger.info("Using simulated instruments")
+        self.addresses = {"shrc": com_shrc, "keithley": com_keithley, "sr830": com_sr830, "zaber": com_zaber,
+                          "wavelength": com_ccsx, "pem": com_pem}
+        self._connect_locks = {name: threading.Lock() for name in INSTRUMENTS}
+        self._generation = 0  # incremented by close_connection, discards the opens requested before
+        self.status = dict.fromkeys(INSTRUMENTS, "not connected")
+        self.on_status = None
+        self._pwmeter_lock = threading.Lock()
+        self.power_monitor = PowerMonitor(self.read_power)
 
-        self.keithley = Keithley(com_keithley)
-        self.keithley.init_hardware()
-        logger.info(f"Keithley initialized with COM port: {com_keithley}")
+        self.axis = 1
+        self.focus_map = None
+        self.focus_maps = {}
+        self.spectral_line = None
+        self.wavelength_calibration = None
+        self.index_powermeter = index_powermeter
+        self.index_zaber = index_zaber
 
-        self.sr830 = SR830(com_sr830)
-        logger.info(f"SR830 initialized with COM port: {com_sr830}")
+    @property
+    def connected(self):
+        """Names of the instruments opened so far."""
+        return [name for name in INSTRUMENTS if name in vars(self)]
 
-        self.pwmeter = CustomTLPM()
-        self.pwmeter.open_by_index(index_powermeter)
-        logger.info(f"Powermeter initialized with index: {index_powermeter}")
+    def connect(self, *names, timeout=None, generation=None):
+        """Open instruments that are not open yet, all of them if no name is given.
 
-        self.zaber = ZaberMultiple()
-        self.zaber.connect(com_zaber)
-        logger.info(f"Zaber connected with COM port: {com_zaber}")
+        An instrument being opened by another thread (see open_instruments)
+        is waited for rather than opened twice. An open requested before a
+        close_connection is dropped, and an instrument that finishes opening
+        after the close is closed again rather than kept.
 
-        self.pem = PEM200Driver(com_pem)
-        self.pem.connect()
-        self.pem.set_retardation(0.25)
-        self.pem.set_pem_output(1)
+        Args:
+            names (str): Attribute names of the instruments, keys of INSTRUMENTS
+            timeout (float): Longest wait for an instrument opened by another thread (s), connect_timeout by default
+            generation (int): Close count when the open was requested, now by default
+        Returns:
+            The instrument, for a single name
+        Raises:
+            DriverUnavailable: If the driver of an instrument cannot be imported
+            TimeoutError: If another thread is still opening the instrument after `timeout`
+            ConnectionAbortedError: If close_connection was called since the open was requested
+        """
+        timeout = self.connect_timeout if timeout is None else timeout
+        generation = self._generation if generation is None else generation
+        for name in names or INSTRUMENTS:
+            lock = self._connect_locks[name]
+            if not lock.acquire(timeout=timeout):
+                raise TimeoutError(f"{name} is still being opened after {timeout} s")
+            try:
+                if name not in vars(self):
+                    if generation != self._generation:
+                        raise ConnectionAbortedError(f"{name} was closed before it was opened")
+                    self._set_status(name, "connecting")
+                    try:
+                        instrument = getattr(self, f"_connect_{name}")(self.drivers.get(INSTRUMENTS[name]))
+                    except Exception as e:
+                        logger.error(f"{name} could not be opened: {e}")
+                        self._set_status(name, f"failed: {e}")
+                        raise
+                    if generation != self._generation:
+                        logger.info(f"{name} opened after the instruments were closed, closing it")
+                        self._close_instrument(name, instrument)
+                        self._set_status(name, "not connected")
+                        raise ConnectionAbortedError(f"{name} was closed while it was being opened")
+                    setattr(self, name, instrument)
+                    self._set_status(name, "ready")
+            finally:
+                lock.release()
+        if len(names) == 1:
+            return vars(self)[names[0]]
+
+    def open_instruments(self, names=None, timeout=None):
+        """Open instruments concurrently in background threads and return at once.
+
+        Every instrument is opened in its own thread, so the setup is ready
+        after the slowest instrument rather than the sum of all of them. A
+        scan can start right away: it waits only for the instruments it
+        uses when it first accesses them. Progress is reported through
+        `status` and the `on_status` callback: "connecting", "ready",
+        "failed: <error>", or "timed out" when an instrument is not open
+        after `timeout` (it becomes "ready" if it opens later).
 
-        self.wavelength = CCSXXX(com_ccsx)
-        self.wavelength.connect()
-        logger.info(f"Wavelength meter connected with COM port: {com_ccsx}")
+        Args:
+            names (list): Attribute names of the instruments, all of them by default
+            timeout (float): Time after which an instrument still opening is reported as timed out (s),
+                connect_timeout by default
+        """
+        timeout = self.connect_timeout if timeout is None else timeout
+        generation = self._generation
+        for name in names or INSTRUMENTS:
+            if name in vars(self) or self._connect_locks[name].locked():
+                continue
+            self._set_status(name, "connecting")
+
+            def open_instrument(name=name):
+                try:
+                    self.connect(name, timeout=timeout, generation=generation)
+                except Exception:
+                    pass  # reported through the status
+            # Daemon threads: a device that never answers must not keep the program from exiting
+            threading.Thread(target=open_instrument, name=f"connect-{name}", daemon=True).start()
+            watchdog = threading.Timer(timeout, self._connect_timed_out, (name, timeout))
+            watchdog.daemon = True
+            watchdog.start()
+
+    def _connect_timed_out(self, name, timeout):
+        if self.status[name] == "connecting":
+            logger.error(f"{name} not open after {timeout} s")
+            self._set_status(name, "timed out")
+
+    def _set_status(self, name, status):
+        if self.status[name] == status:
+            return
+        self.status[name] = status
+        if self.on_status is not None:
+            self.on_status(name, status)
+
+    def ready(self, *names):
+        """Whether the instruments are open, all of them if no name is given."""
+        return all(name in vars(self) for name in names or INSTRUMENTS)
+
+    def _connect_shrc(self, SHRC203):
+        shrc = SHRC203(self.addresses["shrc"])
+        shrc.open_connection()
+        logger.info(f"SHRC203 initialized with COM port: {self.addresses['shrc']}")
+        return shrc
+
+    def _connect_keithley(self, Keithley):
+        keithley = Keithley(self.addresses["keithley"])
+        keithley.init_hardware()
+        logger.info(f"Keithley initialized with COM port: {self.addresses['keithley']}")
+        return keithley
+
+    def _connect_sr830(self, SR830):
+        sr830 = SR830(self.addresses["sr830"])
+        sr830.init_hardware()
+        logger.info(f"SR830 initialized with COM port: {self.addresses['sr830']}")
+        return sr830
+
+    def _connect_pwmeter(self, CustomTLPM):
+        pwmeter = CustomTLPM()
+        pwmeter.open_by_index(self.index_powermeter)
+        logger.info(f"Powermeter initialized with index: {self.index_powermeter}")
+        return pwmeter
+
+    def _connect_zaber(self, ZaberMultiple):
+        zaber = ZaberMultiple()
+        zaber.connect(self.addresses["zaber"])
+        logger.info(f"Zaber connected with COM port: {self.addresses['zaber']}")
+        return zaber
+
+    def _connect_pem(self, PEM200Driver):
+        pem = PEM200Driver(self.addresses["pem"])
+        pem.connect()
+        pem.set_retardation(0.25)
+        pem.set_pem_output(1)
+        return pem
+
+    def _connect_wavelength(self, CCSXXX):
+        ccs = CCSXXX(self.addresses["wavelength"])
+        ccs.connect()
+        logger.info(f"Wavelength meter connected with COM port: {self.addresses['wavelength']}")
+        return ccs
 
-        self.axis = 1
-        self.index_powermeter = index_powermeter
-        self.index_zaber = index_zaber
-    
     def home(self): 
         for i in range(3): 
             i+=1            
@@ -85,13 +272,54 @@ class NanoScanner:
         y = self.shrc.query_position(2)
         z = self.shrc.query_position(3)
         return x, y, z
-    def harmonics_one(self): 
-        self.sr830.harmonic = 1
+    def goto_xy(self, x, y, previous=(None, None), focus_at=None):
+        """Move to (x, y), commanding only the axes that differ from `previous`.
+
+        When both axes change they are started together and travel in parallel.
+        With a focus map set (see map_focus), z follows the map in the same
+        move whenever the focus height changes by more than the stage step.
+        Args:
+            focus_at (tuple): (x, y) where the focus map is evaluated, (x, y) by default
+        Returns:
+            tuple: (x, y, z), to be passed as `previous` for the next point. z is None without a focus map
+        """
+        positions = {}
+        if x != previous[0]:
+            positions[1] = x
+        if y != previous[1]:
+            positions[2] = y
+        z = previous[2] if len(previous) > 2 else None
+        if self.focus_map is not None and positions:
+            z_focus = self.focus_map.z(*(focus_at or (x, y)))
+            if z is None or abs(z_focus - z) >= 0.05:
+                positions[3] = z = z_focus
+        if positions:
+            self.shrc.move_axes(positions)
+        return x, y, z
+
+    def read_voltage(self):
+        """Read the Keithley, averaging `self.averages` buffered readings.
+
+        Returns:
+            tuple: Mean and standard deviation of the readings (0 for a single reading)
+        """
+        return self.keithley.read_average(self.averages)
+
+    def select_harmonic(self, harmonic):
+        """Switch the SR830 to `harmonic` and wait for the output to settle, nothing if it is already selected."""
+        if self.sr830.harmonic == harmonic:
+            return
+        self.sr830.harmonic = harmonic
         time.sleep(self.sr830.time_constant*1.1)
 
-        if self.sr830.is_out_of_range():
-            self.sr830.quick_range()
-        x, theta = self.sr830.snap('X', 'Theta')
+    def harmonic_order(self):
+        """Both harmonics, the one currently selected first, so that measuring them in this order needs one switch."""
+        return (2, 1) if self.sr830.harmonic == 2 else (1, 2)
+
+    def harmonics_one(self): 
+        self.select_harmonic(1)
+
+        x, theta = self.sr830.snap_in_range('X', 'Theta')
         return x, theta
 
     def harmonics_two(self): 
@@ -102,24 +330,172 @@ class NanoScanner:
             x2 (float): r value for the second harmonic
             theta2 (float): theta value for the second harmonic
             """
-        self.sr830.harmonic = 2
-        time.sleep(self.sr830.time_constant*1.1)
-        if self.sr830.is_out_of_range():
-            self.sr830.quick_range()
-        x, theta = self.sr830.snap('X', 'Theta')
+        self.select_harmonic(2)
+        x, theta = self.sr830.snap_in_range('X', 'Theta')
         return x, theta
+
+    def read_pixel(self):
+        """Read the detector and the lock-in at both harmonics at the current position.
+
+        The Keithley (USB) is read while the SR830 (GPIB) settles and reads,
+        so a pixel takes as long as the slower of the two.
+        Returns:
+            tuple: ((v, v std), (x1, theta1), (x2, theta2))
+        """
+        return tuple(self.io.gather(("keithley", self.read_voltage), ("sr830", self.harmonics_one),
+                                    ("sr830", self.harmonics_two)))
     
-    def auto_focus(self, z):
+    def auto_focus(self, z, live_view=None, span=40., tolerance=1., max_evaluations=24, model="parabola",
+                   depth_of_focus=8., control=None):
         """Auto focus for the SHRC203 scanner 
+
+        Maximizes the reflected intensity with focus.find_peak: a coarse pass
+        over z +/- span spaced by the depth of focus, a fine sweep if that pass
+        shows no maximum, a golden-section search and a fit of the peak, so the
+        focus lands between the sampled heights.
         Args: 
             z (float): z position
+            live_view (LiveView): View of the focus curve, a pyplot window by default
+            span (float): Half width of the search range around z (um)
+            tolerance (float): Bracket width at which the search stops (um)
+            max_evaluations (int): Most heights measured
+            model (str): Peak model, "parabola" or "gaussian"
+            depth_of_focus (float): Expected depth of focus of the objective, sets the coarse spacing (um)
+            control (ScanControl): Pause and cancel handling, checked before every height
+        Returns:
+            z_focus (float): Focus position in um, None if aborted. The stage then stays at the last height measured
             """
-        z_array, v_array = self.scan1d(z-40, z+40, 1.0, axis = 3, myname = "auto_focus")
-        z_max = z_array[np.argmax(v_array)]
+        data = GrowableScanBuffer(["z (um)", "v (V)"], chunk_size=max_evaluations)
+        if live_view is None:
+            live_view = line_view(x="z (um)", xlabel="Focus (um)")
+        live_view.bind(data)
+
+        def measure(z_position):
+            if control is not None:
+                control.check()
+            self.shrc.move(z_position, 3)
+            voltage, _ = self.read_voltage()
+            data.append((z_position, voltage))
+            live_view.push()
+            return abs(voltage)
+
+        try:
+            z_focus, _, _ = find_peak(measure, z - span, z + span, tolerance=tolerance, max_evaluations=max_evaluations,
+                                      model=model, depth_of_focus=depth_of_focus)
+        except ScanAborted as e:
+            logger.warning(f"{e} after {data.count} focus heights")
+            return None
+        finally:
+            live_view.flush()
+
+        self.shrc.move(z_focus, 3)
+        logger.info(f"Auto focus at position {z_focus} um")
+        return z_focus
+
+
+    def map_focus(self, x_start, x_stop, y_start, y_stop, z, n_sites=3, order=1, sample=None, path=None, live_view=None,
+                  control=None, **focus):
+        """Auto focus at a few sites of an area and fit the focus map that the scans follow.
 
-        self.shrc.move(z_max, 3)
-        logger.info(f"Auto focus at position {z_max} um")
+        Args:
+            x_start, x_stop, y_start, y_stop (float): Area to map, e.g. the range of the next scan
+            z (float): Focus guess for the first site, each next site starts from the previous focus
+            n_sites (int): Sites per axis, n_sites x n_sites in total
+            order (int): 1 fits a plane, 2 a quadratic surface (needs n_sites >= 3)
+            sample (str): Name under which the map is kept in self.focus_maps, see set_focus_map
+            path (str or Path): JSON file the map is saved to, for FocusMap.load
+            live_view (LiveView): View of the focus curves, a pyplot window by default
+            control (ScanControl): Progress per site, pause and cancel handling
+            focus: Options of auto_focus, e.g. span or tolerance
+        Returns:
+            FocusMap: The map, now used by goto_xy. None if aborted. If aborted or failed, the previous map is kept
+        """
+        if control is None:
+            control = ScanControl()
+        if live_view is None:
+            live_view = line_view(x="z (um)", xlabel="Focus (um)")
+        previous_map, self.focus_map = self.focus_map, None
+        sites = []
+        positions = focus_sites(x_start, x_stop, y_start, y_stop, n_sites)
+        try:
+            control.start(len(positions))
+            for i, (x, y) in enumerate(positions):
+                self.shrc.move_axes({1: x, 2: y})
+                z = self.auto_focus(z, live_view=live_view, control=control, **focus)
+                if z is None:
+                    raise ScanAborted()
+                sites.append((x, y, z))
+                control.point_done(i)
+            focus_map = FocusMap.fit(*np.array(sites).T, order=order)
+            if path is not None:
+                focus_map.save(path)
+        except ScanAborted as e:
+            logger.warning(f"{e} after {len(sites)} of {len(positions)} focus sites, keeping the previous focus map")
+            self.focus_map = previous_map
+            return None
+        except BaseException:
+            # A failed map must not leave the scans without the tilt correction they had
+            logger.error("Focus map failed, keeping the previous focus map")
+            self.focus_map = previous_map
+            raise
+        if sample is not None:
+            self.focus_maps[sample] = focus_map
+        self.focus_map = focus_map
+        return focus_map
+
+    def set_focus_map(self, focus_map):
+        """Select the focus map goto_xy follows.
 
+        Args:
+            focus_map (FocusMap or str): A map, the name of a sample mapped before, or None to keep z fixed
+        """
+        if isinstance(focus_map, str):
+            focus_map = self.focus_maps[focus_map]
+        self.focus_map = focus_map
+
+    def instrument(self, timer=None, live_view=None):
+        """Time the instrument calls of the scans by phase.
+
+        Wraps the driver methods on this scanner's instances (and the live
+        view, if given) so that every call is charged to a PhaseTimer phase:
+        move, wait_for_ready, lockin_settle, read, spectrometer, power,
+        zaber, pem and plot. Stage settle times (predicted and actual) are
+        recorded as the settle_expected and settle_actual samples.
+
+        Every instrument whose driver can be imported is opened first.
+
+        Returns:
+            PhaseTimer: The timer collecting the phases
+        """
+        if timer is None:
+            timer = PhaseTimer()
+        # The instruments must be open to wrap their methods, skip those without a driver
+        available = [name for name in INSTRUMENTS if self.drivers.available(INSTRUMENTS[name])]
+        for name in available:
+            self.connect(name)
+        phases = [("shrc", ["move", "move_relative", "move_axes", "move_relative_axes", "home"], "move"),
+                  ("shrc", ["wait_for_ready", "wait_for_ready_axes"], "wait_for_ready"),
+                  ("shrc", ["query_position", "query_positions"], "read"),
+                  ("keithley", ["read", "read_average"], "read"),
+                  ("sr830", ["snap", "is_out_of_range", "quick_range", "acquire_buffer"], "read"),
+                  ("wavelength", ["start_scan", "get_scan_data", "get_wavelength_data"], "spectrometer"),
+                  ("pwmeter", ["get_power"], "power"),
+                  ("zaber", ["move_abs", "move_relative"], "zaber"),
+                  ("pem", ["set_modulation_amplitude"], "pem")]
+        objects = [(getattr(self, name), methods, phase) for name, methods, phase in phases if name in available]
+        objects.append((self, ["select_harmonic"], "lockin_settle"))
+        if live_view is not None:
+            objects.append((live_view, ["bind", "push", "flush"], "plot"))
+        for obj, methods, name in objects:
+            for method in methods:
+                timer.wrap(obj, method, name)
+
+        def on_settle(channels, expected, actual):
+            timer.observe("settle_expected", expected)
+            timer.observe("settle_actual", actual)
+        if "shrc" in available:
+            self.shrc.waiter.on_settle = on_settle
+        return timer
 
     def generate_filename(self, path_root, myname, extension):
         now = datetime.now()
@@ -129,33 +505,149 @@ class NanoScanner:
         return filename
 
     
-    def get_wavelength(self): 
+    def read_spectral_line(self, roi=10.):
+        """Acquire a spectrum and locate the laser line to a fraction of a pixel (see spectrum.find_line).
+
+        The search is restricted to +/- roi nm around the previous line, and
+        falls back to the whole spectrum if the line is not found there.
+        Returns:
+            tuple: (center (nm), linewidth (nm), signal to noise ratio)
+        """
         wave = self.wavelength.get_wavelength_data()
         self.wavelength.start_scan()
         intensity = self.wavelength.get_scan_data()
-        return wave[intensity.argmax()]
+        expected = None if self.spectral_line is None else self.spectral_line[0]
+        line = find_line(wave, intensity, expected, roi)
+        if expected is not None and line[2] < 5:
+            line = find_line(wave, intensity)
+        self.spectral_line = line
+        logger.debug(f"Laser line at {line[0]:.3f} nm, width {line[1]:.3f} nm, SNR {line[2]:.0f}")
+        return line
+
+    def get_wavelength(self): 
+        return self.read_spectral_line()[0]
 
     def wavelength_to_position(self, wavelength): 
         """Convert wavelength to position for the Zaber stage
+
+        Uses the wavelength calibration if there is one, the nominal linear
+        dispersion otherwise.
         Args:
             wavelength (float): Wavelength to convert
         Returns:
             position (float): Position in mm
             """
+        if self.wavelength_calibration is not None:
+            return float(self.wavelength_calibration.position(wavelength))
         position = -66.5 * wavelength + 63840
         return position * 1e-3
+
+    def calibrate_wavelength(self, start=0., stop=13.3, n_points=40, path=None, min_snr=5., live_view=None,
+                             control=None):
+        """Sweep the Zaber once and record the laser wavelength against its position.
+
+        Args:
+            start, stop (float): Zaber range to sweep (mm)
+            n_points (int): Positions measured
+            path (str or Path): JSON file the calibration is saved to, for load_wavelength_calibration
+            min_snr (float): Positions where the laser line is weaker than this are left out
+            live_view (LiveView): View of the wavelength against the position, none by default
+            control (ScanControl): Progress, pause and cancel handling
+        Returns:
+            WavelengthCalibration: The calibration, now used by wavelength_to_position. None if aborted,
+            the previous calibration is then kept
+        """
+        if control is None:
+            control = ScanControl()
+        logger.info(f"Calibrating the wavelength over Zaber positions {start} to {stop} mm")
+        data = ScanBuffer(["position (mm)", "wavelength (nm)"], n_points)
+        if live_view is not None:
+            live_view.bind(data)
+        positions, wavelengths = [], []
+        try:
+            control.start(n_points)
+            for i, position in enumerate(np.linspace(start, stop, n_points)):
+                self.zaber.move_abs(position, self.index_zaber)
+                center, _, snr = self.read_spectral_line()
+                if snr >= min_snr:
+                    positions.append(position)
+                    wavelengths.append(center)
+                else:
+                    logger.warning(f"No laser line at Zaber position {position:.3f} mm (SNR {snr:.1f})")
+                data.write(i, (position, center if snr >= min_snr else np.nan))
+                if live_view is not None:
+                    live_view.push()
+                control.point_done(i)
+        except ScanAborted as e:
+            logger.warning(f"{e} after {data.count} of {n_points} positions, keeping the previous wavelength calibration")
+            return None
+        finally:
+            if live_view is not None:
+                live_view.flush()
+        calibration = WavelengthCalibration(positions, wavelengths)
+        low, high = calibration.wavelength_range
+        logger.info(f"Wavelength calibration from {low:.1f} to {high:.1f} nm with {len(calibration.wavelengths)} points")
+        if path is not None:
+            calibration.save(path)
+        self.wavelength_calibration = calibration
+        return calibration
+
+    def load_wavelength_calibration(self, path):
+        """Use a calibration saved by calibrate_wavelength."""
+        self.wavelength_calibration = WavelengthCalibration.load(path)
+        return self.wavelength_calibration
     
     def get_power(self, wavelength): 
         """Get power from the powermeter
         Args:
             wavelength (float): Wavelength to set the powermeter
         Returns:
-            power (float): Power in W
+            power (float): Power in W, NaN if the reading failed
             """
-        self.pwmeterwavelength = wavelength
-        return self.pwmeter.get_power()
+        with self._pwmeter_lock:
+            self.pwmeter.wavelength = wavelength
+            return self._checked_power(self.pwmeter.get_power())
+
+    def read_power(self):
+        """Power in W at the wavelength set last, safe to call while another thread uses the power meter.
+
+        NaN if the reading failed.
+        """
+        with self._pwmeter_lock:
+            return self._checked_power(self.pwmeter.get_power())
+
+    @staticmethod
+    def _checked_power(power):
+        # CustomTLPM.get_power returns 0. when the reading fails, which would divide the reflection by zero
+        if power is None or not power > 0:
+            logger.warning(f"Power meter reading failed ({power}), using NaN")
+            return float("nan")
+        return power
+
+    def power_trace(self, since=None):
+        """Power monitor samples as a (n, 2) array of (Unix time, power), from `since` on if given."""
+        times, powers = self.power_monitor.snapshot()
+        if since is not None:
+            keep = times >= since - self.power_monitor.interval
+            times, powers = times[keep], powers[keep]
+        return np.column_stack([times, powers])
+
+    def normalize_power(self, df):
+        """Add the laser power interpolated at every point's "time (s)" and the reflection normalized by it.
+
+        Kerr and ellipticity are ratios of lock-in and detector signals that
+        both scale with the laser power, so they need no correction.
+        Returns:
+            df (pd.DataFrame): `df` with "power (W)" and "reflection (a.u,)" columns, unchanged without power samples
+        """
+        if len(self.power_monitor.snapshot()[0]) == 0:
+            return df
+        df["power (W)"] = self.power_monitor.power_at(df["time (s)"].to_numpy())
+        df["reflection (a.u,)"] = df["v (V)"] / df["power (W)"]
+        return df
 
-    def scan2d_moke(self, x_start, x_stop, x_step, y_start, y_stop, y_step, myname="scan_moke"):
+    def scan2d_moke(self, x_start, x_stop, x_step, y_start, y_stop, y_step, myname="scan_moke", live_view=None, control=None,
+                    raster="unidirectional", harmonics="pixel", dwell=0., writer=None, data=None):
         """Perform MOKE scan with SHRC203, Keithley 2100
         Args:
             x_start (float): Start position in x
@@ -165,9 +657,21 @@ class NanoScanner:
             y_stop (float): Stop position in y
             y_step (float): Step size in y
             myname (str): Name of the scan
+            live_view (LiveView): View to push samples into, a pyplot window by default
+            control (ScanControl): Progress, pause and cancel handling
+            raster (str): Acquisition order, one of raster.RASTER_ORDERS. The data is stored on the (y, x) grid whatever the order
+            harmonics (str): "pixel" switches the lock-in between the 1st and 2nd harmonic at every pixel. "line" measures
+                a whole line at one harmonic, then traverses it back at the other, alternating which harmonic comes
+                first so there is one switch (and one settle) per line. Best with the unidirectional order, where the way back
+                ends where the next line starts
+            dwell (float): Wait after each move before reading, in "line" mode (s)
+            writer (ScanWriter): Streams every completed point to disk, closed at the end of the scan
+            data (ScanBuffer): Points already measured, which are skipped (see resume_scan2d_moke)
         Returns: 
-            df (pd.DataFrame): Dataframe with the measurements
+            df (pd.DataFrame): Dataframe with the measurements, NaN where an aborted scan did not reach
             """
+        if harmonics not in HARMONIC_MODES:
+            raise ValueError(f"Unknown harmonics mode {harmonics}, expected one of {HARMONIC_MODES}")
         logger.info("Starting MOKE scan")
         wavelength_read = self.get_wavelength()
         power_read = self.get_power(wavelength_read)
@@ -176,146 +680,519 @@ class NanoScanner:
         x_scan = np.arange(x_start, x_stop, x_step)
         y_scan = np.arange(y_start, y_stop, y_step)
 
-        x = np.array([])
-        y = np.array([])
-        voltage = np.array([])
-        x1 = np.array([])
-        theta1 = np.array([]) 
-        x2 = np.array([]) 
-        theta2 = np.array([]) 
+        if data is None:
+            data = ScanBuffer(MOKE_COLUMNS, (len(y_scan), len(x_scan)))
+
+        if control is None:
+            control = ScanControl()
+        if live_view is None:
+            live_view = moke_map_view()
+        live_view.bind(data, extent=grid_extent(x_scan, y_scan))
+        if writer is not None:
+            writer.start(data.columns, data.shape, scan="scan2d_moke", x_start=x_start, x_stop=x_stop, x_step=x_step,
+                         y_start=y_start, y_stop=y_stop, y_step=y_step, raster=raster, harmonics=harmonics, dwell=dwell,
+                         wavelength=wavelength_read, power=power_read, averages=self.averages,
+                         time_constant=self.sr830.time_constant, sensitivity=getattr(self.sr830, "sensitivity", None),
+                         z=self.shrc.query_position(3),
+                         focus_map=None if self.focus_map is None else self.focus_map.to_json())
+
+        done = np.isfinite(data["x (um)"])
+        lines = [[(j, i) for j, i in line if not done[j, i]] for line in raster_lines(len(y_scan), len(x_scan), raster)]
+        position = (None, None)
+        time0 = time.time()
+        monitor_started = self.power_monitor.start()
+        status = "failed"
+        try:
+            control.start(data.size - int(done.sum()))
+            for n, line in enumerate(lines):
+                if not line:
+                    continue
+                if harmonics == "line":
+                    position = self.scan_line_harmonics(line, x_scan, y_scan, data, position, self.harmonic_order(), dwell,
+                                                        live_view, control, writer)
+                    control.line_done(n, len(lines))
+                    continue
+                for j, i in line:
+                    position = self.measure_moke_point(data, (j, i), x_scan, y_scan, position, live_view, control, writer)
+                control.line_done(n, len(lines))
+            status = "complete"
+        except ScanAborted as e:
+            status = "aborted"
+            logger.warning(f"{e} after {data.count} of {data.size} points")
+        finally:
+            if monitor_started:
+                self.power_monitor.stop()
+            if writer is not None:
+                writer.close(status, power=self.power_trace(time0))
+
+        live_view.flush()
+        df = self.normalize_power(data.to_dataframe())
+        
+        return df
 
-        self.shrc.move(x_scan[0], 1)
-        self.shrc.move(y_scan[0], 2)
+    def resume_scan2d_moke(self, path, live_view=None, control=None, writer=None):
+        """Continue an interrupted scan2d_moke from the HDF5 file it was streaming to.
 
-        plt.ion()
-        for j in range(len(y_scan)):
-            self.shrc.move(y_scan[j], 2)
+        The completed points are loaded from the file, the lock-in time
+        constant and sensitivity and the focus (z, or the focus map) recorded
+        at the start are restored, and the scan continues with the first unfinished pixel in its
+        raster order, appending to the same datasets.
+        Args:
+            path (str or Path): File written by ScanWriter for scan2d_moke
+            live_view (LiveView): View to push samples into, a pyplot window by default
+            control (ScanControl): Progress, pause and cancel handling
+            writer (ScanWriter): Writer for `path`, e.g. to keep a handle on it in the GUI
+        Returns: 
+            df (pd.DataFrame): All the measurements, as returned by scan2d_moke
+            """
+        if writer is None:
+            writer = ScanWriter(path)
+        attrs, rows, indices = writer.reopen()
+        if attrs.get("scan") != "scan2d_moke" or list(attrs["columns"]) != MOKE_COLUMNS:
+            writer.close("failed")
+            raise ValueError(f"{path} is not a scan2d_moke checkpoint")
+
+        data = ScanBuffer(MOKE_COLUMNS, tuple(attrs["shape"]))
+        for row, index in zip(rows, indices):
+            data.write(tuple(index), row)
+        logger.info(f"Resuming scan2d_moke with {data.count} of {data.size} points done")
+
+        self.sr830.time_constant = float(attrs["time_constant"])
+        if "sensitivity" in attrs:
+            self.sr830.sensitivity = float(attrs["sensitivity"])
+        self.shrc.move(float(attrs["z"]), 3)
+        self.focus_map = FocusMap.from_json(attrs["focus_map"]) if "focus_map" in attrs else None
+        self.averages = int(attrs.get("averages", self.averages))
+
+        return self.scan2d_moke(*(float(attrs[name]) for name in ["x_start", "x_stop", "x_step", "y_start", "y_stop", "y_step"]),
+                                live_view=live_view, control=control, raster=str(attrs["raster"]),
+                                harmonics=str(attrs["harmonics"]), dwell=float(attrs.get("dwell", 0.)), writer=writer,
+                                data=data)
+
+    def measure_moke_point(self, data, index, x_scan, y_scan, position, live_view, control, writer=None):
+        """Move to the grid point `index` = (j, i) and measure it at both harmonics.
 
-            for i in range(len(x_scan)):
-                self.shrc.move(x_scan[i], 1)
-
-                x = np.append(x, x_scan[i])
-                y = np.append(y, y_scan[j])
-
-                voltage_current = self.keithley.read()
-                voltage = np.append(voltage, voltage_current)
-
-                x1_value, theta1_value = self.harmonics_one() 
-                x2_value, theta2_value = self.harmonics_two()   
-
-                x1 = np.append(x1, x1_value)
-                theta1 = np.append(theta1, theta1_value)
-                x2 = np.append(x2, x2_value)
-                theta2 = np.append(theta2, theta2_value)
-                plt.clf()
-
-                plt.subplot(131)
-                plt.scatter(x, y, c=voltage)
-                plt.title('Reflection')
-                plt.xlabel('Position X (um)')
-                plt.ylabel('Position Y (um)')
-
-                plt.subplot(132)
-                plt.scatter(x, y, c=x2/voltage)
-                plt.title('x2/v')
-                plt.xlabel('Position X (um)')
-                plt.ylabel('Position Y (um)')
-                plt.pause(0.05)
-
-                plt.subplot(133)
-                plt.scatter(x, y, c=x1/voltage)
-                plt.title('x1/v')
-                plt.xlabel('Position X (um)')
-                plt.ylabel('Position Y (um)')
-                plt.pause(0.05)
-
-        df = pd.DataFrame({"x (um)":x, "y (um)":y, "v (V)":voltage, "x1 (V)":x1, "kerr": x2/voltage, "ellip": x1/voltage, "theta1 (deg)":theta1, "x2 (V)":x2, "theta2 (deg)":theta2})
-        
-        return df
+        Returns:
+            tuple: The commanded (x, y, z) from goto_xy, z None without a focus map, to be passed as `position` for the next point
+        """
+        j, i = index
+        position = self.goto_xy(x_scan[i], y_scan[j], position)
+
+        time0 = time.time()
+        (voltage_current, voltage_std), (x1_value, theta1_value), (x2_value, theta2_value) = self.read_pixel()
+
+        data.write(index, {"x (um)": x_scan[i], "y (um)": y_scan[j], "v (V)": voltage_current, "v std (V)": voltage_std,
+                           "x1 (V)": x1_value, "theta1 (deg)": theta1_value,
+                           "x2 (V)": x2_value, "theta2 (deg)": theta2_value, "time (s)": (time0 + time.time()) / 2})
+        live_view.push()
+        self.complete_point(data, index, control, writer)
+        return position
+
+    def scan2d_moke_adaptive(self, x_start, x_stop, x_step, y_start, y_stop, y_step, coarse_step=None, threshold=0.1,
+                             myname="scan_moke_adaptive", live_view=None, control=None, writer=None):
+        """MOKE map that measures densely only where the sample changes.
+
+        A coarse grid is measured first. Every cell whose reflection or Kerr
+        signal varies over its corners by more than `threshold` times the
+        spread of that signal over the coarse grid is split in two along
+        each axis, and the new corners are measured, until the cells are
+        one step wide. Features smaller than the coarse step can fall between
+        coarse nodes and be missed, so coarse_step should be smaller than
+        the smallest flake of interest.
+        Args:
+            x_start, x_stop, x_step, y_start, y_stop, y_step (float): Grid as in scan2d_moke, the steps are the finest steps
+            coarse_step (float): Step of the first grid (um), 8 times the finest step by default
+            threshold (float): Relative contrast over a cell above which it is refined
+            myname (str): Name of the scan
+            live_view (LiveView): View to push samples into, a pyplot window by default
+            control (ScanControl): Progress, pause and cancel handling. The total grows as cells are refined
+            writer (ScanWriter): Streams every measured point to disk, closed at the end of the scan
+        Returns: 
+            df (pd.DataFrame): The map resampled onto the full grid, measured points keep their values. The
+                "measured" column marks them, so df[df["measured"]] is the point cloud
+            """
+        logger.info("Starting adaptive MOKE scan")
+        wavelength_read = self.get_wavelength()
+        power_read = self.get_power(wavelength_read)
+
+        x_scan = np.arange(x_start, x_stop, x_step)
+        y_scan = np.arange(y_start, y_stop, y_step)
+        if len(x_scan) < 2 or len(y_scan) < 2:
+            raise ValueError("An adaptive scan needs at least 2 points along x and y")
+        if coarse_step is None:
+            coarse_step = 8 * min(x_step, y_step)
+        data = ScanBuffer(MOKE_COLUMNS, (len(y_scan), len(x_scan)))
+
+        if control is None:
+            control = ScanControl()
+        if live_view is None:
+            live_view = moke_map_view()
+        live_view.bind(data, extent=grid_extent(x_scan, y_scan))
+        if writer is not None:
+            writer.start(data.columns, data.shape, scan="scan2d_moke_adaptive", x_start=x_start, x_stop=x_stop,
+                         x_step=x_step, y_start=y_start, y_stop=y_stop, y_step=y_step, coarse_step=coarse_step,
+                         threshold=threshold, wavelength=wavelength_read, power=power_read, averages=self.averages)
+
+        cells = initial_cells(len(y_scan), len(x_scan), max(1, round(coarse_step / y_step)),
+                              max(1, round(coarse_step / x_step)))
+        signals = [data["v (V)"], data["kerr"]]
+        scales = None
+        position = (None, None)
+        level = 0
+        time0 = time.time()
+        monitor_started = self.power_monitor.start()
+        status = "failed"
+        try:
+            control.start(0)
+            while cells:
+                nodes = serpentine_order({node for cell in cells for node in cell_corners(cell)
+                                          if not np.isfinite(data["x (um)"][node])})
+                control.total += len(nodes)
+                for index in nodes:
+                    position = self.measure_moke_point(data, index, x_scan, y_scan, position, live_view, control, writer)
+                if scales is None:
+                    scales = [np.ptp(signal[np.isfinite(signal)]) if np.isfinite(signal).any() else 0. for signal in signals]
+                control.line_done(level, level + 1)
+                logger.info(f"Adaptive scan level {level}: {len(cells)} cells, {len(nodes)} new points")
+                cells = refine_cells(cells, signals, scales, threshold)
+                level += 1
+            status = "complete"
+        except ScanAborted as e:
+            status = "aborted"
+            logger.warning(f"{e} after {data.count} points")
+        finally:
+            if monitor_started:
+                self.power_monitor.stop()
+            if writer is not None:
+                writer.close(status, power=self.power_trace(time0))
+
+        live_view.flush()
+        measured = np.isfinite(data.flat("x (um)"))
+        logger.info(f"Adaptive scan measured {data.count} of {data.size} grid points, "
+                    f"saving {1 - data.count / data.size:.0%} of the full grid")
+        df = data.to_dataframe().copy()
+        if measured.sum() >= 3:
+            cloud = data.to_array()[measured]
+            grid = resample_grid(cloud[:, 0], cloud[:, 1], cloud[:, 2:], x_scan, y_scan)
+            df.iloc[:, 2:] = np.where(measured[:, None], df.iloc[:, 2:], grid.reshape(data.size, -1))
+        grid_x, grid_y = np.meshgrid(x_scan, y_scan)
+        df["x (um)"], df["y (um)"] = grid_x.ravel(), grid_y.ravel()
+        df["measured"] = measured
+        df.attrs.update(measured=data.count, grid_points=data.size)
+        return self.normalize_power(df)
+
+    def complete_point(self, data, index, control, writer=None):
+        """Finish a point of a MOKE map: derive kerr and ellip, stream the row to `writer` and report progress."""
+        voltage = data["v (V)"][index]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            data.update(index, {"kerr": data["x2 (V)"][index] / voltage, "ellip": data["x1 (V)"][index] / voltage})
+        if writer is not None:
+            writer.append(data.row(index), index)
+        control.point_done(index)
+
+    def scan_line_harmonics(self, line, x_scan, y_scan, data, position, order, dwell, live_view, control, writer=None):
+        """Measure one line of scan2d_moke at both harmonics, one harmonic per traversal.
+
+        The first traversal writes the position, the detector voltage and the
+        lock-in output at order[0]; the way back fills in the lock-in output at
+        order[1] on the same pixels.
+
+        Returns:
+            tuple: The last commanded (x, y)
+        """
+        first, second = order
+        self.select_harmonic(first)
+        for j, i in line:
+            position = self.goto_xy(x_scan[i], y_scan[j], position)
+            time.sleep(dwell)
+            time0 = time.time()
+            (voltage, voltage_std), (x_value, theta_value) = self.io.gather(("keithley", self.read_voltage),
+                                                                            ("sr830", self.sr830.snap_in_range, 'X', 'Theta'))
+            x_column, theta_column = HARMONIC_COLUMNS[first]
+            data.write((j, i), {"x (um)": x_scan[i], "y (um)": y_scan[j], "v (V)": voltage, "v std (V)": voltage_std,
+                                x_column: x_value, theta_column: theta_value, "time (s)": (time0 + time.time()) / 2})
+            live_view.push()
+            control.check()
+
+        self.select_harmonic(second)
+        for j, i in reversed(line):
+            position = self.goto_xy(x_scan[i], y_scan[j], position)
+            time.sleep(dwell)
+            x_value, theta_value = self.sr830.snap_in_range('X', 'Theta')
+            x_column, theta_column = HARMONIC_COLUMNS[second]
+            data.update((j, i), {x_column: x_value, theta_column: theta_value})
+            live_view.push()
+            self.complete_point(data, (j, i), control, writer)
+        return position
+
+    def fly_line(self, start, stop, speed, sample, readback_every=10):
+        """Move axis 1 from start to stop without stopping and sample the detectors on the way.
+
+        Every sample gets the monotonic time at the middle of its readout. The
+        position at that time is taken from the commanded velocity profile,
+        corrected by a position readback every `readback_every` samples.
 
-    def moke_spectroscopy(self, step=5, myname="moke_spe"):
+        Args:
+            start, stop (float): Line end points, run-up included (um)
+            speed (float): Cruise speed (um/s)
+            sample (callable): Reads the detectors and returns a tuple of values
+            readback_every (int): Samples between position readbacks
+        Returns:
+            tuple: (positions, values, times) of the samples
+        Raises:
+            ValueError: If the line has no length or its duration cannot be predicted from the speed table
+        """
+        if stop == start:
+            raise ValueError(f"Fly line from {start} to {stop} has no length")
+        _, accel_time = self.shrc.get_velocity(1)
+        duration = self.shrc.expected_duration(abs(stop - start), 1)
+        if accel_time is None or not duration > 0:
+            raise ValueError("Cannot predict the duration of a fly line: the SHRC203 speed table of axis 1 is unknown")
+        times, values, readback_times, readbacks = [], [], [], []
+        self.shrc.move(stop, 1, wait=False)
+        t0 = time.monotonic()
+        try:
+            while time.monotonic() - t0 < duration:
+                time0 = time.monotonic()
+                values.append(sample())
+                times.append((time0 + time.monotonic()) / 2)
+                if len(times) % readback_every == 0:
+                    time0 = time.monotonic()
+                    readbacks.append(self.shrc.query_position(1))
+                    readback_times.append((time0 + time.monotonic()) / 2)
+        except Exception:
+            self.shrc.stop(1)
+            raise
+        self.shrc.wait_for_ready(1)
+        if not times:
+            raise RuntimeError(f"No sample taken during the {duration:.3f} s fly line from {start} to {stop}")
+        positions = interpolate_positions(times, t0, start, stop, speed, accel_time, readback_times, readbacks)
+        return positions, np.array(values), np.array(times)
+
+    def scan2d_moke_fly(self, x_start, x_stop, x_step, y_start, y_stop, y_step, myname="scan_moke_fly", live_view=None,
+                        control=None, speed=None, samples_per_pixel=2, readback_every=10, writer=None):
+        """MOKE scan with continuous motion along x
+        
+        Each line is flown at constant speed twice: forward at one harmonic
+        with the Keithley and the lock-in, and back at the other harmonic with
+        the lock-in only, alternating the order so the lock-in is switched once
+        per line. The time-stamped samples are binned onto the x grid.
+        Args:
+            x_start, x_stop, x_step, y_start, y_stop, y_step (float): Grid, as for scan2d_moke
+            myname (str): Name of the scan
+            live_view (LiveView): View to push samples into, a pyplot window by default
+            control (ScanControl): Progress, pause and cancel handling, checked between lines
+            speed (float): Line speed (um/s). By default each pass gets its own speed, set from the time its samples
+                take so that each pixel gets `samples_per_pixel` samples, capped at the current stage speed and
+                updated after every line from the sampling intervals actually achieved
+            samples_per_pixel (int): Target number of samples per pixel when the speed is automatic
+            readback_every (int): Samples between position readbacks
+            writer (ScanWriter): Streams every completed point to disk, closed at the end of the scan
+        Returns: 
+            df (pd.DataFrame): Same columns as scan2d_moke, NaN for pixels that got no sample
+            """
+        x_scan = np.arange(x_start, x_stop, x_step)
+        y_scan = np.arange(y_start, y_stop, y_step)
+        if not len(x_scan) or not len(y_scan):
+            raise ValueError(f"Empty fly scan grid: x from {x_start} to {x_stop} by {x_step}, "
+                             f"y from {y_start} to {y_stop} by {y_step}")
+        speed_ini, accel_time = self.shrc.get_velocity(1)
+        if not speed_ini or accel_time is None:
+            raise ValueError("Fly scanning needs the speed of axis 1, but the SHRC203 speed table is unknown")
+
+        data = ScanBuffer(MOKE_COLUMNS, (len(y_scan), len(x_scan)))
+        if control is None:
+            control = ScanControl()
+        if live_view is None:
+            live_view = moke_map_view()
+        live_view.bind(data, extent=grid_extent(x_scan, y_scan))
+
+        def sample_forward():
+            voltage, _ = self.read_voltage()
+            return (voltage, voltage ** 2, *self.sr830.snap_in_range('X', 'Theta'))
+
+        def sample_back():
+            return tuple(self.sr830.snap_in_range('X', 'Theta'))
+
+        time0 = time.monotonic()
+        self.shrc.query_position(1)
+        readback_time = time.monotonic() - time0
+        speeds = []
+        for sample in (sample_forward, sample_back):
+            if speed is None:
+                durations = []
+                for _ in range(3):
+                    time0 = time.monotonic()
+                    sample()
+                    durations.append(time.monotonic() - time0)
+                # 20% margin for jitter, so that pixels do not end up without a sample
+                sample_time = 1.2 * (max(durations) + readback_time / readback_every)
+                speeds.append(min(x_step / (samples_per_pixel * sample_time), speed_ini))
+            else:
+                speeds.append(speed)
+        if not min(speeds) > 0:
+            raise ValueError(f"Fly scan speeds must be positive, got {speeds}")
+        logger.info(f"Starting MOKE fly scan at {speeds[0]:.1f} um/s forward, {speeds[1]:.1f} um/s back")
+
+        def line_ends(speeds):
+            # Both passes share the end points, so the run-up is that of the faster one
+            run_up = max(speeds) * accel_time
+            return x_scan[0] - x_step / 2 - run_up, x_scan[-1] + x_step / 2 + run_up
+        if writer is not None:
+            writer.start(data.columns, data.shape, scan="scan2d_moke_fly", x_start=x_start, x_stop=x_stop, x_step=x_step,
+                         y_start=y_start, y_stop=y_stop, y_step=y_step, speed=speeds)
+
+        time0 = time.time()
+        to_unix_time = time0 - time.monotonic()
+        monitor_started = self.power_monitor.start()
+        status = "failed"
+        try:
+            control.start(data.size)
+            # With a focus map, every line is flown at the focus height of its center
+            left, right = line_ends(speeds)
+            position = self.goto_xy(left, y_scan[0], focus_at=(x_scan.mean(), y_scan[0]))
+            for j in range(len(y_scan)):
+                left, right = line_ends(speeds)
+                position = self.goto_xy(left, y_scan[j], position, focus_at=(x_scan.mean(), y_scan[j]))
+                first, second = self.harmonic_order()
+                self.select_harmonic(first)
+                self.shrc.set_velocity(speeds[0], 1)
+                positions, values, times = self.fly_line(left, right, speeds[0], sample_forward, readback_every)
+                forward, counts = bin_samples(positions, values, x_scan, x_step)
+                pixel_times, _ = bin_samples(positions, times + to_unix_time, x_scan, x_step)
+                intervals = [np.diff(times)]
+                self.select_harmonic(second)
+                self.shrc.set_velocity(speeds[1], 1)
+                positions, values, times = self.fly_line(right, left, speeds[1], sample_back, readback_every)
+                back, counts_back = bin_samples(positions, values, x_scan, x_step)
+                intervals.append(np.diff(times))
+                empty = np.count_nonzero(counts == 0) + np.count_nonzero(counts_back == 0)
+                if empty:
+                    logger.warning(f"Line {j}: {empty} pixels without samples")
+                if speed is None:
+                    # Pace the next line on the slowest 10% of the sampling intervals of this one
+                    speeds = [min(x_step / (samples_per_pixel * 1.2 * np.percentile(interval, 90)), speed_ini)
+                              if len(interval) else pass_speed for interval, pass_speed in zip(intervals, speeds)]
+
+                std = np.sqrt(np.maximum(forward[:, 1] - forward[:, 0] ** 2, 0))
+                for i in range(len(x_scan)):
+                    row = {"x (um)": x_scan[i], "y (um)": y_scan[j], "v (V)": forward[i, 0], "v std (V)": std[i],
+                           "time (s)": pixel_times[i]}
+                    row.update(zip(HARMONIC_COLUMNS[first], forward[i, 2:]))
+                    row.update(zip(HARMONIC_COLUMNS[second], back[i]))
+                    data.write((j, i), row)
+                    self.complete_point(data, (j, i), control, writer)
+                live_view.push()
+                control.line_done(j, len(y_scan))
+            status = "complete"
+        except ScanAborted as e:
+            status = "aborted"
+            logger.warning(f"{e} after {data.count} of {data.size} points")
+        finally:
+            self.shrc.set_velocity(speed_ini, 1)
+            if monitor_started:
+                self.power_monitor.stop()
+            if writer is not None:
+                writer.close(status, power=self.power_trace(time0))
+
+        live_view.flush()
+        return self.normalize_power(data.to_dataframe())
+
+    def moke_spectroscopy(self, step=5, myname="moke_spe", live_view=None, control=None, writer=None, wavelengths=None,
+                          tolerance=1.):
         """Perform MOKE spectroscopy with SHRC203, Keithley 2100, and SR830
         Args:
             step (float): Step size for the Zaber
             myname (str): Name of the scan
+            live_view (LiveView): View to push samples into, a pyplot window by default
+            control (ScanControl): Progress, pause and cancel handling
+            writer (ScanWriter): Streams every wavelength to disk, closed at the end of the scan
+            wavelengths (sequence): Wavelengths to measure (nm). The Zaber is sent straight to each of them with the
+                wavelength calibration (see calibrate_wavelength) and the wavelength is verified with a single CCS
+                read, instead of stepping by `step` from 970 nm down to 700 nm
+            tolerance (float): Difference between a requested and a measured wavelength that is logged as a warning (nm)
         Returns: 
             df (pd.DataFrame): Dataframe with the measurements
             """
+        if wavelengths is not None:
+            if self.wavelength_calibration is None:
+                raise ValueError("Measuring a list of wavelengths needs a wavelength calibration, run calibrate_wavelength")
+            low, high = self.wavelength_calibration.wavelength_range
+            outside = [wavelength for wavelength in wavelengths if not low <= wavelength <= high]
+            if outside:
+                logger.warning(f"Skipping {outside} nm, outside the calibrated range {low:.1f}-{high:.1f} nm")
+            wavelengths = [wavelength for wavelength in wavelengths if low <= wavelength <= high]
         logger.info("Starting MOKE spectroscopy")
         x, y, z = self.get_position_xyz()
-        voltage = np.array([])
-        power = np.array([])
-        wavelength = np.array([])
-        x1 = np.array([])
-        theta1 = np.array([])
-        x2 = np.array([])
-        theta2 = np.array([])
-
-        plt.ion() 
-
-        self.zaber.move_abs(0, self.index_zaber)
-
-        wavelength_read = self.get_wavelength()
-        wavelength_last = wavelength_read
-
-        while wavelength_read > 700:
-            if wavelength_read > wavelength_last:
-                logger.info("Current wavelength is larger than the previous wavelength. Breaking the loop.")
-                break            
-            zaber_shift = 13.3 / (970 - 690) * step
-            self.zaber.move_relative(zaber_shift, self.index_zaber)
-
-            wavelength_read = self.get_wavelength()
-            power_read = self.get_power(wavelength_read)
-            self.pem.set_modulation_amplitude(wavelength_read)
-
-            wavelength_last = wavelength_read
-            voltage_read = self.keithley.read()
-
-            voltage = np.append(voltage, voltage_read)
-            wavelength = np.append(wavelength, wavelength_read)
-
-            x1_value, theta1_value = self.harmonics_one()
-            x2_value, theta2_value = self.harmonics_two()
-
-            x1 = np.append(x1, x1_value)
-            theta1 = np.append(theta1, theta1_value)
-            x2 = np.append(x2, x2_value)
-            theta2 = np.append(theta2, theta2_value)
-            power = np.append(power, power_read)
-
-            plt.clf()
-            plt.subplot(131)
-            plt.plot(wavelength, voltage / power, "o")
-            plt.title("Reflection")
-            plt.xlabel("Wavelength (nm)")
-            plt.ylabel("Reflection (a.u.)")
-
-            plt.subplot(132)
-            plt.plot(wavelength, x2/voltage, "o")
-            plt.title("Kerr")
-            plt.xlabel("Wavelength (nm)")
-            plt.ylabel("Kerr (a.u.)")
-            plt.pause(0.05)
-
-            plt.subplot(133)
-            plt.plot(wavelength, x1/voltage, "o")
-            plt.title("Ellipticity")
-            plt.xlabel("Wavelength (nm)")
-            plt.ylabel("Ellipticity (a.u.)")
-            plt.pause(0.05)
-
-
-        data = {
-            "x (um)": x, "y (um)": y, "z (um)": z, "wavelength (nm)": wavelength, "ref power (W)": power, "v (V)": voltage,
-            "reflection (a.u,)": voltage / power, "x1 (V)": x1, "theta1 (deg)": theta1, "x2 (V)": x2, "theta2 (deg)": theta2,
-            "kerr": x2/voltage, "ellip": x1/voltage
-        }
-        
-        df = pd.DataFrame(data)
+        data = GrowableScanBuffer(SPECTRO_COLUMNS)
+        zaber_shift = 13.3 / (970 - 690) * step
+
+        if control is None:
+            control = ScanControl()
+        if live_view is None:
+            live_view = spectrum_view()
+        live_view.bind(data)
+        if writer is not None:
+            writer.start(data.columns, (), scan="moke_spectroscopy", step=step, x=x, y=y, z=z, wavelengths=wavelengths)
+
+        def measure(wavelength_read):
+            def read_lockin():
+                # The lock-in signal depends on the PEM modulation, so these two run in sequence
+                self.pem.set_modulation_amplitude(wavelength_read)
+                return self.harmonics_one() + self.harmonics_two()
+
+            power_read, (voltage_read, _), (x1_value, theta1_value, x2_value, theta2_value) = self.io.gather(
+                ("pwmeter", self.get_power, wavelength_read), ("keithley", self.read_voltage), ("sr830", read_lockin))
+
+            data.append({"x (um)": x, "y (um)": y, "z (um)": z, "wavelength (nm)": wavelength_read,
+                         "ref power (W)": power_read, "v (V)": voltage_read,
+                         "reflection (a.u,)": voltage_read / power_read,
+                         "x1 (V)": x1_value, "theta1 (deg)": theta1_value, "x2 (V)": x2_value, "theta2 (deg)": theta2_value,
+                         "kerr": x2_value / voltage_read, "ellip": x1_value / voltage_read})
+            live_view.push()
+            if writer is not None:
+                writer.append(data.row(data.count - 1), data.count - 1)
+            control.point_done(data.count - 1)
+
+        status = "failed"
+        try:
+            if wavelengths is not None:
+                control.start(len(wavelengths))
+                for wavelength in wavelengths:
+                    self.zaber.move_abs(self.wavelength_to_position(wavelength), self.index_zaber)
+                    wavelength_read = self.get_wavelength()
+                    if abs(wavelength_read - wavelength) > tolerance:
+                        logger.warning(f"Requested {wavelength} nm, measured {wavelength_read:.2f} nm")
+                    measure(wavelength_read)
+            else:
+                control.start(max(1, int((970 - 700) / step)))
+                self.zaber.move_abs(0, self.index_zaber)
+
+                wavelength_read = self.get_wavelength()
+                wavelength_last = wavelength_read
+
+                while wavelength_read > 700:
+                    if wavelength_read > wavelength_last:
+                        logger.info("Current wavelength is larger than the previous wavelength. Breaking the loop.")
+                        break            
+                    self.zaber.move_relative(zaber_shift, self.index_zaber)
+
+                    wavelength_read = self.get_wavelength()
+                    wavelength_last = wavelength_read
+                    measure(wavelength_read)
+            status = "complete"
+        except ScanAborted as e:
+            status = "aborted"
+            logger.warning(f"{e} after {data.count} wavelengths")
+        finally:
+            if writer is not None:
+                writer.close(status)
+
+        live_view.flush()
+        df = data.to_dataframe()
         return df
 
-    def scan1d(self, x_start, x_stop, x_step, axis =1, myname = "scan1d"):
+    def scan1d(self, x_start, x_stop, x_step, axis =1, myname = "scan1d", live_view=None, control=None):
         """ Scan 1D area with SHRC203 and Keithley 2100
         Args:
             x_start (float): Start position
@@ -323,79 +1200,125 @@ class NanoScanner:
             x_step (float): Step size
             axis (int): Axis to scan
             myname (str): Name of the scan
-            wait_time (float): Wait time between measurements
+            live_view (LiveView): View to push samples into, a pyplot window by default
+            control (ScanControl): Progress, pause and cancel handling
             """
         x_scan = np.arange(x_start, x_stop, x_step)
-        x = np.array([])
-        v = np.array([])
-        
-        self.shrc.move(x_scan[0], axis)
-
-        plt.ion()
-
+        data = ScanBuffer(["x (um)", "v (V)"], len(x_scan))
+        x = data["x (um)"]
+        v = data["v (V)"]
 
-        for i in range(len(x_scan)):
-            self.shrc.move(x_scan[i], axis)
-            x = np.append(x, x_scan[i])
+        if control is None:
+            control = ScanControl()
+        if live_view is None:
+            live_view = line_view()
+        live_view.bind(data)
 
-            voltage = self.keithley.read()
+        try:
+            control.start(data.size)
+            self.shrc.move(x_scan[0], axis)
 
-            v = np.append(v, voltage)
-
-            plt.clf()
-            plt.plot(x, v,)
-            plt.xlabel("Position (um)")
-            plt.ylabel("Voltage (V)")
+            for i in range(len(x_scan)):
+                self.shrc.move(x_scan[i], axis)
 
-            plt.pause(0.05)
+                voltage, _ = self.read_voltage()
+                data.write(i, (x_scan[i], voltage))
+                live_view.push()
+                control.point_done(i)
+        except ScanAborted as e:
+            logger.warning(f"{e} after {data.count} of {data.size} points")
 
+        live_view.flush()
         return x, v
 
-    def scan2d(self, x_start, x_stop, x_step, y_start, y_stop, y_step, myname="scan"):
+    def scan2d(self, x_start, x_stop, x_step, y_start, y_stop, y_step, myname="scan", live_view=None, control=None,
+               raster="unidirectional", writer=None):
         x_scan = np.arange(x_start, x_stop, x_step)
         y_scan = np.arange(y_start, y_stop, y_step)
 
-        x = np.array([])
-        y = np.array([])
-        v = np.array([])
-
-        plt.ion()
-
-        for j in range(len(y_scan)):
-            self.shrc.move(y_scan[j], 2)
-
-            for i in range(len(x_scan)):
-                self.shrc.move(x_scan[i], 1)
-                x = np.append(x, x_scan[i])
-                y = np.append(y, y_scan[j])
-
-                voltage = self.keithley.read()
-
-                v = np.append(v, voltage)
-
-                plt.clf()
-                plt.scatter(x, y, c=v)
-                plt.xlabel("Position (um)")
-                plt.ylabel("Voltage (V)")
+        data = ScanBuffer(SCAN_COLUMNS, (len(y_scan), len(x_scan)))
+        if control is None:
+            control = ScanControl()
+        if live_view is None:
+            live_view = map_view()
+        live_view.bind(data, extent=grid_extent(x_scan, y_scan))
+        if writer is not None:
+            writer.start(data.columns, data.shape, scan="scan2d", x_start=x_start, x_stop=x_stop, x_step=x_step,
+                         y_start=y_start, y_stop=y_stop, y_step=y_step, raster=raster, averages=self.averages)
+
+        lines = raster_lines(len(y_scan), len(x_scan), raster)
+        position = (None, None)
+        status = "failed"
+        try:
+            control.start(data.size)
+            for n, line in enumerate(lines):
+                for j, i in line:
+                    position = self.goto_xy(x_scan[i], y_scan[j], position)
+
+                    voltage, voltage_std = self.read_voltage()
+                    data.write((j, i), (x_scan[i], y_scan[j], voltage, voltage_std))
+                    live_view.push()
+                    if writer is not None:
+                        writer.append(data.row((j, i)), (j, i))
+                    control.point_done((j, i))
+                control.line_done(n, len(lines))
+            status = "complete"
+        except ScanAborted as e:
+            status = "aborted"
+            logger.warning(f"{e} after {data.count} of {data.size} points")
+        finally:
+            if writer is not None:
+                writer.close(status)
+
+        live_view.flush()
+        df = data.to_dataframe()
+        return df
 
-                plt.pause(0.05)
+    def close_connection(self, timeout=None): 
+        """Close the instruments opened so far. They are opened again if used afterwards.
 
-        plt.pcolormesh(x_scan,y_scan,v.reshape(len(x_scan), len(y_scan)), shading="auto")
-        plt.colorbar()
-        df = pd.DataFrame({"x (um)":x, "y (um)":y, "v (V)":v})
-        return df
+        Instruments still being opened (see open_instruments) are waited for
+        and closed. One still opening after `timeout` is closed by its
+        opening thread as soon as it opens. An instrument failing to close
+        is logged, the others are still closed.
 
-    def close_connection(self): 
-        self.shrc.close()
-        self.keithley.close()
-        self.pem.set_pem_output(0)
-        self.pem.close()
+        Args:
+            timeout (float): Longest wait for the instruments being opened (s), connect_timeout by default
+        """
+        timeout = self.connect_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        self._generation += 1
+        self.power_monitor.stop()
+        self.io.shutdown()
+        for name in INSTRUMENTS:
+            lock = self._connect_locks[name]
+            if not lock.acquire(timeout=max(0., deadline - time.monotonic())):
+                logger.warning(f"{name} is still being opened, it will be closed once it opens")
+                self._set_status(name, "not connected")
+                continue
+            try:
+                if name in vars(self):
+                    self._close_instrument(name, vars(self)[name])
+                    delattr(self, name)
+                self._set_status(name, "not connected")
+            finally:
+                lock.release()
+
+    def _close_instrument(self, name, instrument):
+        try:
+            if name == "pem":
+                instrument.set_pem_output(0)
+            instrument.close()
+        except Exception as e:
+            logger.error(f"{name} could not be closed: {e}")
 
 if __name__ == '__main__':
         parser = argparse.ArgumentParser(description='Scan a 2D area with a SHRC203 and a Keithley 2100')
         parser.add_argument('num_scans', type = int, help = 'Number of scans to perform')
+        parser.add_argument('--simulate', action='store_true', help='Use simulated instruments instead of hardware')
+        parser.add_argument('--averages', type=int, default=1, help='Keithley readings averaged per pixel')
         args = parser.parse_args()
 
-        scanner = NanoScanner("COM3", "USB0::0x05E6::0x2100::1149087::INSTR", "GPIB0::1::INSTR", com_zaber="COM5", com_ccsx='USB0::0x1313::0x8087::M00934802::RAW', com_pem="ASRL6::INSTR") # Replace with an actual visa resource.
+        scanner = NanoScanner("COM3", "USB0::0x05E6::0x2100::1149087::INSTR", "GPIB0::1::INSTR", com_zaber="COM5", com_ccsx='USB0::0x1313::0x8087::M00934802::RAW', com_pem="ASRL6::INSTR", simulation=args.simulate, averages=args.averages) # Replace with an actual visa resource.
         index_zaber = 1
         index_powermeter = 0
\ No newline at end of file
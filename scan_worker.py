@@ -0,0 +1,71 @@
+import logging
+from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+from scan_control import ScanControl
+
+logger = logging.getLogger(__name__)
+
+
+class ScanWorker(QObject):
+    """Runs a NanoScanner scan method in a QThread and reports progress with Qt signals.
+
+    The scan method must accept a `control` keyword argument (ScanControl).
+    Signals are emitted from the worker thread and delivered to GUI slots
+    through queued connections.
+    """
+    point_acquired = pyqtSignal(object, int, int)
+    progress = pyqtSignal(int, int, float)
+    line_finished = pyqtSignal(int, int)
+    finished = pyqtSignal(object, str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, scan, *args, **kwargs):
+        """
+        Args:
+            scan (callable): Scan method, e.g. scanner.scan2d_moke
+            args, kwargs: Arguments passed to the scan method
+        """
+        super().__init__()
+        self.scan = scan
+        self.args = args
+        self.kwargs = kwargs
+        self.control = ScanControl(on_point=self._on_point, on_line=self._on_line)
+        self.worker_thread = None
+
+    def _on_point(self, index, done, total, eta):
+        self.point_acquired.emit(index, done, total)
+        self.progress.emit(done, total, eta)
+
+    def _on_line(self, line, n_lines):
+        self.line_finished.emit(line, n_lines)
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            result = self.scan(*self.args, control=self.control, **self.kwargs)
+            # Scans return their partial data when aborted, the status tells the two apart
+            self.finished.emit(result, "aborted" if self.control.is_cancelled else "complete")
+        except Exception as e:
+            logger.error(f"Scan failed: {e}")
+            self.failed.emit(str(e))
+
+    def start(self):
+        """Move the worker to a new QThread and start the scan."""
+        self.worker_thread = QThread()
+        self.moveToThread(self.worker_thread)
+        self.worker_thread.started.connect(self.run)
+        self.finished.connect(self.worker_thread.quit)
+        self.failed.connect(self.worker_thread.quit)
+        self.worker_thread.start()
+
+    def cancel(self):
+        self.control.cancel()
+
+    def pause(self):
+        self.control.pause()
+
+    def resume(self):
+        self.control.resume()
+
+    @property
+    def is_running(self):
+        return self.worker_thread is not None and self.worker_thread.isRunning()
@@ -0,0 +1,200 @@
+import time
+import logging
+from datetime import datetime
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ScanWriter:
+    """Streams completed scan points to a chunked HDF5 file while the scan runs.
+
+    Rows are appended in acquisition order to the "data" dataset (one column
+    per scan column) together with their grid index in "index". The scan
+    parameters are stored as attributes before the first row; further arrays
+    can be added as datasets when the writer is closed. The file is in
+    SWMR mode, so another process can open it read-only with
+    h5py.File(path, "r", swmr=True) and call dataset.refresh() to follow the
+    scan. Pending rows are written at least every `flush_interval` seconds, so
+    a crash loses at most that much data. When the writer is closed, the
+    "status" attribute records whether the scan completed, was aborted or
+    failed. The file doubles as the checkpoint of the scan: reopen() loads the
+    completed points so that the scan can continue appending to it.
+    """
+
+    def __init__(self, path, chunk_rows=256, flush_interval=5.):
+        """
+        Args:
+            path (str or Path): HDF5 file to create
+            chunk_rows (int): Rows per HDF5 chunk, also the most rows kept in memory between flushes
+            flush_interval (float): Longest time rows are kept in memory (s)
+        """
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.flush_interval = flush_interval
+        self.columns = None
+        self.count = 0
+        self._file = None
+        self._pending = []
+        self._pending_index = []
+        self._last_flush = None
+
+    def start(self, columns, shape, **attrs):
+        """Create the file and its datasets and switch to SWMR mode.
+
+        Args:
+            columns (list of str): Column names
+            shape (tuple): Grid shape of the scan, () if it is not known in advance
+            attrs: Scan parameters stored as file attributes (numbers, strings or arrays)
+        """
+        if self._file is not None:
+            return  # reopened to resume a scan
+        import h5py
+        self.columns = list(columns)
+        ndim = max(len(shape), 1)
+        self._file = h5py.File(self.path, "w", libver="latest")
+        self._data = self._file.create_dataset("data", shape=(0, len(self.columns)), maxshape=(None, len(self.columns)),
+                                               chunks=(self.chunk_rows, len(self.columns)), dtype="f8",
+                                               fillvalue=np.nan)
+        self._index = self._file.create_dataset("index", shape=(0, ndim), maxshape=(None, ndim),
+                                                chunks=(self.chunk_rows, ndim), dtype="i8")
+        self._file.attrs["columns"] = self.columns
+        self._file.attrs["shape"] = np.asarray(shape, dtype=int)
+        self._file.attrs["start_time"] = datetime.now().isoformat()
+        self._file.attrs["status"] = "running"
+        for name, value in attrs.items():
+            if value is not None:
+                self._file.attrs[name] = value
+        self._file.swmr_mode = True
+        self._last_flush = time.monotonic()
+        logger.info(f"Streaming scan data to {self.path}")
+
+    def reopen(self):
+        """Open an existing file to append to it, e.g. to resume an interrupted scan.
+
+        Returns:
+            tuple: (attributes, rows, indices) already in the file
+        """
+        import h5py
+        self._file = h5py.File(self.path, "r+", libver="latest")
+        self._data = self._file["data"]
+        self._index = self._file["index"]
+        attrs = dict(self._file.attrs)
+        rows, indices = self._data[...], self._index[...]
+        self.columns = list(attrs["columns"])
+        self.count = len(rows)
+        self._file.attrs["status"] = "running"
+        self._file.attrs["resumed"] = int(attrs.get("resumed", 0)) + 1
+        self._file.swmr_mode = True
+        self._last_flush = time.monotonic()
+        logger.info(f"Resuming {self.path} after {self.count} points")
+        return attrs, rows, indices
+
+    def append(self, row, index=0):
+        """Queue one completed point, writing to the file when a chunk is full or flush_interval has passed.
+
+        Args:
+            row (sequence): Values in column order, e.g. ScanBuffer.row(index)
+            index (int or tuple): Grid index of the point
+        """
+        self._pending.append(np.array(row, dtype=float))
+        self._pending_index.append(np.atleast_1d(index))
+        if len(self._pending) >= self.chunk_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write the queued rows and make them visible to readers."""
+        if self._file is None:
+            return
+        if self._pending:
+            n = len(self._pending)
+            self._data.resize(self.count + n, axis=0)
+            self._data[self.count:] = np.stack(self._pending)
+            self._index.resize(self.count + n, axis=0)
+            self._index[self.count:] = np.stack(self._pending_index)
+            self.count += n
+            self._pending.clear()
+            self._pending_index.clear()
+        self._data.flush()
+        self._index.flush()
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self, status="complete", **datasets):
+        """Flush, close and record the final status ("complete", "aborted" or "failed").
+
+        Args:
+            status (str): Final status of the scan
+            datasets: Arrays recorded alongside the scan (e.g. a power trace), stored as datasets of these names.
+                An existing dataset, from before the scan was resumed, is extended
+        """
+        if self._file is None:
+            return
+        import h5py
+        self.flush()
+        self._file.close()
+        self._file = None
+        # Attributes cannot be changed in SWMR mode
+        with h5py.File(self.path, "r+") as f:
+            f.attrs["status"] = status
+            f.attrs["end_time"] = datetime.now().isoformat()
+            for name, values in datasets.items():
+                if name in f:
+                    # A resumed scan adds to what the previous sessions recorded
+                    values = np.concatenate([f[name][...], values])
+                    del f[name]
+                f.create_dataset(name, data=values)
+        logger.info(f"Scan data in {self.path}: {self.count} points, {status}")
+
+    def write_result(self, df):
+        """Store the DataFrame returned by the scan in the "result" group of the closed file.
+
+        The streamed rows are the raw points; the result adds what the scan
+        computes at the end, e.g. the resampled grid of an adaptive scan or the
+        power normalized reflection. It is stored like the rows: a "data"
+        dataset with the column names in its "columns" attribute, and the
+        scalar entries of df.attrs as attributes of the group. A previous
+        result, e.g. from before the scan was resumed, is replaced.
+        """
+        import h5py
+        self.close()  # no-op once the scan closed the writer
+        with h5py.File(self.path, "r+") as f:
+            if "result" in f:
+                del f["result"]
+            group = f.create_group("result")
+            group.create_dataset("data", data=df.to_numpy(dtype=float))
+            group.attrs["columns"] = [str(column) for column in df.columns]
+            for name, value in df.attrs.items():
+                if np.isscalar(value):
+                    group.attrs[name] = value
+        logger.info(f"Scan result in {self.path}: {len(df)} rows")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close("complete" if exc_type is None else "failed")
+
+
+def mark_status(path, status):
+    """Record the status of a scan saved in one go, e.g. with DataFrame.to_hdf, as ScanWriter.close() does."""
+    import h5py
+    with h5py.File(path, "r+") as f:
+        f.attrs["status"] = status
+        f.attrs["end_time"] = datetime.now().isoformat()
+
+
+def read_scan(path, group="/"):
+    """Read a file written by ScanWriter, also while the scan is still running.
+
+    Args:
+        group (str): "/" for the streamed rows, "result" for the DataFrame the scan returned (see write_result)
+    Returns:
+        tuple: (DataFrame of the rows, in acquisition order for the streamed rows, dict of attributes)
+    """
+    import h5py
+    import pandas as pd
+    with h5py.File(path, "r", swmr=True) as f:
+        attrs = dict(f[group].attrs)
+        df = pd.DataFrame(f[group]["data"][...], columns=list(attrs["columns"]))
+    return df, attrs
@@ -3,6 +3,7 @@ import time
 import pyvisa
 import math
 import logging
+from visa_sessions import sessions
 logger = logging.getLogger(__name__)
 
 class AxisError(Exception):
@@ -99,8 +100,7 @@ class SHRC203VISADriver:
         Open the connection with the controller.
         """
         try:
-            rm = pyvisa.ResourceManager()
-            self._instr = rm.open_resource(self.rsrc_name)
+            self._instr = sessions.open(self.rsrc_name)
             self._instr.baud_rate = 38400
             self._instr.data_bits = 8 
             self._instr.parity = pyvisa.constants.Parity.none 
@@ -224,12 +224,14 @@ class SHRC203VISADriver:
         return state
 
     def close(self):
-        """Close the connection with the controller."""
-        pyvisa.ResourceManager().close()
+        """Release the connection with the controller, the session stays in the pool for the next open_connection."""
+        sessions.release(self.rsrc_name)
 import numpy as np
 import time
 import pyvisa
 import logging
+from motion import SettleWaiter, MotionTimeoutError  # noqa: F401
+from visa_sessions import sessions
 logger = logging.getLogger(__name__)
 
 class AxisError(Exception):
@@ -276,6 +278,9 @@ class SHRC203VISADriver:
     Class to handle the communication with the Optosigma SHRC203 controller using the VISA protocol.
     """
     default_units = 'um'
+    n_axes = 3
+    pulse_size = 0.05  # um per pulse, used to convert the D: speeds to a move duration
+    unit_scale = {"N": 1e-3, "U": 1., "M": 1e3}
 
     def __init__(self, rsrc_name):
         """
@@ -284,6 +289,11 @@ class SHRC203VISADriver:
         self._instr = None
         self.rsrc_name = rsrc_name
         self.set_unit(self.default_units)
+        self._targets = {}
+        self.speed_ini = [None] * self.n_axes
+        self.speed_fin = [None] * self.n_axes
+        self.accel_t = [None] * self.n_axes
+        self.waiter = SettleWaiter(self.read_state)
 
     def set_unit(self, unit: str):
         """
@@ -312,7 +322,7 @@ class SHRC203VISADriver:
 
         while error[0] not in ["1", "3", "7", "F"]:
              error = self._instr.query(f"SRQ:{channel}S")
-             if time0 - time.time() >= 10:
+             if time.time() - time0 >= 10:
                 logger.error("Timeout")
                 break
 
@@ -326,8 +336,7 @@ class SHRC203VISADriver:
         Open the connection with the controller.
         """
         try:
-            rm = pyvisa.ResourceManager()
-            self._instr = rm.open_resource(self.rsrc_name)
+            self._instr = sessions.open(self.rsrc_name)
             self._instr.baud_rate = 38400
             self._instr.data_bits = 8 
             self._instr.parity = pyvisa.constants.Parity.none 
@@ -365,9 +374,11 @@ class SHRC203VISADriver:
             float: Rounded up position.
         """
         return round(position /increment)* increment
-    def move(self, position, channel): 
+    def move(self, position, channel, wait=True): 
         """
         Move the specified channel to the position.
+
+        With wait=False the move is only started, e.g. to sample detectors while the stage travels.
         """
         position = self.round_up(position, 0.050)
         if position >= 0:
@@ -375,7 +386,69 @@ class SHRC203VISADriver:
         else:
             self._instr.query(f"A:{channel}-{self.unit}{abs(position)}")
         self._instr.query("G:")
-        self.wait_for_ready(channel)
+        previous = self._targets.get(channel)
+        self._targets[channel] = position
+        distance = 0 if previous is None else abs(position - previous)
+        if wait:
+            self.wait_for_ready(channel, self.expected_duration(distance, channel))
+
+    def _signed(self, position):
+        """Format a position as the sign, unit and value fields of a move command."""
+        sign = "+" if position >= 0 else "-"
+        return f"{sign}{self.unit}{round(abs(position), 3)}"
+
+    def move_axes(self, positions):
+        """
+        Move several channels to absolute positions with one command, one go and one wait.
+
+        The A:W command takes a position for every channel. Channels that are
+        not given are commanded to the position read from the controller just
+        before, not to a cached target, so they stay where they are even if
+        they were moved from the front panel or by another program.
+        Args:
+            positions (dict): Position for each channel, e.g. {1: x, 2: y}
+        """
+        targets = {channel: self.round_up(position, 0.050) for channel, position in positions.items()}
+        if len(targets) == 1:
+            channel, position = targets.popitem()
+            self.move(position, channel)
+            return
+        current = dict(enumerate(self.query_positions(), start=1))
+        command = "A:W" + "".join(self._signed(targets.get(channel, current[channel]))
+                                  for channel in range(1, self.n_axes + 1))
+        self._instr.query(command)
+        self._instr.query("G:")
+        expected = max(self.expected_duration(abs(position - current[channel]), channel)
+                       for channel, position in targets.items())
+        self._targets.update(current)
+        self._targets.update(targets)
+        self.wait_for_ready_axes(list(targets), expected)
+
+    def move_relative_axes(self, offsets):
+        """
+        Move several channels by relative amounts with one command, one go and one wait.
+        Args:
+            offsets (dict): Offset for each channel, e.g. {1: dx, 3: dz}
+        """
+        offsets = {channel: self.round_up(offset, 0.050) for channel, offset in offsets.items()}
+        command = "M:W" + "".join(self._signed(offsets.get(channel, 0)) for channel in range(1, self.n_axes + 1))
+        self._instr.query(command)
+        self._instr.query("G:")
+        for channel, offset in offsets.items():
+            if channel in self._targets:
+                self._targets[channel] += offset
+        expected = max(self.expected_duration(abs(offset), channel) for channel, offset in offsets.items())
+        self.wait_for_ready_axes(list(offsets), expected)
+
+    def query_positions(self):
+        """Query the positions of all channels with a single command."""
+        while True:
+            try:
+                positions = self._instr.query(f"Q:S{self.unit}").split(",")
+                return [float(positions[channel].split(f"{self.unit}")[1]) for channel in range(self.n_axes)]
+            except IndexError:
+                logger.warning("Error in query_positions: IndexError. Retrying again.")
+                time.sleep(1)
     
     def query_position(self, channel):
         while True:
@@ -402,9 +475,32 @@ class SHRC203VISADriver:
 
         if 0 < speed_ini <= speed_fin and accel_t > 0:
             self._instr.query(f"D:{channel},{speed_ini},{speed_fin},{accel_t}")
+            self.speed_ini[channel-1] = speed_ini
+            self.speed_fin[channel-1] = speed_fin
+            self.accel_t[channel-1] = accel_t
         else:
             Exception("Invalid parameters")
 
+    def get_velocity(self, channel):
+        """
+        Get the cruise speed of the channel in the current unit per second and its acceleration time in seconds.
+        """
+        if self.speed_fin[channel-1] is None:
+            self.get_speed(channel)
+        if not self.speed_fin[channel-1] or self.unit not in self.unit_scale:
+            return None, None
+        return self.speed_fin[channel-1] * self.pulse_size / self.unit_scale[self.unit], self.accel_t[channel-1] * 1e-3
+
+    def set_velocity(self, velocity, channel):
+        """
+        Set the cruise speed of the channel in the current unit per second, keeping the start speed and acceleration time.
+        """
+        if self.speed_fin[channel-1] is None:
+            self.get_speed(channel)
+        speed_fin = max(int(round(velocity * self.unit_scale[self.unit] / self.pulse_size)), 1)
+        speed_ini = min(self.speed_ini[channel-1] or speed_fin, speed_fin)
+        self.set_speed(speed_ini, speed_fin, self.accel_t[channel-1] or 100, channel)
+
     def get_speed(self, channel):
         """Get the speed of the stage."""
 
@@ -413,7 +509,7 @@ class SHRC203VISADriver:
         time0 = time.time()
         while speed[0] != "S":
             speed = self._instr.query(f"?:D{channel}")
-            if time0 - time.time() >= 5:
+            if time.time() - time0 >= 5:
                 logger.error("Timeout")
                 return self.speed_ini[channel-1], self.speed_fin[channel-1], self.accel_t[channel-1]
 
@@ -432,23 +528,57 @@ class SHRC203VISADriver:
         else:
             self._instr.query(f"M:{channel}-{self.unit}{abs(position)}")
         self._instr.query("G:")
-        self.wait_for_ready(channel)
+        if channel in self._targets:
+            self._targets[channel] += position
+        self.wait_for_ready(channel, self.expected_duration(abs(position), channel))
 
     def home(self, channel):
         """Move the stage to the home position."""
         self._instr.query(f"H:{channel}")
-        self.wait_for_ready(channel)
-        
-    def wait_for_ready(self, channel):
-        """Waits for the stage to be ready."""
-        if self.read_state(channel) == "B":
-            time0 = time.time()
-            while self.read_state(channel) == "B":
-                if time.time() - time0 >= 20:
-                    logger.error("Timeout")
-                    break
-        return self.read_state(channel)
-            
+        self._targets.pop(channel, None)
+        self.wait_for_ready(channel, timeout=120)
+
+    def expected_duration(self, distance, channel):
+        """
+        Predict how long a move of `distance` (in the current unit) takes on `channel`.
+
+        Uses the speed table of the channel, read once with get_speed and kept
+        up to date by set_speed. Returns 0 when it cannot be predicted.
+        """
+        if distance == 0 or self.unit not in self.unit_scale:
+            return 0.
+        if self.speed_fin[channel-1] is None:
+            self.get_speed(channel)
+            if self.speed_fin[channel-1] is None:
+                self.speed_fin[channel-1] = 0  # unknown, do not ask again on every move
+        if not self.speed_fin[channel-1]:
+            return 0.
+        speed = self.speed_fin[channel-1] * self.pulse_size / self.unit_scale[self.unit]
+        accel_time = self.accel_t[channel-1] * 1e-3
+        if distance >= speed * accel_time:
+            return distance / speed + accel_time
+        return 2 * (distance * accel_time / speed) ** 0.5  # never reaches full speed
+
+    def wait_for_ready(self, channel, expected=0., timeout=None):
+        """
+        Waits for the stage to be ready.
+
+        Sleeps through most of the expected move duration, then polls the state
+        with a growing interval.
+        Args:
+            channel (int): Channel of the stage.
+            expected (float): Predicted duration of the move in seconds, 0 if unknown.
+            timeout (float): Time allowed beyond the prediction, defaults to waiter.timeout.
+        Raises:
+            MotionTimeoutError: If the channel is still busy after the timeout.
+        """
+        self.waiter.wait([channel], expected, timeout)
+        return "R"
+
+    def wait_for_ready_axes(self, channels, expected=0., timeout=None):
+        """Waits for all the given channels to be ready, see wait_for_ready."""
+        self.waiter.wait(channels, expected, timeout)
+
 
     def stop(self, channel):
         """Stop the stage"""
@@ -462,5 +592,5 @@ class SHRC203VISADriver:
         return state
 
     def close(self):
-        """Close the connection with the controller."""
-        pyvisa.ResourceManager().close()
\ No newline at end of file
+        """Release the connection with the controller, the session stays in the pool for the next open_connection."""
+        sessions.release(self.rsrc_name)
\ No newline at end of file
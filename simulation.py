@@ -0,0 +1,722 @@
+"""Simulated instruments for running the scan code without hardware.
+
+Each class mirrors the public methods of the corresponding driver. Every
+command costs a configurable latency and motion takes a time proportional
+to the distance, so timings measured against the simulation are meaningful.
+"""
+import time
+import math
+import logging
+import numpy as np
+from motion import SettleWaiter
+from fly import profile_position
+
+logger = logging.getLogger(__name__)
+
+
+class SimulatedInstrument:
+    """Base class providing the per-command latency model."""
+
+    def __init__(self, latency=0.005):
+        """
+        Args:
+            latency (float): Round trip time of one command in seconds
+        """
+        self.latency = latency
+        self.n_commands = 0
+
+    def _io(self):
+        self.n_commands += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+
+class SimulatedSHRC203(SimulatedInstrument):
+    """Stand-in for SHRC203VISADriver with a trapezoidal motion model.
+
+    Positions are in um and follow fly.profile_position: a move takes
+    accel_time to reach `speed` (um/s) and the same to stop; short moves
+    follow a triangular profile. Axes move independently, also when started
+    together by move_axes(), and read_state() returns "B" until the move has
+    finished.
+    """
+    default_units = 'um'
+
+    def __init__(self, rsrc_name="SIM::SHRC203", latency=0.005, speed=2000., accel_time=0.05, n_axes=3, setup=None):
+        super().__init__(latency)
+        self.setup = setup
+        self.rsrc_name = rsrc_name
+        self.speed = [speed] * n_axes
+        self.accel_time = [accel_time] * n_axes
+        self.unit = "U"
+        self._start = [0.] * n_axes
+        self._target = [0.] * n_axes
+        self._t_start = [0.] * n_axes
+        self._duration = [0.] * n_axes
+        self._profile = [(speed, accel_time)] * n_axes
+        self.travel = [0.] * n_axes
+        self.waiter = SettleWaiter(self.read_state)
+
+    def open_connection(self):
+        self._io()
+        logger.info(f"Simulated SHRC203 opened as {self.rsrc_name}")
+
+    def set_unit(self, unit):
+        pass
+
+    def get_unit(self):
+        return self.unit
+
+    def set_mode(self):
+        self._io()
+
+    def set_loop(self, loop, channel):
+        self._io()
+
+    def get_loop(self, channel):
+        self._io()
+        return 0
+
+    def check_error(self, channel):
+        self._io()
+        return 'Normal (S1 to S10 and emergency stop has not occurred)'
+
+    def motion_time(self, distance, channel):
+        """Duration of a move of `distance` um on `channel`."""
+        distance = abs(distance)
+        speed = self.speed[channel - 1]
+        accel_time = self.accel_time[channel - 1]
+        if distance == 0:
+            return 0.
+        if distance >= speed * accel_time:
+            return distance / speed + accel_time
+        return 2 * math.sqrt(distance * accel_time / speed)
+
+    def position(self, channel):
+        """Actual position of `channel`, without command latency."""
+        return self._position(channel)
+
+    def _position(self, channel, now=None):
+        k = channel - 1
+        now = time.monotonic() if now is None else now
+        elapsed = now - self._t_start[k]
+        if elapsed >= self._duration[k]:
+            return self._target[k]
+        return float(profile_position(elapsed, self._start[k], self._target[k], *self._profile[k]))
+
+    def _start_move(self, target, channel):
+        """Start moving `channel` and return the expected duration the driver would predict."""
+        k = channel - 1
+        now = time.monotonic()
+        self._start[k] = self._position(channel, now)
+        self._target[k] = target
+        self._t_start[k] = now
+        self._duration[k] = self.motion_time(target - self._start[k], channel)
+        self._profile[k] = (self.speed[k], self.accel_time[k])
+        self.travel[k] += abs(target - self._start[k])
+        return self._duration[k]
+
+    def move(self, position, channel, wait=True):
+        self._io()
+        self._io()
+        expected = self._start_move(round(position / 0.05) * 0.05, channel)
+        if wait:
+            self.wait_for_ready(channel, expected)
+
+    def expected_duration(self, distance, channel):
+        return self.motion_time(distance, channel)
+
+    def move_relative(self, position, channel):
+        self._io()
+        self._io()
+        expected = self._start_move(self._position(channel) + round(position / 0.05) * 0.05, channel)
+        self.wait_for_ready(channel, expected)
+
+    def move_axes(self, positions):
+        if len(positions) == 1:
+            (channel, position), = positions.items()
+            self.move(position, channel)
+            return
+        self._io()
+        self._io()
+        expected = max(self._start_move(round(position / 0.05) * 0.05, channel)
+                       for channel, position in positions.items())
+        self.wait_for_ready_axes(list(positions), expected)
+
+    def move_relative_axes(self, offsets):
+        self._io()
+        self._io()
+        expected = max(self._start_move(self._position(channel) + round(offset / 0.05) * 0.05, channel)
+                       for channel, offset in offsets.items())
+        self.wait_for_ready_axes(list(offsets), expected)
+
+    def home(self, channel):
+        self._io()
+        self._start_move(0., channel)
+        self.wait_for_ready(channel, timeout=120)
+
+    def read_state(self, channel):
+        self._io()
+        k = channel - 1
+        return "B" if time.monotonic() - self._t_start[k] < self._duration[k] else "R"
+
+    def wait_for_ready(self, channel, expected=0., timeout=None):
+        self.waiter.wait([channel], expected, timeout)
+        return "R"
+
+    def wait_for_ready_axes(self, channels, expected=0., timeout=None):
+        self.waiter.wait(channels, expected, timeout)
+
+    def query_position(self, channel):
+        self._io()
+        return self._position(channel)
+
+    def query_positions(self):
+        self._io()
+        return [self._position(channel) for channel in range(1, len(self.speed) + 1)]
+
+    def stop(self, channel):
+        self._io()
+        k = channel - 1
+        now = time.monotonic()
+        self._target[k] = self._position(channel, now)
+        self._duration[k] = 0.
+
+    def set_speed(self, speed_ini, speed_fin, accel_t, channel):
+        self._io()
+        self.speed[channel - 1] = speed_fin
+        self.accel_time[channel - 1] = accel_t * 1e-3
+
+    def get_speed(self, channel):
+        self._io()
+        return self.speed[channel - 1], self.speed[channel - 1], int(self.accel_time[channel - 1] * 1e3)
+
+    def get_velocity(self, channel):
+        return self.speed[channel - 1], self.accel_time[channel - 1]
+
+    def set_velocity(self, velocity, channel):
+        self._io()
+        self.speed[channel - 1] = velocity
+
+    def close(self):
+        pass
+
+
+class SimulatedSample:
+    """Optical model of the sample seen by the simulated detectors.
+
+    A round magnetic flake on a substrate, a focal plane (optionally tilted)
+    around z_focus and a laser whose wavelength is tuned by the Zaber
+    position with a slightly nonlinear dispersion.
+    """
+
+    def __init__(self, center=(50., 50.), radius=20., z_focus=8282., depth_of_focus=8., tilt=(0., 0.),
+                 kerr=1e-3, ellipticity=5e-4, power=1e-3, power_drift=0.02, drift_period=600.):
+        self.center = center
+        self.radius = radius
+        self.z_focus = z_focus
+        self.depth_of_focus = depth_of_focus
+        self.tilt = tilt
+        self.kerr = kerr
+        self.ellipticity = ellipticity
+        self.power = power
+        self.power_drift = power_drift
+        self.drift_period = drift_period
+        self.time0 = time.monotonic()
+
+    def flake(self, x, y):
+        """Flake coverage between 0 (substrate) and 1 (flake), smoothed over 1 um."""
+        r = math.hypot(x - self.center[0], y - self.center[1])
+        return 1. / (1. + math.exp(min((r - self.radius) / 1., 700.)))
+
+    def focus(self, x, y, z):
+        z_focus = self.z_focus + self.tilt[0] * x + self.tilt[1] * y
+        return math.exp(-((z - z_focus) / self.depth_of_focus) ** 2)
+
+    def reflection(self, x, y, z):
+        return (1. + 0.5 * self.flake(x, y)) * (0.2 + 0.8 * self.focus(x, y, z))
+
+    def laser_power(self):
+        t = time.monotonic() - self.time0
+        return self.power * (1. + self.power_drift * math.sin(2 * math.pi * t / self.drift_period))
+
+    def wavelength(self, zaber_position):
+        """Laser wavelength in nm for a Zaber position in mm (970 nm at 0, 690 nm at 13.3 mm)."""
+        return 970. - 280. * zaber_position / 13.3 - 15. * math.sin(math.pi * zaber_position / 13.3)
+
+
+class SimulatedKeithley2100(SimulatedInstrument):
+    """Stand-in for Keithley2100VISADriver returning the reflected intensity at the stage position."""
+
+    def __init__(self, rsrc_name="SIM::KEITHLEY2100", latency=0.005, read_time=0.02, setup=None):
+        super().__init__(latency)
+        self.rsrc_name = rsrc_name
+        self.read_time = read_time
+        self.setup = setup
+        self.sample_count = 1
+        self.trigger_count = 1
+        self.trigger_source = None
+
+    def init_hardware(self):
+        self._io()
+
+    def close(self):
+        pass
+
+    def reset(self):
+        self._io()
+
+    def get_idn(self):
+        self._io()
+        return "KEITHLEY INSTRUMENTS INC.,MODEL 2100,SIMULATED,1.0"
+
+    def get_error(self):
+        self._io()
+        return '+0,"No error"'
+
+    def set_mode(self, mode, **kwargs):
+        self._io()
+        self.sample_count = 1
+        self.trigger_count = 1
+
+    def init_cont_off(self):
+        self._io()
+
+    def init_cont_on(self):
+        self._io()
+
+    def clear_buffer(self):
+        self._io()
+
+    def voltage(self):
+        """Noisy detector voltage at the current stage position and laser power, without latency."""
+        return self.setup.voltage()
+
+    def read(self):
+        self.configure_buffered(1)
+        self._io()
+        time.sleep(self.read_time)
+        return self.voltage()
+
+    def set_sample_count(self, sample_count, trigger_count=1):
+        if (sample_count, trigger_count) != (self.sample_count, self.trigger_count):
+            self._io()
+        self.sample_count = sample_count
+        self.trigger_count = trigger_count
+
+    def configure_buffered(self, sample_count, trigger_count=1, source="IMM"):
+        if source != self.trigger_source:
+            self._io()
+        self.trigger_source = source
+        self.set_sample_count(sample_count, trigger_count)
+
+    def read_average(self, n_samples):
+        if n_samples <= 1:
+            return self.read(), 0.
+        self.configure_buffered(n_samples)
+        self._io()  # a single READ? for all the readings
+        time.sleep(self.read_time * n_samples)
+        readings = np.array([self.voltage() for _ in range(n_samples)])
+        return float(readings.mean()), float(readings.std(ddof=1))
+
+
+class SimulatedSR830(SimulatedInstrument):
+    """Stand-in for SR830VISADriver.
+
+    X at the 1st harmonic follows the ellipticity and at the 2nd harmonic the
+    Kerr rotation of the sample, both scaled by the reflected intensity. Like
+    the driver, the configuration is cached and only changes cost a command.
+    """
+
+    def __init__(self, rsrc_name="SIM::SR830", latency=0.005, setup=None):
+        super().__init__(latency)
+        self.rsrc_name = rsrc_name
+        self.setup = setup
+        self._harmonic = 1
+        self._time_constant = 0.03
+        self.sensitivity = 1.
+        self.sample_rate = 512.
+        self._buffer_start = None
+
+    def init_hardware(self):
+        self._io()
+
+    def close(self):
+        pass
+
+    @property
+    def harmonic(self):
+        return self._harmonic
+
+    @harmonic.setter
+    def harmonic(self, harmonic):
+        if int(harmonic) != self._harmonic:
+            self._io()
+            self._harmonic = int(harmonic)
+
+    def set_harmonics(self, harmonic):
+        self.harmonic = harmonic
+
+    @property
+    def time_constant(self):
+        return self._time_constant
+
+    @time_constant.setter
+    def time_constant(self, time_constant):
+        self._io()
+        self._time_constant = time_constant
+
+    def is_out_of_range(self):
+        self._io()
+        return False
+
+    def quick_range(self):
+        self._io()
+
+    def signal(self, harmonic=None):
+        """(x, theta) at the current position and harmonic, without latency."""
+        return self.setup.lockin_signal(self._harmonic if harmonic is None else harmonic)
+
+    def _values(self):
+        x, theta = self.signal()
+        return {"X": x, "Theta": theta, "Y": x * math.tan(math.radians(theta)), "R": abs(x)}
+
+    def snap(self, *params):
+        self._io()
+        values = self._values()
+        return [values[param] for param in params]
+
+    def snap_in_range(self, *params, check_input=False):
+        return self.snap(*params)
+
+    def input_overloaded(self):
+        self._io()
+        return False
+
+    def read_x_theta(self):
+        return self.snap("X", "Theta")
+
+    def configure_buffer(self, sample_rate, channel1="X", channel2="Theta"):
+        self._io()
+        self.sample_rate = sample_rate
+        self._channels = (channel1, channel2)
+
+    def start_buffer(self):
+        self._io()
+        self._buffer_start = time.monotonic()
+
+    def pause_buffer(self):
+        self._io()
+
+    def buffer_count(self):
+        self._io()
+        return int((time.monotonic() - self._buffer_start) * self.sample_rate)
+
+    def acquire_buffer(self, n_points, timeout=10.):
+        self.start_buffer()
+        time.sleep(n_points / self.sample_rate)
+        self.pause_buffer()
+        samples = [self._values() for _ in range(n_points)]
+        self._io()
+        self._io()
+        return tuple(np.array([sample[channel] for sample in samples]) for channel in self._channels)
+
+
+class SimulatedPEM200(SimulatedInstrument):
+    """Stand-in for PEM200Driver."""
+
+    def __init__(self, resource_name="SIM::PEM200", latency=0.005, setup=None):
+        super().__init__(latency)
+        self.resource_name = resource_name
+        self.setup = setup
+        self.retardation = 0.5
+        self.wavelength = -1
+        self.drive = 0.5
+        self.output = 0
+
+    def connect(self):
+        self._io()
+
+    def identify(self):
+        self._io()
+        return "Hinds Instruments PEM200 (simulated)"
+
+    def get_retardation(self):
+        return self.retardation
+
+    def set_retardation(self, retardation):
+        self.retardation = retardation
+
+    def get_modulation_drive(self):
+        self._io()
+        return self.drive
+
+    def set_modulation_drive(self, drive_value):
+        if not 0.0 <= drive_value <= 1.0:
+            raise Exception("Drive value must be between 0.0 and 1.0")
+        self._io()
+        self.drive = drive_value
+
+    def get_wavelength(self):
+        return self.wavelength
+
+    def get_modulation_amplitude(self):
+        self._io()
+        return self.wavelength * self.retardation
+
+    def set_modulation_amplitude(self, wavelength):
+        self._io()
+        self.wavelength = wavelength
+
+    def get_frequency(self):
+        self._io()
+        return 50e3
+
+    def set_pem_output(self, state):
+        if state not in [0, 1]:
+            raise Exception("State must be 0 (off) or 1 (on)")
+        self._io()
+        self.output = state
+
+    def close(self):
+        pass
+
+
+class SimulatedZaberMultiple(SimulatedInstrument):
+    """Stand-in for ZaberMultiple with linear axes in mm moving at `speed` mm/s."""
+
+    def __init__(self, latency=0.005, speed=5., n_axes=2, setup=None):
+        super().__init__(latency)
+        self.setup = setup
+        self.speed = speed
+        self.positions = [0.] * n_axes
+        self.unit = ['mm'] * n_axes
+        self.stage_type = ['LINEAR'] * n_axes
+
+    def connect(self, port):
+        self._io()
+        logger.info(f"Simulated Zaber connected on {port}")
+
+    def _move(self, position, axis):
+        self._io()
+        time.sleep(abs(position - self.positions[axis - 1]) / self.speed)
+        self.positions[axis - 1] = position
+
+    def move_abs(self, position, axis):
+        if axis > 0:
+            self._move(position, axis)
+        else:
+            logger.error("Axis is not a valid integer")
+
+    def move_relative(self, position, axis):
+        if axis > 0:
+            self._move(self.positions[axis - 1] + position, axis)
+        else:
+            logger.error("Axis is not a valid integer")
+
+    def get_position(self, axis):
+        self._io()
+        return self.positions[axis - 1]
+
+    def home(self, axis):
+        self._move(0., axis)
+
+    def stop(self, axis):
+        self._io()
+
+    def stage_name(self, axis):
+        return self.stage_type[axis - 1]
+
+    def get_units(self, axis):
+        return self.unit[axis - 1]
+
+    def close(self):
+        pass
+
+
+class SimulatedCCSXXX(SimulatedInstrument):
+    """Stand-in for the CCSXXX spectrometer showing the laser line as a Gaussian peak.
+
+    Like the driver, the wavelength axis is read once at connect() and the
+    spectra are written into a ring of reusable buffers.
+    """
+
+    n_pixels = 3648
+
+    def __init__(self, rsrc_name="SIM::CCS", latency=0.005, setup=None, ring_size=4):
+        super().__init__(latency)
+        self.rsrc_name = rsrc_name
+        self.setup = setup
+        self.integration_time = 10e-3
+        self.linewidth = 1.5
+        self._wavelengths = np.linspace(500., 1000., self.n_pixels)
+        self._wavelengths.flags.writeable = False
+        self._ring = np.empty((ring_size, self.n_pixels))
+        self._next = 0
+        self._scan_wavelength = None
+
+    def connect(self):
+        self._io()
+        self._io()
+
+    def set_integration_time(self, integration_time):
+        self._io()
+        self.integration_time = integration_time
+
+    def start_scan(self):
+        self._io()
+        time.sleep(self.integration_time)
+        self._scan_wavelength = self.setup.laser_wavelength()
+
+    def get_wavelength_data(self):
+        return self._wavelengths
+
+    def get_scan_data(self, out=None):
+        self._io()
+        if out is None:
+            out = self._ring[self._next]
+            self._next = (self._next + 1) % len(self._ring)
+        if self._scan_wavelength is None:
+            out[:] = 0.
+            return out
+        sigma = self.linewidth / 2.355
+        np.exp(-0.5 * ((self._wavelengths - self._scan_wavelength) / sigma) ** 2, out=out)
+        out += self.setup.rng.normal(0., 0.01, self.n_pixels)
+        return out
+
+    def close(self):
+        pass
+
+
+class SimulatedTLPM(SimulatedInstrument):
+    """Stand-in for CustomTLPM reading the (drifting) laser power."""
+
+    def __init__(self, index=None, latency=0.005, setup=None):
+        super().__init__(latency)
+        self._index = index
+        self.setup = setup
+        self._wavelength = 532.
+
+    def __enter__(self):
+        self.open_by_index(self._index)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open_by_index(self, index=None):
+        if index is not None:
+            self._index = index
+        self._io()
+
+    def open(self, resource_name, id_query=True, reset=True):
+        self._io()
+        return True
+
+    def close(self):
+        pass
+
+    def get_calibration(self):
+        self._io()
+        return "Simulated"
+
+    def get_power(self):
+        self._io()
+        return self.setup.laser_power()
+
+    @property
+    def wavelength_range(self):
+        return 400., 1100.
+
+    @property
+    def wavelength(self):
+        self._io()
+        return self._wavelength
+
+    @wavelength.setter
+    def wavelength(self, wavelength):
+        self._io()
+        self._wavelength = wavelength
+
+
+class SimulatedSetup:
+    """All simulated instruments of the NanoScanner bench, sharing one sample and stage.
+
+    Pass an instance as `NanoScanner(..., simulation=SimulatedSetup())` to run
+    every scan without hardware.
+    """
+
+    def __init__(self, latency=0.005, speed=2000., accel_time=0.05, read_time=0.02, zaber_speed=5., noise=0.01,
+                 sample=None, seed=None):
+        """
+        Args:
+            latency (float): Round trip time of one command, for every instrument, in seconds
+            speed (float): SHRC203 speed in um/s
+            accel_time (float): SHRC203 acceleration time in s
+            read_time (float): Keithley integration time per reading in s
+            zaber_speed (float): Zaber speed in mm/s
+            noise (float): Relative noise of detector readings
+            sample (SimulatedSample): Optical model, a default flake if None
+            seed (int): Seed of the noise generator
+        """
+        self.noise = noise
+        self.sample = SimulatedSample() if sample is None else sample
+        self.rng = np.random.default_rng(seed)
+        self.shrc = SimulatedSHRC203(latency=latency, speed=speed, accel_time=accel_time, setup=self)
+        self.keithley = SimulatedKeithley2100(latency=latency, read_time=read_time, setup=self)
+        self.sr830 = SimulatedSR830(latency=latency, setup=self)
+        self.pwmeter = SimulatedTLPM(latency=latency, setup=self)
+        self.zaber = SimulatedZaberMultiple(latency=latency, speed=zaber_speed, setup=self)
+        self.pem = SimulatedPEM200(latency=latency, setup=self)
+        self.ccs = SimulatedCCSXXX(latency=latency, setup=self)
+        self.index_zaber = 1
+
+    @property
+    def instruments(self):
+        return [self.shrc, self.keithley, self.sr830, self.pwmeter, self.zaber, self.pem, self.ccs]
+
+    def set_latency(self, latency):
+        for instrument in self.instruments:
+            instrument.latency = latency
+
+    def drivers(self):
+        """Constructors standing in for the driver classes, returning the shared instruments.
+
+        Returns:
+            dict: Driver name to callable accepting the real constructor arguments
+        """
+        return {
+            "shrc203": lambda *args, **kwargs: self.shrc,
+            "keithley2100": lambda *args, **kwargs: self.keithley,
+            "sr830": lambda *args, **kwargs: self.sr830,
+            "tlpm": lambda *args, **kwargs: self.pwmeter,
+            "zaber": lambda *args, **kwargs: self.zaber,
+            "pem200": lambda *args, **kwargs: self.pem,
+            "ccs": lambda *args, **kwargs: self.ccs,
+        }
+
+    def stage_position(self):
+        return tuple(self.shrc.position(channel) for channel in (1, 2, 3))
+
+    def laser_wavelength(self):
+        return self.sample.wavelength(self.zaber.positions[self.index_zaber - 1])
+
+    def laser_power(self):
+        return self.sample.laser_power() * (1. + self.rng.normal(0., self.noise / 5))
+
+    def voltage(self):
+        x, y, z = self.stage_position()
+        reflection = self.sample.reflection(x, y, z) * self.sample.laser_power() / self.sample.power
+        return reflection * (1. + self.rng.normal(0., self.noise))
+
+    def lockin_signal(self, harmonic):
+        x, y, z = self.stage_position()
+        flake = self.sample.flake(x, y)
+        reflection = self.sample.reflection(x, y, z) * self.sample.laser_power() / self.sample.power
+        if harmonic == 1:
+            signal = self.sample.ellipticity * flake * reflection
+        else:
+            signal = self.sample.kerr * flake * reflection
+        signal += self.rng.normal(0., self.noise * 1e-4)
+        theta = 0. if signal >= 0 else 180.
+        return signal, theta + self.rng.normal(0., 1.)
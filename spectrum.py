@@ -0,0 +1,146 @@
+import json
+from pathlib import Path
+import numpy as np
+
+LINE_MODELS = ("centroid", "gaussian", "parabola")
+
+
+def find_line(wavelengths, intensity, expected=None, roi=10., model="centroid"):
+    """Center, width and signal to noise ratio of the strongest line of a spectrum, to a fraction of a pixel.
+
+    The search is restricted to expected +/- roi when an expected wavelength
+    is given. The background and the noise are the median and the median
+    absolute deviation of that region, and are subtracted before the peak
+    pixel and its neighbours are interpolated:
+
+    - "centroid": intensity weighted mean of the pixels above half maximum, the least sensitive to noise
+      for lines several pixels wide
+    - "gaussian": parabola through the logarithm of the 3 pixels around the maximum, exact for a Gaussian line
+    - "parabola": parabola through the 3 pixels around the maximum
+
+    Args:
+        wavelengths (np.ndarray): Increasing wavelength of every pixel (nm)
+        intensity (np.ndarray): Spectrum
+        expected (float): Wavelength near which to look for the line (nm), the whole spectrum if None
+        roi (float): Half width of the region searched around `expected` (nm)
+        model (str): One of LINE_MODELS
+    Returns:
+        tuple: (center (nm), full width at half maximum (nm), signal to noise ratio)
+    """
+    if model not in LINE_MODELS:
+        raise ValueError(f"Unknown line model {model}, expected one of {LINE_MODELS}")
+    start, stop = 0, len(wavelengths)
+    if expected is not None:
+        start, stop = np.searchsorted(wavelengths, [expected - roi, expected + roi])
+        if stop - start < 3:
+            start, stop = 0, len(wavelengths)
+    wavelengths = wavelengths[start:stop]
+    intensity = np.asarray(intensity[start:stop], dtype=float)
+
+    background = np.median(intensity)
+    noise = 1.4826 * np.median(np.abs(intensity - background))
+    signal = intensity - background
+    peak = int(np.argmax(signal))
+    amplitude = signal[peak]
+    snr = amplitude / noise if noise > 0 else np.inf
+
+    # Half maximum crossings, interpolated linearly between pixels
+    half = amplitude / 2
+    below = np.flatnonzero(signal < half)
+    left, right = below[below < peak], below[below > peak]
+    pixels = np.arange(len(signal), dtype=float)
+    left_edge, right_edge = 0., pixels[-1]
+    if len(left):
+        k = left[-1]
+        left_edge = k + (half - signal[k]) / (signal[k + 1] - signal[k])
+    if len(right):
+        k = right[0]
+        right_edge = k - (half - signal[k]) / (signal[k - 1] - signal[k])
+
+    if model == "centroid":
+        above = slice(int(np.ceil(left_edge)), int(right_edge) + 1)
+        center = np.sum(pixels[above] * signal[above]) / np.sum(signal[above])
+    else:
+        center = float(peak)
+        if 0 < peak < len(signal) - 1:
+            a, b, c = signal[peak - 1:peak + 2]
+            if model == "gaussian" and min(a, b, c) > 0:
+                a, b, c = np.log([a, b, c])
+            denominator = a - 2 * b + c
+            if denominator < 0:
+                center = peak + np.clip(0.5 * (a - c) / denominator, -0.5, 0.5)
+
+    center_wavelength = np.interp(center, pixels, wavelengths)
+    linewidth = np.interp(right_edge, pixels, wavelengths) - np.interp(left_edge, pixels, wavelengths)
+    return float(center_wavelength), float(linewidth), float(snr)
+
+
+class WavelengthCalibration:
+    """Lookup table between the Zaber position (mm) and the laser wavelength (nm).
+
+    Built from a sweep of the Zaber with the wavelength read on the CCS.
+    The measured wavelengths are made monotone in the position by pooling
+    adjacent violators, so that noise cannot fold the table, and the table
+    is interpolated linearly in both directions, which keeps it monotone
+    and invertible.
+    """
+
+    def __init__(self, positions, wavelengths):
+        """
+        Args:
+            positions (sequence): Zaber positions (mm)
+            wavelengths (sequence): Wavelength measured at every position (nm)
+        """
+        positions = np.asarray(positions, dtype=float)
+        wavelengths = np.asarray(wavelengths, dtype=float)
+        if len(positions) < 2:
+            raise ValueError("A wavelength calibration needs at least 2 points")
+        order = np.argsort(positions)
+        positions, wavelengths = positions[order], wavelengths[order]
+        sign = 1. if wavelengths[-1] >= wavelengths[0] else -1.
+        wavelengths = sign * pool_adjacent_violators(sign * wavelengths)
+        # Pooled blocks share one wavelength, keep one point per wavelength at the mean position
+        unique, inverse = np.unique(wavelengths, return_inverse=True)
+        self.wavelengths = unique
+        self.positions = np.bincount(inverse, weights=positions) / np.bincount(inverse)
+
+    @property
+    def wavelength_range(self):
+        return float(self.wavelengths[0]), float(self.wavelengths[-1])
+
+    def position(self, wavelength):
+        """Zaber position (mm) for a wavelength (nm), clamped to the calibrated range."""
+        return np.interp(wavelength, self.wavelengths, self.positions)
+
+    def wavelength(self, position):
+        """Wavelength (nm) at a Zaber position (mm)."""
+        order = np.argsort(self.positions)
+        return np.interp(position, self.positions[order], self.wavelengths[order])
+
+    def to_json(self):
+        return json.dumps({"positions": self.positions.tolist(), "wavelengths": self.wavelengths.tolist()})
+
+    @classmethod
+    def from_json(cls, text):
+        values = json.loads(text)
+        return cls(values["positions"], values["wavelengths"])
+
+    def save(self, path):
+        Path(path).write_text(self.to_json())
+
+    @classmethod
+    def load(cls, path):
+        return cls.from_json(Path(path).read_text())
+
+
+def pool_adjacent_violators(values):
+    """Closest non-decreasing sequence to `values` in the least squares sense."""
+    sums, counts = [], []
+    for value in values:
+        sums.append(float(value))
+        counts.append(1)
+        while len(sums) > 1 and sums[-2] / counts[-2] > sums[-1] / counts[-1]:
+            value, count = sums.pop(), counts.pop()
+            sums[-1] += value
+            counts[-1] += count
+    return np.repeat(np.array(sums) / np.array(counts), counts)
@@ -0,0 +1,249 @@
+import time
+import numpy as np
+import logging
+from visa_sessions import sessions
+logger = logging.getLogger(__name__)
+
+
+class SR830VISADriver:
+    """VISA class driver for the Stanford Research SR830 lock-in amplifier
+
+    Keeps the configuration it has set or read (harmonic, time constant,
+    sensitivity, sample rate) so that reading it back costs no bus transaction,
+    reads several outputs at the same instant with SNAP? and transfers bursts
+    from the internal data buffer in binary with TRCB?.
+    Please refer to the instrument reference manual available at:
+    https://www.thinksrs.com/downloads/pdfs/manuals/SR830m.pdf
+    """
+    SNAP_PARAMETERS = {"X": 1, "Y": 2, "R": 3, "Theta": 4, "Aux In 1": 5, "Aux In 2": 6, "Aux In 3": 7, "Aux In 4": 8,
+                       "Frequency": 9, "CH1": 10, "CH2": 11}
+    TIME_CONSTANTS = [10e-6, 30e-6, 100e-6, 300e-6, 1e-3, 3e-3, 10e-3, 30e-3, 100e-3, 300e-3, 1., 3., 10., 30., 100.,
+                      300., 1e3, 3e3, 10e3, 30e3]
+    SENSITIVITIES = [2e-9, 5e-9, 10e-9, 20e-9, 50e-9, 100e-9, 200e-9, 500e-9, 1e-6, 2e-6, 5e-6, 10e-6, 20e-6, 50e-6,
+                     100e-6, 200e-6, 500e-6, 1e-3, 2e-3, 5e-3, 10e-3, 20e-3, 50e-3, 100e-3, 200e-3, 500e-3, 1.]
+    SAMPLE_RATES = [0.0625 * 2 ** i for i in range(14)]
+    DISPLAYS = {1: ["X", "R", "X Noise", "Aux In 1", "Aux In 2"], 2: ["Y", "Theta", "Y Noise", "Aux In 3", "Aux In 4"]}
+
+    def __init__(self, rsrc_name):
+        """Initialize SR830VISADriver class
+
+        :param rsrc_name: VISA Resource name
+        :type rsrc_name: string
+        """
+        self._instr = None
+        self.rsrc_name = rsrc_name
+        self._harmonic = None
+        self._time_constant = None
+        self._sensitivity = None
+        self._sample_rate = None
+
+    def init_hardware(self):
+        """Open the VISA resource and read the current configuration once"""
+        self._instr = sessions.open(self.rsrc_name, write_termination="\n", read_termination="\n")
+        self._instr.write("OUTX 1")  # answer on GPIB
+        self.refresh()
+
+    def refresh(self):
+        """Re-read the cached configuration, e.g. after it was changed on the front panel"""
+        self._harmonic = int(self._instr.query("HARM?"))
+        self._time_constant = self.TIME_CONSTANTS[int(self._instr.query("OFLT?"))]
+        self._sensitivity = self.SENSITIVITIES[int(self._instr.query("SENS?"))]
+
+    def close(self):
+        sessions.release(self.rsrc_name)
+
+    def get_idn(self):
+        return self._instr.query("*IDN?")
+
+    def reset(self):
+        self._instr.write("*CLS")
+        self._instr.write("*RST")
+        self.refresh()
+
+    @property
+    def harmonic(self):
+        return self._harmonic
+
+    @harmonic.setter
+    def harmonic(self, harmonic):
+        harmonic = int(harmonic)
+        if harmonic != self._harmonic:
+            self._instr.write(f"HARM {harmonic}")
+            self._harmonic = harmonic
+
+    def set_harmonics(self, harmonic):
+        self.harmonic = harmonic
+
+    @property
+    def time_constant(self):
+        """Time constant in seconds"""
+        return self._time_constant
+
+    @time_constant.setter
+    def time_constant(self, time_constant):
+        index = int(np.argmin(np.abs(np.array(self.TIME_CONSTANTS) - time_constant)))
+        if self.TIME_CONSTANTS[index] != self._time_constant:
+            self._instr.write(f"OFLT {index}")
+            self._time_constant = self.TIME_CONSTANTS[index]
+
+    @property
+    def sensitivity(self):
+        """Full scale sensitivity in volts"""
+        return self._sensitivity
+
+    @sensitivity.setter
+    def sensitivity(self, sensitivity):
+        index = int(np.argmin(np.abs(np.array(self.SENSITIVITIES) - sensitivity)))
+        if self.SENSITIVITIES[index] != self._sensitivity:
+            self._instr.write(f"SENS {index}")
+            self._sensitivity = self.SENSITIVITIES[index]
+
+    def snap(self, *params):
+        """Read 2 to 6 outputs at the same instant with a single SNAP? query
+
+        :param params: Names from SNAP_PARAMETERS, e.g. 'X', 'Theta'
+        :return: The values in the order of params
+        :rtype: list
+        """
+        if not 2 <= len(params) <= 6:
+            raise ValueError("SNAP? reads between 2 and 6 parameters")
+        codes = ",".join(str(self.SNAP_PARAMETERS[param]) for param in params)
+        return [float(value) for value in self._instr.query(f"SNAP? {codes}").split(",")]
+
+    def read_x_theta(self):
+        return self.snap("X", "Theta")
+
+    def is_out_of_range(self):
+        """True if the output overloaded since the last status read (LIAS bit 2)"""
+        return int(self._instr.query("LIAS? 2")) == 1
+
+    def quick_range(self):
+        """Run the auto gain and wait for it to finish"""
+        self._instr.write("AGAN")
+        time0 = time.time()
+        while not int(self._instr.query("*STB? 1")):
+            if time.time() - time0 >= 10:
+                logger.error("Timeout")
+                break
+            time.sleep(0.05)
+        self._sensitivity = self.SENSITIVITIES[int(self._instr.query("SENS?"))]
+
+    def snap_in_range(self, *params, check_input=False):
+        """Snap params and check the range on the same reading
+
+        R is read along with params and compared to the cached sensitivity; only
+        when it reaches full scale is the gain adjusted and the reading repeated.
+        An in-range pixel therefore costs a single transaction.
+
+        This only detects an output overload. An overload of the input stage
+        or of the dynamic reserve clips the signal before the demodulator,
+        leaves R below full scale and is not fixed by the auto gain. With
+        check_input the LIA status byte is read after the snap (one more
+        transaction) and such readings are returned as NaN.
+
+        :param params: Names from SNAP_PARAMETERS
+        :param check_input: Also check the input and reserve overload bits of LIAS?
+        """
+        values = self.snap(*params, "R")
+        if abs(values[-1]) >= 0.99 * self._sensitivity:
+            logger.info("SR830 output overload, adjusting the sensitivity")
+            self.quick_range()
+            values = self.snap(*params, "R")
+        if check_input and self.input_overloaded():
+            logger.warning("SR830 input or reserve overload, the reading is clipped")
+            return [float("nan")] * len(params)
+        return values[:-1]
+
+    def input_overloaded(self):
+        """True if the input or the reserve overloaded since the last status read (LIAS bits 0 and 1)"""
+        return int(self._instr.query("LIAS?")) & 0b11 != 0
+
+    def set_display(self, channel, display):
+        """Select what CHANNEL 1 or 2 shows and stores in the data buffer
+
+        :param channel: 1 or 2
+        :param display: One of DISPLAYS[channel], e.g. 'X' or 'Theta'
+        """
+        self._instr.write(f"DDEF {channel},{self.DISPLAYS[channel].index(display)},0")
+
+    @property
+    def sample_rate(self):
+        """Data buffer sample rate in Hz"""
+        if self._sample_rate is None:
+            index = int(self._instr.query("SRAT?"))
+            self._sample_rate = self.SAMPLE_RATES[index] if index < len(self.SAMPLE_RATES) else None
+        return self._sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, sample_rate):
+        index = int(np.argmin(np.abs(np.array(self.SAMPLE_RATES) - sample_rate)))
+        if self.SAMPLE_RATES[index] != self._sample_rate:
+            self._instr.write(f"SRAT {index}")
+            self._sample_rate = self.SAMPLE_RATES[index]
+
+    def configure_buffer(self, sample_rate, channel1="X", channel2="Theta"):
+        """Configure the data buffer for a one shot burst
+
+        :param sample_rate: Samples per second (62.5 mHz to 512 Hz, rounded to the nearest available rate)
+        :param channel1: Display stored in buffer 1
+        :param channel2: Display stored in buffer 2
+        """
+        self.set_display(1, channel1)
+        self.set_display(2, channel2)
+        self.sample_rate = sample_rate
+        self._instr.write("SEND 0")
+
+    def start_buffer(self):
+        """Clear the data buffer and start storing"""
+        self._instr.write("REST")
+        self._instr.write("STRT")
+
+    def pause_buffer(self):
+        self._instr.write("PAUS")
+
+    def buffer_count(self):
+        """Number of points stored in the data buffer"""
+        return int(self._instr.query("SPTS?"))
+
+    def read_buffer(self, channel, start=0, count=None):
+        """Transfer points of a data buffer as binary IEEE floats with TRCB?
+
+        :param channel: 1 or 2
+        :param start: First point
+        :param count: Number of points, all stored points by default
+        :rtype: numpy.ndarray
+        """
+        if count is None:
+            count = self.buffer_count() - start
+        if count <= 0:
+            return np.empty(0)
+        return self._instr.query_binary_values(f"TRCB? {channel},{start},{count}", datatype="f", is_big_endian=False,
+                                               header_fmt="empty", expect_termination=False, data_points=count,
+                                               container=np.array)
+
+    def acquire_buffer(self, n_points, timeout=10.):
+        """Store n_points at the configured sample rate and transfer them
+
+        With the external trigger rate (SRAT 14) the sample rate is unknown
+        and the buffer is polled until it holds n_points.
+
+        :param n_points: Points to store
+        :param timeout: Longest wait beyond the expected acquisition time (s)
+        :return: Arrays of the two buffers
+        :rtype: tuple
+        :raises TimeoutError: If fewer than n_points are stored after the timeout
+        """
+        sample_rate = self.sample_rate
+        self.start_buffer()
+        if sample_rate is None:
+            poll_interval, deadline = 0.01, time.monotonic() + timeout
+        else:
+            time.sleep(n_points / sample_rate)
+            poll_interval, deadline = 1 / sample_rate, time.monotonic() + timeout
+        while self.buffer_count() < n_points:
+            if time.monotonic() >= deadline:
+                self.pause_buffer()
+                raise TimeoutError(f"SR830 buffer holds {self.buffer_count()} of {n_points} points after the timeout")
+            time.sleep(poll_interval)
+        self.pause_buffer()
+        return self.read_buffer(1, 0, n_points), self.read_buffer(2, 0, n_points)
@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from live_view import LiveView  # noqa: E402
+from scan_script_amelie import NanoScanner  # noqa: E402
+from simulation import SimulatedSetup  # noqa: E402
+
+
+@pytest.fixture
+def setup():
+    """Simulated bench without command latency, so that the scans run in a fraction of a second."""
+    return SimulatedSetup(latency=0., read_time=0., seed=0)
+
+
+@pytest.fixture
+def scanner(setup):
+    scanner = NanoScanner("SIM", "SIM", "SIM", com_zaber="SIM", com_ccsx="SIM", com_pem="SIM", simulation=setup)
+    scanner.sr830.time_constant = 1e-3
+    # Focus moves span mm, make z fast so that reaching the sample surface takes no time
+    setup.shrc.speed[2] = 1e6
+    scanner.shrc.move(setup.sample.z_focus, 3)
+    yield scanner
+    scanner.close_connection()
+
+
+@pytest.fixture
+def live_view():
+    """Live view without panels, nothing is drawn."""
+    return LiveView()
@@ -0,0 +1,36 @@
+import numpy as np
+
+from adaptive import coarse_nodes, initial_cells, split_cell, refine_cells, serpentine_order, resample_grid
+
+
+def test_coarse_nodes_include_the_last():
+    assert coarse_nodes(10, 4) == [0, 4, 8, 9]
+    assert coarse_nodes(1, 4) == [0]
+
+
+def test_initial_cells_cover_the_grid():
+    assert initial_cells(9, 5, 4, 4) == [(0, 4, 0, 4), (4, 8, 0, 4)]
+    # The last row and column are nodes also off the stride
+    assert initial_cells(6, 3, 4, 4) == [(0, 4, 0, 2), (4, 5, 0, 2)]
+
+
+def test_split_and_refine():
+    assert split_cell((0, 4, 0, 1)) == [(0, 2, 0, 1), (2, 4, 0, 1)]
+    flat, edge = np.zeros((5, 5)), np.zeros((5, 5))
+    edge[:, 3:] = 1.
+    assert refine_cells([(0, 4, 0, 4)], [flat], [1.], 0.1) == []
+    assert len(refine_cells([(0, 4, 0, 4)], [edge], [1.], 0.1)) == 4
+    assert refine_cells([(0, 1, 0, 1)], [edge], [1.], 0.) == []
+
+
+def test_serpentine_order():
+    assert serpentine_order([(1, 0), (0, 1), (1, 1), (0, 0)]) == [(0, 0), (0, 1), (1, 1), (1, 0)]
+
+
+def test_resample_plane_exactly():
+    x, y = np.array([0., 4., 0., 4., 2.]), np.array([0., 0., 4., 4., 2.])
+    values = 1. + 2. * x - y
+    x_scan = y_scan = np.arange(5.)
+    grid = resample_grid(x, y, values, x_scan, y_scan)
+    gx, gy = np.meshgrid(x_scan, y_scan)
+    np.testing.assert_allclose(grid, 1. + 2. * gx - gy)
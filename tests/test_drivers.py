@@ -0,0 +1,134 @@
+import time
+
+import numpy as np
+import pytest
+from pyvisa import constants
+from pyvisa.errors import VisaIOError
+
+import keithley2100_VISADriver
+from keithley2100_VISADriver import Keithley2100VISADriver
+from sr830_VISADriver import SR830VISADriver
+from visa_sessions import VisaSessions
+
+
+class FakeSession:
+    """Stands for a pyvisa resource: records the writes and answers the queries of the tests."""
+
+    def __init__(self, name, answers=None):
+        self.name = name
+        self.answers = dict(answers or {})
+        self.writes = []
+        self.closed = False
+        self.failures = 0
+        self.buffer_rate = None
+        self._buffer_start = None
+
+    @property
+    def session(self):
+        if self.closed:
+            raise VisaIOError(constants.StatusCode.error_invalid_object)
+        return 1
+
+    def close(self):
+        self.closed = True
+
+    def write(self, command):
+        self.writes.append(command)
+        if command == "STRT":
+            self._buffer_start = time.monotonic()
+
+    def query(self, command):
+        if command == "SPTS?":
+            if self.buffer_rate is None:
+                return "0"
+            return str(int((time.monotonic() - self._buffer_start) * self.buffer_rate))
+        return self.answers[command]
+
+    def query_binary_values(self, command, data_points, **kwargs):
+        return np.arange(data_points, dtype=float)
+
+    def query_ascii_values(self, command, container):
+        if self.failures:
+            self.failures -= 1
+            raise VisaIOError(constants.StatusCode.error_timeout)
+        return container([1., 2., 3.])
+
+
+class FakeResourceManager:
+    def __init__(self):
+        self.opened = []
+
+    def open_resource(self, name, **settings):
+        self.opened.append(name)
+        return FakeSession(name)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def pool():
+    pool = VisaSessions()
+    pool._resource_manager = FakeResourceManager()
+    return pool
+
+
+def test_released_sessions_are_reused(pool):
+    first = pool.open("GPIB0::8::INSTR")
+    assert pool.open("GPIB0::8::INSTR") is first
+    assert pool.status() == {"GPIB0::8::INSTR": "in use (2)"}
+    pool.release("GPIB0::8::INSTR")
+    pool.release("GPIB0::8::INSTR")
+    assert pool.status() == {"GPIB0::8::INSTR": "idle"}
+    assert pool.open("GPIB0::8::INSTR") is first
+    assert pool._resource_manager.opened == ["GPIB0::8::INSTR"]
+    pool.close_all()
+    assert first.closed and pool.status() == {}
+
+
+def test_reconnect_opens_a_new_session(pool):
+    first = pool.open("ASRL3::INSTR", write_termination="\n")
+    second = pool.reconnect("ASRL3::INSTR")
+    assert first.closed and second is not first
+    assert pool.status() == {"ASRL3::INSTR": "in use (1)"}
+
+
+def test_keithley_reconnects_once_after_a_transfer_error(pool, monkeypatch):
+    monkeypatch.setattr(keithley2100_VISADriver, "sessions", pool)
+    keithley = Keithley2100VISADriver("USB0::KEITHLEY::INSTR")
+    keithley.init_hardware()
+    first = keithley._instr
+    first.failures = 1
+    np.testing.assert_array_equal(keithley._measure(3), [1., 2., 3.])
+    assert first.closed and keithley._instr is not first
+    # The counts are sent again on the new session
+    assert "TRIG:SOUR IMM" in keithley._instr.writes
+
+
+def test_sr830_external_trigger_buffer_is_polled():
+    sr830 = SR830VISADriver("GPIB0::8::INSTR")
+    sr830._instr = FakeSession("GPIB0::8::INSTR", {"SRAT?": "14"})
+    sr830._instr.buffer_rate = 500.
+    x, theta = sr830.acquire_buffer(10, timeout=1.)
+    assert sr830.sample_rate is None
+    assert len(x) == len(theta) == 10
+    assert sr830._instr.writes[-1] == "PAUS"
+
+
+def test_sr830_buffer_timeout():
+    sr830 = SR830VISADriver("GPIB0::8::INSTR")
+    sr830._instr = FakeSession("GPIB0::8::INSTR", {"SRAT?": "14"})
+    with pytest.raises(TimeoutError):
+        sr830.acquire_buffer(10, timeout=0.05)
+    assert sr830._instr.writes[-1] == "PAUS"
+
+
+def test_sr830_input_overload_reading_is_dropped():
+    sr830 = SR830VISADriver("GPIB0::8::INSTR")
+    sr830._sensitivity = 1.
+    sr830._instr = FakeSession("GPIB0::8::INSTR", {"LIAS?": "0", "SNAP? 1,4,3": "0.1,20.,0.1"})
+    assert sr830.snap_in_range("X", "Theta", check_input=True) == [0.1, 20.]
+    sr830._instr.answers["LIAS?"] = "1"
+    assert np.isnan(sr830.snap_in_range("X", "Theta", check_input=True)).all()
+    # Without the check the clipped reading is returned as is
+    assert sr830.snap_in_range("X", "Theta") == [0.1, 20.]
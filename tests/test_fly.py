@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from fly import bin_samples, profile_position, interpolate_positions
+
+
+def test_samples_averaged_per_pixel():
+    centers = np.array([0., 10., 20.])
+    positions = np.array([-4., 4., 9., 11., 26.])
+    means, counts = bin_samples(positions, np.array([1., 3., 5., 7., 9.]), centers)
+    np.testing.assert_array_equal(counts, [2, 2, 0])
+    np.testing.assert_array_equal(means[:2], [2., 6.])
+    assert np.isnan(means[2])
+
+
+def test_run_up_samples_are_dropped():
+    centers = np.array([0., 10.])
+    means, counts = bin_samples([-20., -5.1, 14.9, 30.], [100., 100., 1., 100.], centers)
+    np.testing.assert_array_equal(counts, [0, 1])
+    assert means[1] == 1.
+
+
+def test_single_pixel_needs_its_width():
+    with pytest.raises(ValueError):
+        bin_samples([0.], [1.], np.array([0.]))
+    means, counts = bin_samples([-30., -1., 2., 30.], [100., 1., 3., 100.], np.array([0.]), step=5.)
+    assert counts.tolist() == [2]
+    assert means[0] == 2.
+
+
+def test_channels_and_no_samples():
+    means, counts = bin_samples([0., 1.], np.array([[1., 2.], [3., 4.]]), np.array([0., 10.]))
+    np.testing.assert_array_equal(means[0], [2., 3.])
+    means, counts = bin_samples([], np.empty((0, 2)), np.array([0., 10.]))
+    assert means.shape == (2, 2) and np.isnan(means).all() and counts.tolist() == [0, 0]
+
+
+def test_trapezoidal_profile():
+    t = np.linspace(0., 2., 201)
+    positions = profile_position(t, 0., 100., speed=100., accel_time=0.2)
+    assert positions[0] == 0. and positions[-1] == 100.
+    assert np.all(np.diff(positions) >= 0)
+    # Cruising at the commanded speed between the ramps
+    assert profile_position(0.6, 0., 100., 100., 0.2) - profile_position(0.5, 0., 100., 100., 0.2) == pytest.approx(10.)
+
+
+def test_readbacks_correct_the_profile():
+    times = np.array([0.5, 0.6])
+    corrected = interpolate_positions(times, 0., 0., 100., 100., 0.2, readback_times=[0.5, 0.6], readbacks=[42., 52.])
+    np.testing.assert_allclose(corrected, [42., 52.])
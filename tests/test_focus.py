@@ -0,0 +1,64 @@
+import math
+
+import numpy as np
+import pytest
+
+from focus import fit_peak, find_peak, FocusMap, focus_sites
+
+
+def gaussian(center, width, background=0.2):
+    return lambda z: background + math.exp(-((z - center) / width) ** 2)
+
+
+def test_fit_peak_vertex():
+    z = np.array([-1., 0., 2.])
+    assert fit_peak(z, -(z - 0.5) ** 2) == pytest.approx(0.5)
+    assert fit_peak(z, (z - 0.5) ** 2) is None
+    assert fit_peak(z, np.exp(-(z - 0.3) ** 2), model="gaussian") == pytest.approx(0.3)
+
+
+@pytest.mark.parametrize("center", [-37., -11., 0., 6., 29., 38.])
+def test_narrow_peak_found_with_depth_of_focus(center):
+    peak, z, _ = find_peak(gaussian(center, 3.), -40., 40., depth_of_focus=4., max_evaluations=32)
+    assert peak == pytest.approx(center, abs=0.5)
+    assert len(z) <= 32
+
+
+@pytest.mark.parametrize("center", [3., 10., -27.])
+def test_flat_coarse_pass_falls_back_to_a_finer_sweep(center):
+    # 7 coarse samples over 80 um all miss a peak 1.5 um wide
+    peak, _, _ = find_peak(gaussian(center, 1.5), -40., 40., max_evaluations=24)
+    assert peak == pytest.approx(center, abs=0.5)
+
+
+def test_no_maximum_returns_the_middle():
+    peak, z, _ = find_peak(lambda z: 1., -40., 40., max_evaluations=16)
+    assert peak == 0.
+    assert len(z) == 16
+
+
+def test_evaluations_capped():
+    calls = []
+    find_peak(lambda z: calls.append(z) or -z ** 2, -10., 10., tolerance=1e-6, max_evaluations=9)
+    assert len(calls) <= 9
+
+
+def test_plane_fit_and_json(tmp_path):
+    sites = focus_sites(0., 100., 0., 100., 3)
+    x, y = np.array(sites).T
+    z = 8000. + 0.01 * x - 0.02 * y
+    focus_map = FocusMap.fit(x, y, z)
+    assert focus_map.z(50., 20.) == pytest.approx(8000. + 0.5 - 0.4)
+    assert focus_map.residual() == pytest.approx(0., abs=1e-9)
+    focus_map.save(tmp_path / "map.json")
+    loaded = FocusMap.load(tmp_path / "map.json")
+    assert loaded.z(10., 90.) == pytest.approx(focus_map.z(10., 90.))
+
+
+def test_quadratic_map_needs_six_sites():
+    with pytest.raises(ValueError):
+        FocusMap.fit([0., 1., 0., 1.], [0., 0., 1., 1.], [0., 0., 0., 0.], order=2)
+
+
+def test_focus_sites_serpentine():
+    assert focus_sites(0., 1., 0., 1., 2) == [(0., 0.), (1., 0.), (1., 1.), (0., 1.)]
@@ -0,0 +1,27 @@
+import numpy as np
+
+from live_view import grid_extent, grid_values
+
+
+def test_grid_values_of_an_aborted_scan():
+    # 4 x 4 scan aborted after 6 points: the unfilled rows are NaN
+    x = np.array([30., 40., 50., 60., 30., 40.] + [np.nan] * 10)
+    y = np.array([30., 30., 30., 30., 40., 40.] + [np.nan] * 10)
+    v = np.arange(16.)
+    xs, ys, (grid,) = grid_values(x, y, v)
+    np.testing.assert_array_equal(xs, [30., 40., 50., 60.])
+    np.testing.assert_array_equal(ys, [30., 40.])
+    np.testing.assert_array_equal(grid[0], [0., 1., 2., 3.])
+    np.testing.assert_array_equal(grid[1, :2], [4., 5.])
+    assert np.isnan(grid[1, 2:]).all()
+
+
+def test_grid_values_in_serpentine_order():
+    x = np.array([0., 1., 1., 0.])
+    y = np.array([0., 0., 1., 1.])
+    _, _, (grid,) = grid_values(x, y, np.array([1., 2., 3., 4.]))
+    np.testing.assert_array_equal(grid, [[1., 2.], [4., 3.]])
+
+
+def test_grid_extent_centers_the_pixels():
+    assert grid_extent(np.array([0., 10.]), np.array([5.])) == (-5., 15., 4.5, 5.5)
@@ -0,0 +1,36 @@
+import time
+
+import numpy as np
+
+from power_monitor import PowerMonitor
+
+
+def test_failed_readings_are_not_stored():
+    monitor = PowerMonitor(lambda: 1., interval=0.1)
+    assert monitor.record(0., 1.)
+    assert not monitor.record(0.1, 0.)
+    assert not monitor.record(0.2, float("nan"))
+    monitor.record(0.3, 2.)
+    times, powers = monitor.snapshot()
+    np.testing.assert_array_equal(powers, [1., 2.])
+    assert monitor.power_at(0.15) == 1.5
+
+
+def test_no_power_outside_the_recorded_span():
+    monitor = PowerMonitor(lambda: 1., interval=0.1, capacity=4)
+    assert np.isnan(monitor.power_at(0.)).all()
+    for k in range(10):
+        monitor.record(k * 0.1, 1. + k)
+    # The buffer wrapped: only the last 4 samples (0.6 to 0.9 s) are left
+    power = monitor.power_at([0.0, 0.55, 0.75, 1.5])
+    assert np.isnan(power[0]) and np.isnan(power[3])
+    assert power[1] == 7. and power[2] == 8.5
+
+
+def test_monitor_thread_samples():
+    monitor = PowerMonitor(lambda: 1e-3, interval=0.01)
+    assert monitor.start()
+    assert not monitor.start()
+    time.sleep(0.1)
+    monitor.stop()
+    assert len(monitor.snapshot()[0]) > 2
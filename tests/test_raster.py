@@ -0,0 +1,31 @@
+import pytest
+
+from raster import RASTER_ORDERS, raster_lines, commanded_travel
+
+
+@pytest.mark.parametrize("order", RASTER_ORDERS)
+def test_every_point_visited_once(order):
+    lines = raster_lines(3, 4, order)
+    points = [index for line in lines for index in line]
+    assert sorted(points) == [(j, i) for j in range(3) for i in range(4)]
+
+
+def test_row_orders():
+    assert raster_lines(2, 3, "unidirectional") == [[(0, 0), (0, 1), (0, 2)], [(1, 0), (1, 1), (1, 2)]]
+    assert raster_lines(2, 3, "serpentine") == [[(0, 0), (0, 1), (0, 2)], [(1, 2), (1, 1), (1, 0)]]
+
+
+def test_column_orders():
+    assert raster_lines(3, 2, "column") == [[(0, 0), (1, 0), (2, 0)], [(0, 1), (1, 1), (2, 1)]]
+    assert raster_lines(3, 2, "column_serpentine") == [[(0, 0), (1, 0), (2, 0)], [(2, 1), (1, 1), (0, 1)]]
+
+
+def test_serpentine_saves_the_flyback():
+    x_scan, y_scan = [0., 1., 2., 3.], [0., 1., 2.]
+    assert commanded_travel(x_scan, y_scan, "unidirectional") == (3 * 3 + 2 * 3, 2.)
+    assert commanded_travel(x_scan, y_scan, "serpentine") == (3 * 3, 2.)
+
+
+def test_unknown_order():
+    with pytest.raises(ValueError):
+        raster_lines(2, 2, "spiral")
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from scan_buffer import ScanBuffer, GrowableScanBuffer
+
+
+def test_unwritten_points_are_nan():
+    data = ScanBuffer(["x", "v"], (2, 3))
+    data.write((1, 2), {"x": 5., "v": 1.})
+    assert data.count == 1
+    assert data["v"][1, 2] == 1.
+    assert np.isnan(data["v"][0, 0])
+    assert np.count_nonzero(np.isnan(data.to_array()[:, 1])) == 5
+
+
+def test_write_sequence_in_column_order():
+    data = ScanBuffer(["x", "v"], 3)
+    data.write(2, (1., 2.))
+    np.testing.assert_array_equal(data.row(2), [1., 2.])
+
+
+def test_dataframe_is_row_major():
+    data = ScanBuffer(["j", "i"], (2, 3))
+    for j in range(2):
+        for i in range(3):
+            data.write((j, i), (j, i))
+    df = data.to_dataframe()
+    assert list(df.columns) == ["j", "i"]
+    np.testing.assert_array_equal(df["i"], [0, 1, 2, 0, 1, 2])
+    np.testing.assert_array_equal(df["j"], [0, 0, 0, 1, 1, 1])
+
+
+def test_growable_buffer_keeps_samples_when_growing():
+    data = GrowableScanBuffer(["x", "v"], chunk_size=4)
+    for k in range(10):
+        data.append({"x": k, "v": 2 * k})
+    assert len(data) == data.size == 10
+    assert data.capacity >= 10
+    np.testing.assert_array_equal(data["v"], 2 * np.arange(10))
+    assert data.to_array().shape == (10, 2)
+
+
+def test_growable_buffer_update_beyond_count():
+    data = GrowableScanBuffer(["x"], chunk_size=4)
+    data.append((1.,))
+    data.update(0, {"x": 3.})
+    assert data["x"][0] == 3.
+    with pytest.raises(IndexError):
+        data.update(1, {"x": 3.})
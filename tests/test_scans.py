@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from focus import FocusMap
+from raster import RASTER_ORDERS
+from scan_control import ScanControl
+from scan_writer import ScanWriter
+
+GRID = (30., 70., 10., 30., 70., 10.)
+
+
+def cancel_after(n_points):
+    control = ScanControl(on_point=lambda index, done, total, eta: control.cancel() if done == n_points else None)
+    return control
+
+
+def moke_grid(df, column="x1 (V)"):
+    return df[column].to_numpy().reshape(4, 4)
+
+
+@pytest.mark.parametrize("raster", RASTER_ORDERS)
+def test_every_raster_order_fills_the_grid(scanner, live_view, raster):
+    df = scanner.scan2d_moke(*GRID, live_view=live_view, raster=raster)
+    assert len(df) == 16
+    assert np.isfinite(df[["x (um)", "v (V)", "x1 (V)", "x2 (V)"]].to_numpy()).all()
+    np.testing.assert_array_equal(df["x (um)"].to_numpy().reshape(4, 4)[0], [30., 40., 50., 60.])
+
+
+def test_line_harmonics_fill_the_grid(scanner, live_view):
+    df = scanner.scan2d_moke(*GRID, live_view=live_view, harmonics="line")
+    assert np.isfinite(moke_grid(df, "x1 (V)")).all() and np.isfinite(moke_grid(df, "x2 (V)")).all()
+
+
+def test_aborted_scan_returns_the_points_measured(scanner, live_view):
+    df = scanner.scan2d_moke(*GRID, live_view=live_view, control=cancel_after(6))
+    measured = np.isfinite(moke_grid(df, "x (um)"))
+    assert measured.sum() == 6
+    assert measured[0].all() and measured[1, :2].all()
+
+
+def test_resume_completes_an_aborted_scan(scanner, live_view, tmp_path):
+    path = tmp_path / "scan.h5"
+    scanner.scan2d_moke(*GRID, live_view=live_view, control=cancel_after(5), writer=ScanWriter(path),
+                        raster="serpentine")
+    df = scanner.resume_scan2d_moke(path, live_view=live_view)
+    assert np.isfinite(moke_grid(df)).all()
+
+
+def test_fly_scan_fills_the_grid(scanner, live_view):
+    df = scanner.scan2d_moke_fly(*GRID, live_view=live_view, speed=200.)
+    assert np.isfinite(moke_grid(df, "v (V)")).all()
+
+
+def test_adaptive_scan_marks_the_measured_pixels(scanner, live_view):
+    df = scanner.scan2d_moke_adaptive(0., 100., 10., 0., 100., 10., coarse_step=40., live_view=live_view)
+    assert len(df) == 100
+    assert 0 < df.attrs["measured"] < 100
+
+
+def test_auto_focus_finds_the_sample_surface(scanner, setup, live_view):
+    z_focus = setup.sample.z_focus
+    z = scanner.auto_focus(z_focus + 15., live_view=live_view)
+    assert z == pytest.approx(z_focus, abs=1.)
+
+
+def test_focus_map_kept_when_aborted(scanner, live_view):
+    previous = FocusMap([8282., 0., 0.])
+    scanner.focus_map = previous
+    assert scanner.map_focus(30., 70., 30., 70., 8282., n_sites=2, live_view=live_view,
+                             control=cancel_after(1)) is None
+    assert scanner.focus_map is previous
+
+
+def test_focus_map_kept_when_the_fit_fails(scanner, live_view):
+    previous = FocusMap([8282., 0., 0.])
+    scanner.focus_map = previous
+    with pytest.raises(ValueError):
+        scanner.map_focus(30., 70., 30., 70., 8282., n_sites=2, order=2, live_view=live_view)
+    assert scanner.focus_map is previous
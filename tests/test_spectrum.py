@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from spectrum import LINE_MODELS, find_line, WavelengthCalibration, pool_adjacent_violators
+
+
+@pytest.mark.parametrize("model", LINE_MODELS)
+def test_line_center_between_pixels(model):
+    wavelengths = np.linspace(600., 1000., 801)
+    intensity = 10. + 1000. * np.exp(-0.5 * ((wavelengths - 812.13) / 1.5) ** 2)
+    intensity += np.random.default_rng(0).normal(0., 1., len(wavelengths))
+    center, width, snr = find_line(wavelengths, intensity, model=model)
+    assert center == pytest.approx(812.13, abs=0.1)
+    assert width == pytest.approx(2.3548 * 1.5, rel=0.1)
+    assert snr > 100
+
+
+def test_line_searched_around_expected():
+    wavelengths = np.linspace(600., 1000., 801)
+    intensity = np.exp(-((wavelengths - 700.) / 2.) ** 2) + 0.5 * np.exp(-((wavelengths - 900.) / 2.) ** 2)
+    assert find_line(wavelengths, intensity, expected=905.)[0] == pytest.approx(900., abs=0.1)
+
+
+def test_calibration_is_monotone_and_invertible(tmp_path):
+    positions = np.linspace(0., 13.3, 20)
+    wavelengths = 970. - 21. * positions
+    wavelengths[5] += 30.  # a noisy reading that would fold the table
+    calibration = WavelengthCalibration(positions, wavelengths)
+    assert np.all(np.diff(calibration.wavelengths) > 0)
+    for wavelength in (700., 800., 900.):
+        assert calibration.wavelength(calibration.position(wavelength)) == pytest.approx(wavelength)
+    calibration.save(tmp_path / "calibration.json")
+    loaded = WavelengthCalibration.load(tmp_path / "calibration.json")
+    assert loaded.wavelength_range == calibration.wavelength_range
+
+
+def test_calibration_needs_two_points():
+    with pytest.raises(ValueError):
+        WavelengthCalibration([1.], [800.])
+
+
+def test_pool_adjacent_violators():
+    np.testing.assert_allclose(pool_adjacent_violators([1., 3., 2., 4.]), [1., 2.5, 2.5, 4.])
@@ -0,0 +1,140 @@
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class VisaSessions:
+    """Pool of VISA sessions sharing one ResourceManager for the whole process.
+
+    Creating a ResourceManager loads the VISA library and opening a session
+    can take seconds on serial and GPIB buses, so the drivers get their
+    sessions from here instead: the ResourceManager is created once, and a
+    resource opened by several drivers shares one session. Every open() is
+    matched by a release(); a session released by its last driver stays
+    open, idle, and is handed back the next time the same resource is
+    opened, e.g. on the next Initialize. reconnect() reopens a session by
+    name, without enumerating the buses again. Sessions are closed by
+    close() and close_all(), which also runs at exit.
+    """
+
+    def __init__(self, visa_library=""):
+        """
+        Args:
+            visa_library (str): pyvisa backend, e.g. "@py", the default VISA library if empty
+        """
+        self.visa_library = visa_library
+        self._resource_manager = None
+        self._sessions = {}
+        self._settings = {}
+        self._users = {}
+        self._lock = threading.Lock()
+
+    @property
+    def resource_manager(self):
+        """The shared pyvisa.ResourceManager, created on first use."""
+        with self._lock:
+            if self._resource_manager is None:
+                import pyvisa
+                self._resource_manager = pyvisa.ResourceManager(self.visa_library)
+            return self._resource_manager
+
+    @staticmethod
+    def _is_open(session):
+        try:
+            session.session  # raises InvalidSession once the session is closed
+        except Exception:
+            return False
+        return True
+
+    def open(self, resource_name, **settings):
+        """Session of a resource, shared with the drivers that have it open already.
+
+        Args:
+            resource_name (str): VISA resource name
+            settings: Resource attributes, e.g. write_termination="\\n", passed to open_resource or set on a
+                shared session
+        Returns:
+            pyvisa.resources.Resource: The session, to be handed back with release()
+        """
+        session = self._open(resource_name, settings)
+        with self._lock:
+            self._users[resource_name] = self._users.get(resource_name, 0) + 1
+        return session
+
+    def _open(self, resource_name, settings):
+        with self._lock:
+            session = self._sessions.get(resource_name)
+        if session is not None and self._is_open(session):
+            for name, value in settings.items():
+                setattr(session, name, value)
+            logger.debug(f"Reusing the VISA session of {resource_name}")
+        else:
+            session = self.resource_manager.open_resource(resource_name, **settings)
+        with self._lock:
+            self._sessions[resource_name] = session
+            self._settings[resource_name] = settings
+        return session
+
+    def reconnect(self, resource_name):
+        """Close the session of a resource and open it again with the settings of the last open().
+
+        The resource is opened by name, without enumerating the buses again,
+        and the drivers using it keep their claim on it.
+
+        Returns:
+            pyvisa.resources.Resource: The new session
+        """
+        with self._lock:
+            session = self._sessions.pop(resource_name, None)
+            settings = self._settings.get(resource_name, {})
+        if session is not None and self._is_open(session):
+            session.close()
+        logger.info(f"Reopening the VISA session of {resource_name}")
+        return self._open(resource_name, settings)
+
+    def release(self, resource_name):
+        """Hand a session back to the pool. It stays open for the next open(), idle once no driver uses it."""
+        with self._lock:
+            if self._users.get(resource_name, 0) > 0:
+                self._users[resource_name] -= 1
+
+    def close(self, resource_name):
+        """Close the session of a resource, also if drivers still use it."""
+        with self._lock:
+            session = self._sessions.pop(resource_name, None)
+            self._users.pop(resource_name, None)
+        if session is not None and self._is_open(session):
+            session.close()
+
+    def close_all(self):
+        """Close every session and the ResourceManager."""
+        for resource_name in list(self._sessions):
+            try:
+                self.close(resource_name)
+            except Exception as e:
+                logger.warning(f"Closing {resource_name} failed: {e}")
+        with self._lock:
+            resource_manager, self._resource_manager = self._resource_manager, None
+        if resource_manager is not None:
+            resource_manager.close()
+
+    def status(self):
+        """State of every pooled resource: "in use" with the number of open() calls not released yet,
+        "idle" or "closed".
+
+        Returns:
+            dict: Resource name to state
+        """
+        with self._lock:
+            sessions = dict(self._sessions)
+            users = dict(self._users)
+        return {name: "closed" if not self._is_open(session) else
+                f"in use ({users[name]})" if users.get(name, 0) else "idle"
+                for name, session in sessions.items()}
+
+
+# Shared by every VISA driver of the process
+sessions = VisaSessions()
+atexit.register(sessions.close_all)